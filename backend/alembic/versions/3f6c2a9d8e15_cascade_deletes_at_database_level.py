@@ -0,0 +1,49 @@
+"""cascade deletes at database level
+
+Revision ID: 3f6c2a9d8e15
+Revises: 5b8e1f2c7a94
+Create Date: 2026-10-19 15:02:27.904118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2a9d8e15'
+down_revision = '5b8e1f2c7a94'
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table, constraint name)
+FOREIGN_KEYS = [
+    ('messages', 'chat_id', 'chats', 'messages_chat_id_fkey'),
+    ('document_content', 'document_id', 'documents', 'document_content_document_id_fkey'),
+    ('document_chat', 'document_id', 'documents', 'document_chat_document_id_fkey'),
+    ('document_chat', 'chat_id', 'chats', 'document_chat_chat_id_fkey'),
+    ('sources', 'message_id', 'messages', 'sources_message_id_fkey'),
+    ('sources', 'document_id', 'documents', 'sources_document_id_fkey'),
+]
+
+# Only present in databases created from the migration history
+SEGMENT_FOREIGN_KEYS = [
+    ('message_segments', 'message_id', 'messages', 'message_segments_message_id_fkey'),
+    ('message_segments', 'source_id', 'sources', 'message_segments_source_id_fkey'),
+]
+
+
+def _foreign_keys():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    return FOREIGN_KEYS + [fk for fk in SEGMENT_FOREIGN_KEYS if fk[0] in tables]
+
+
+def upgrade():
+    for table, column, referred, name in _foreign_keys():
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    for table, column, referred, name in _foreign_keys():
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'])
@@ -0,0 +1,26 @@
+"""add keyset pagination indexes
+
+Revision ID: 5b8e1f2c7a94
+Revises: d70ca1eb2cbb
+Create Date: 2026-10-19 13:40:02.571633
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e1f2c7a94'
+down_revision = 'd70ca1eb2cbb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_messages_chat_id_timestamp_id', 'messages', ['chat_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_chats_user_id_last_active_id', 'chats', ['user_id', 'last_active', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_chats_user_id_last_active_id', table_name='chats')
+    op.drop_index('ix_messages_chat_id_timestamp_id', table_name='messages')
@@ -0,0 +1,34 @@
+"""add document content full text search
+
+Revision ID: 8a4d1e7c3b60
+Revises: 3f6c2a9d8e15
+Create Date: 2026-10-19 15:48:11.206385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d1e7c3b60'
+down_revision = '3f6c2a9d8e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same configuration the search queries use; validated as an identifier by the settings
+    op.execute(f"""
+        ALTER TABLE document_content ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{settings.SEARCH_TEXT_CONFIG}'::regconfig, coalesce(content, ''))) STORED
+    """)
+    op.create_index(
+        'ix_document_content_search_vector', 'document_content', ['search_vector'],
+        unique=False, postgresql_using='gin',
+    )
+
+
+def downgrade():
+    op.drop_index('ix_document_content_search_vector', table_name='document_content')
+    op.drop_column('document_content', 'search_vector')
@@ -0,0 +1,24 @@
+"""add message status
+
+Revision ID: b5d1f8c42e67
+Revises: a7c3e91d5b20
+Create Date: 2026-10-19 22:05:13.274410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d1f8c42e67'
+down_revision = 'a7c3e91d5b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('messages', sa.Column('status', sa.String(), server_default='complete', nullable=True))
+
+
+def downgrade():
+    op.drop_column('messages', 'status')
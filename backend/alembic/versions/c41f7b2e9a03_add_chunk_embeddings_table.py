@@ -0,0 +1,52 @@
+"""add chunk embeddings table
+
+Revision ID: c41f7b2e9a03
+Revises: 8a4d1e7c3b60
+Create Date: 2026-10-19 16:31:45.118902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f7b2e9a03'
+down_revision = '8a4d1e7c3b60'
+branch_labels = None
+depends_on = None
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+def upgrade():
+    op.create_table('chunk_embeddings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('document_id', sa.Integer(), nullable=True),
+    sa.Column('chunk_index', sa.Integer(), nullable=True),
+    sa.Column('page_number', sa.Integer(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('embedding_blob', sa.LargeBinary(), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('document_id', 'chunk_index', name='uix_chunk_embeddings_document_chunk')
+    )
+    op.create_index(op.f('ix_chunk_embeddings_id'), 'chunk_embeddings', ['id'], unique=False)
+    op.create_index(op.f('ix_chunk_embeddings_document_id'), 'chunk_embeddings', ['document_id'], unique=False)
+
+    # Without the pgvector extension the application falls back to the BLOB column
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql' and bind.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")
+    ).first():
+        op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+        op.execute(f'ALTER TABLE chunk_embeddings ADD COLUMN embedding vector({EMBEDDING_DIMENSIONS})')
+        op.execute(
+            'CREATE INDEX ix_chunk_embeddings_embedding_hnsw '
+            'ON chunk_embeddings USING hnsw (embedding vector_cosine_ops)'
+        )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_chunk_embeddings_document_id'), table_name='chunk_embeddings')
+    op.drop_index(op.f('ix_chunk_embeddings_id'), table_name='chunk_embeddings')
+    op.drop_table('chunk_embeddings')
@@ -0,0 +1,77 @@
+"""add daily usage rollup keys
+
+Revision ID: d70ca1eb2cbb
+Revises: 9d62440a1880
+Create Date: 2026-10-19 10:12:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd70ca1eb2cbb'
+down_revision = '9d62440a1880'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('daily_usage', sa.Column('messages_received', sa.Integer(), nullable=True))
+
+    # Merging duplicates uses PostgreSQL's UPDATE ... FROM and DELETE ... USING
+    if op.get_bind().dialect.name == 'postgresql':
+        # Point usage rows of duplicate analytics records at the oldest record per user
+        op.execute("""
+            UPDATE daily_usage AS du
+            SET analytics_id = keep.id
+            FROM user_analytics AS ua
+            JOIN (SELECT user_id, MIN(id) AS id FROM user_analytics GROUP BY user_id) AS keep
+              ON keep.user_id = ua.user_id
+            WHERE du.analytics_id = ua.id AND ua.id <> keep.id
+        """)
+        op.execute("""
+            DELETE FROM user_analytics AS ua
+            USING (SELECT user_id, MIN(id) AS id FROM user_analytics GROUP BY user_id) AS keep
+            WHERE ua.user_id = keep.user_id AND ua.id <> keep.id
+        """)
+
+        # Normalize usage dates to UTC midnight, the key day_start() writes whatever the
+        # session time zone, and merge duplicate (analytics_id, date) rows
+        op.execute("UPDATE daily_usage SET date = date_trunc('day', date AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'")
+        op.execute("""
+            UPDATE daily_usage AS du
+            SET minutes_active = agg.minutes_active,
+                chats_created = agg.chats_created,
+                pdfs_uploaded = agg.pdfs_uploaded,
+                messages_sent = agg.messages_sent
+            FROM (
+                SELECT MIN(id) AS id,
+                       SUM(COALESCE(minutes_active, 0)) AS minutes_active,
+                       SUM(COALESCE(chats_created, 0)) AS chats_created,
+                       SUM(COALESCE(pdfs_uploaded, 0)) AS pdfs_uploaded,
+                       SUM(COALESCE(messages_sent, 0)) AS messages_sent
+                FROM daily_usage
+                GROUP BY analytics_id, date
+                HAVING COUNT(*) > 1
+            ) AS agg
+            WHERE du.id = agg.id
+        """)
+        op.execute("""
+            DELETE FROM daily_usage AS du
+            USING (SELECT analytics_id, date, MIN(id) AS id FROM daily_usage GROUP BY analytics_id, date) AS keep
+            WHERE du.analytics_id = keep.analytics_id AND du.date = keep.date AND du.id <> keep.id
+        """)
+
+    with op.batch_alter_table('daily_usage') as batch_op:
+        batch_op.create_unique_constraint('uix_daily_usage_analytics_date', ['analytics_id', 'date'])
+    op.drop_index('ix_user_analytics_user_id', table_name='user_analytics')
+    op.create_index('ix_user_analytics_user_id', 'user_analytics', ['user_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_analytics_user_id', table_name='user_analytics')
+    op.create_index('ix_user_analytics_user_id', 'user_analytics', ['user_id'], unique=False)
+    with op.batch_alter_table('daily_usage') as batch_op:
+        batch_op.drop_constraint('uix_daily_usage_analytics_date', type_='unique')
+    op.drop_column('daily_usage', 'messages_received')
@@ -0,0 +1,74 @@
+"""record embedding model per chunk
+
+Revision ID: e2b9d5a61f48
+Revises: c41f7b2e9a03
+Create Date: 2026-10-19 17:54:09.662317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b9d5a61f48'
+down_revision = 'c41f7b2e9a03'
+branch_labels = None
+depends_on = None
+
+# What every embedding stored so far was produced with
+LEGACY_MODEL = 'text-embedding-ada-002'
+LEGACY_DIMENSIONS = 1536
+
+
+def _has_vector_column():
+    return bool(op.get_bind().execute(sa.text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'chunk_embeddings' AND column_name = 'embedding' AND udt_name = 'vector'
+    """)).first())
+
+
+def upgrade():
+    op.add_column('chunk_embeddings', sa.Column('embedding_model', sa.String(), nullable=True))
+    op.add_column('chunk_embeddings', sa.Column('embedding_dimensions', sa.Integer(), nullable=True))
+    op.execute(
+        f"UPDATE chunk_embeddings SET embedding_model = '{LEGACY_MODEL}', "
+        f"embedding_dimensions = {LEGACY_DIMENSIONS}"
+    )
+    op.drop_constraint('uix_chunk_embeddings_document_chunk', 'chunk_embeddings', type_='unique')
+    op.create_unique_constraint(
+        'uix_chunk_embeddings_document_model_chunk', 'chunk_embeddings',
+        ['document_id', 'embedding_model', 'embedding_dimensions', 'chunk_index'],
+    )
+
+    # Untyped vector column with one partial HNSW index per vector size
+    if op.get_bind().dialect.name == 'postgresql' and _has_vector_column():
+        op.execute('DROP INDEX IF EXISTS ix_chunk_embeddings_embedding_hnsw')
+        op.execute('ALTER TABLE chunk_embeddings ALTER COLUMN embedding TYPE vector')
+        op.execute(
+            f'CREATE INDEX ix_chunk_embeddings_embedding_hnsw_{LEGACY_DIMENSIONS} ON chunk_embeddings '
+            f'USING hnsw ((embedding::vector({LEGACY_DIMENSIONS})) vector_cosine_ops) '
+            f'WHERE embedding_dimensions = {LEGACY_DIMENSIONS}'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql' and _has_vector_column():
+        op.execute(
+            f"DELETE FROM chunk_embeddings WHERE embedding_dimensions <> {LEGACY_DIMENSIONS}"
+        )
+        op.execute(f'DROP INDEX IF EXISTS ix_chunk_embeddings_embedding_hnsw_{LEGACY_DIMENSIONS}')
+        op.execute(f'ALTER TABLE chunk_embeddings ALTER COLUMN embedding TYPE vector({LEGACY_DIMENSIONS})')
+        op.execute(
+            'CREATE INDEX ix_chunk_embeddings_embedding_hnsw '
+            'ON chunk_embeddings USING hnsw (embedding vector_cosine_ops)'
+        )
+    op.execute(
+        f"DELETE FROM chunk_embeddings WHERE embedding_model <> '{LEGACY_MODEL}' "
+        f"OR embedding_dimensions <> {LEGACY_DIMENSIONS}"
+    )
+    op.drop_constraint('uix_chunk_embeddings_document_model_chunk', 'chunk_embeddings', type_='unique')
+    op.create_unique_constraint(
+        'uix_chunk_embeddings_document_chunk', 'chunk_embeddings', ['document_id', 'chunk_index']
+    )
+    op.drop_column('chunk_embeddings', 'embedding_dimensions')
+    op.drop_column('chunk_embeddings', 'embedding_model')
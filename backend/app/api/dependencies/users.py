@@ -1,7 +1,7 @@
 from fastapi import Depends, Query
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.services.user import create_user_if_not_exists
+from app.services.user import ensure_user
 from app.schemas.user import UserCreate
 
 def ensure_user_exists(
@@ -11,7 +11,8 @@ def ensure_user_exists(
     """
     Dependency to ensure a user exists in the database.
     This is used for Clerk integration where users are created in Clerk first.
+    Users already seen by this process are answered from a cache without a query.
     """
     user = UserCreate(id=user_id, email=f"{user_id}@example.com")
-    create_user_if_not_exists(db, user)
+    ensure_user(db, user)
     return user_id 
\ No newline at end of file
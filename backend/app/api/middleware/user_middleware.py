@@ -2,7 +2,7 @@ from fastapi import Request, Depends
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.services.user import create_user_if_not_exists
+from app.services.user import ensure_user
 from app.schemas.user import UserCreate
 
 async def user_middleware(request: Request, db: Session = Depends(get_db)):
@@ -18,7 +18,7 @@ async def user_middleware(request: Request, db: Session = Depends(get_db)):
         # Create a minimal user object
         user = UserCreate(id=user_id, email=f"{user_id}@example.com")
         
-        # Create user if not exists
-        create_user_if_not_exists(db, user)
+        # Create user if not exists (cached after the first request)
+        ensure_user(db, user)
         
     return request 
\ No newline at end of file
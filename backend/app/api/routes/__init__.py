@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.routes import users, chats, documents, messages, pdf, auth, analytics
+from app.api.routes import users, chats, documents, messages, pdf, auth, analytics, metrics
 
 router = APIRouter()
 
@@ -9,4 +9,5 @@ router.include_router(chats.router, prefix="/chats", tags=["chats"])
 router.include_router(documents.router, prefix="/documents", tags=["documents"])
 router.include_router(messages.router, prefix="/messages", tags=["messages"])
 router.include_router(pdf.router, prefix="/pdf", tags=["pdf"])
-router.include_router(analytics.router, prefix="/analytics", tags=["analytics"]) 
\ No newline at end of file
+router.include_router(analytics.router, prefix="/analytics", tags=["analytics"]) 
+router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
@@ -1,15 +1,24 @@
+import asyncio
+import json
+import math
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.core.config import settings
+from app.core.disconnect import ClientDisconnected, cancel_on_disconnect
+from app.db.session import get_db, get_read_db
 from app.services.chat import (
-    get_chat_by_id, get_chats_by_user_id,
+    get_chat_by_id, get_chat_page, chat_exists,
     create_chat, update_chat, delete_chat_by_id
 )
-from app.services.ai import PDFChatBot
+from app.services.pagination import InvalidCursor
+from app.services.admission import AdmissionRejected
+from app.services.ai import answer_batch, answer_message, turn_cancellations
+from app.services.idempotency import IdempotencyKeyReused, run_idempotent
 from app.schemas.chat import Chat, ChatCreate, ChatUpdate, ChatDetail
-from app.schemas.conversation import ChatRequest, ChatResponse
-from app.services.user import create_user_if_not_exists
+from app.schemas.conversation import BatchChatRequest, ChatRequest, ChatResponse
+from app.services.user import ensure_user
 from app.schemas.user import UserCreate
 from app.api.dependencies.users import ensure_user_exists
 
@@ -17,16 +26,33 @@ router = APIRouter()
 
 @router.get("/", response_model=List[Chat])
 async def read_chats(
+    response: Response,
     user_id: str = Depends(ensure_user_exists),
     include_archived: Optional[bool] = Query(False, description="Include archived chats"),
-    db: Session = Depends(get_db)
+    archived_only: Optional[bool] = Query(False, description="Return only archived chats"),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of chats to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from X-Next-Cursor to fetch the next page"),
+    db: Session = Depends(get_read_db)
 ):
     """
-    Get all chats for a user
+    Get chats for a user
     
-    This endpoint returns all chats for a given user, optionally including archived chats.
+    This endpoint returns a page of chats for a given user, most recently active first,
+    optionally including archived chats, or only archived chats. When more chats exist,
+    the X-Next-Cursor response header holds the cursor for the next page.
     """
-    return get_chats_by_user_id(db, user_id, include_archived)
+    try:
+        chats, next_cursor = get_chat_page(
+            db, user_id, include_archived, limit=limit, cursor=cursor, archived_only=archived_only
+        )
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return chats
 
 @router.post("/", response_model=Chat, status_code=status.HTTP_201_CREATED)
 async def create_new_chat(chat: ChatCreate, db: Session = Depends(get_db)):
@@ -39,13 +65,13 @@ async def create_new_chat(chat: ChatCreate, db: Session = Depends(get_db)):
     user = UserCreate(id=chat.user_id, email=f"{chat.user_id}@example.com")
     
     # Create user if not exists
-    create_user_if_not_exists(db, user)
+    ensure_user(db, user)
     
     # Now create the chat
     return create_chat(db=db, chat=chat)
 
 @router.get("/{chat_id}", response_model=ChatDetail)
-async def read_chat(chat_id: int, db: Session = Depends(get_db)):
+async def read_chat(chat_id: int, db: Session = Depends(get_read_db)):
     """
     Get chat by ID
     
@@ -74,6 +100,7 @@ async def read_chat(chat_id: int, db: Session = Depends(get_db)):
             "content": msg.content,
             "role": msg.role,
             "timestamp": msg.timestamp,
+            "status": msg.status,
             "sources": [serialize_source(s) for s in msg.sources] if msg.sources else [],
         }
     return {
@@ -116,8 +143,7 @@ async def delete_chat(chat_id: int, db: Session = Depends(get_db)):
     
     This endpoint deletes a chat and all its messages and document associations.
     """
-    chat = get_chat_by_id(db, chat_id)
-    if not chat:
+    if not chat_exists(db, chat_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found",
@@ -129,12 +155,22 @@ async def delete_chat(chat_id: int, db: Session = Depends(get_db)):
 async def chat_with_ai(
     chat_id: int, 
     chat_request: ChatRequest, 
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255, description="Retries with the same key get the first response"),
     db: Session = Depends(get_db)
 ):
     """
     Chat with AI
     
     This endpoint processes user message and generates AI response for a specific chat.
+    With an Idempotency-Key header the message is answered once: retries get the
+    stored response (marked with Idempotent-Replayed: true) or wait for it.
+    Without a key, the turn is stopped and nothing is answered if the client
+    disconnects first. With a key it runs to the end, so a retry after a dropped
+    connection gets the stored response instead of a second turn.
+    Users over their subscription's message rate, or messages arriving while the
+    worker's queue is full, get 429 with a Retry-After header.
     """
     # Check if chat exists
     chat = get_chat_by_id(db, chat_id)
@@ -144,8 +180,78 @@ async def chat_with_ai(
             detail="Chat not found",
         )
     
-    # Initialize chat bot and process message
-    chat_bot = PDFChatBot(chat_id=chat_id, db=db)
-    result = await chat_bot.process_message(chat_request.message)
-    
-    return result 
\ No newline at end of file
+    # Process the message; a duplicate of one still being answered waits for that answer
+    answer = lambda: answer_message(db, chat_id, chat_request.message)
+
+    async def respond():
+        if idempotency_key is None:
+            return await cancel_on_disconnect(request, answer(), settings.CLIENT_DISCONNECT_POLL_SECONDS), False
+        # Not stopped on disconnect, and shielded should this request be cancelled: the
+        # client sent a key because it may retry after a dropped connection
+        return await asyncio.shield(run_idempotent(db, chat_id, idempotency_key, chat_request.message, answer))
+
+    try:
+        result, replayed = await respond()
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    except ClientDisconnected:
+        turn_cancellations["client_disconnected"] += 1
+        return Response(status_code=499)  # Client Closed Request; nobody reads it
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result 
+
+@router.post("/{chat_id}/conversation/batch")
+async def chat_batch_with_ai(
+    chat_id: int,
+    batch_request: BatchChatRequest,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Ask many questions at once
+
+    This endpoint answers a list of independent questions about the chat's documents,
+    e.g. a review checklist, sharing one index load and embeddings request between them.
+    Results are streamed back as NDJSON, one line per question in the order they are
+    answered: {"index", "question", "message"} or {"index", "question", "error"}.
+    Each answered question is stored in the chat as a user and assistant message pair.
+    """
+    chat = get_chat_by_id(db, chat_id)
+    if not chat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found",
+        )
+    if len(batch_request.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A batch holds at most {settings.BATCH_MAX_QUESTIONS} questions",
+        )
+
+    results = answer_batch(db, chat_id, batch_request.questions)
+    # Wait for the first answer before responding, so a rejected batch still gets a 429
+    try:
+        first = await cancel_on_disconnect(request, anext(results), settings.CLIENT_DISCONNECT_POLL_SECONDS)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    except ClientDisconnected:
+        turn_cancellations["client_disconnected"] += 1
+        return Response(status_code=499)
+
+    async def lines():
+        yield json.dumps(first, default=str) + "\n"
+        async for result in results:
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
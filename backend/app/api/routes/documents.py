@@ -1,13 +1,14 @@
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.services.document import (
     get_document_by_id, get_documents_by_user_id,
     get_documents_by_chat_id, create_document,
     delete_document_by_id
 )
-from app.schemas.document import Document
+from app.services.search import search_document_pages
+from app.schemas.document import Document, DocumentSearchHit
 from app.core.config import settings
 import os
 import mimetypes
@@ -18,7 +19,7 @@ router = APIRouter()
 async def read_documents(
     user_id: Optional[str] = Query(None, description="Filter by user ID"),
     chat_id: Optional[int] = Query(None, description="Filter by chat ID"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get documents
@@ -35,8 +36,27 @@ async def read_documents(
             detail="Either user_id or chat_id is required",
         )
 
+@router.get("/search", response_model=List[DocumentSearchHit])
+async def search_documents(
+    user_id: str = Query(..., description="Search this user's documents"),
+    q: str = Query(..., min_length=1, description="Search keywords"),
+    chat_id: Optional[int] = Query(None, description="Only search documents in this chat"),
+    document_id: Optional[int] = Query(None, description="Only search this document"),
+    limit: int = Query(20, ge=1, le=settings.SEARCH_MAX_RESULTS),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Search document pages
+    
+    This endpoint runs a full-text keyword search over the pages of a user's
+    documents and returns ranked page hits with highlighted snippets.
+    """
+    return search_document_pages(
+        db, user_id, q, chat_id=chat_id, document_id=document_id, limit=limit
+    )
+
 @router.get("/content/{document_id}")
-async def get_document_content(document_id: int, db: Session = Depends(get_db)):
+async def get_document_content(document_id: int, db: Session = Depends(get_read_db)):
     """
     Get document content directly
     
@@ -114,7 +134,7 @@ async def upload_document(
     return await create_document(db=db, file=file, user_id=user_id, chat_id=chat_id)
 
 @router.get("/{document_id}", response_model=Document)
-async def read_document(document_id: int, db: Session = Depends(get_db)):
+async def read_document(document_id: int, db: Session = Depends(get_read_db)):
     """
     Get document by ID
     
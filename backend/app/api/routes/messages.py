@@ -1,11 +1,12 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.services.message import (
-    get_messages_by_chat_id, create_message,
+    get_message_page, create_message,
     get_message_by_id
 )
+from app.services.pagination import InvalidCursor
 from app.schemas.message import Message, MessageCreate
 from app.schemas.chat import ChatDetail
 import logging
@@ -14,30 +15,28 @@ router = APIRouter()
 
 @router.get("/", response_model=List[Message])
 async def read_messages(
+    response: Response,
     chat_id: int = Query(..., description="Chat ID to filter messages"),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of messages to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from X-Next-Cursor to fetch older messages"),
+    db: Session = Depends(get_read_db)
 ):
     """
-    Get all messages for a chat
+    Get messages for a chat
     
-    This endpoint returns all messages for a given chat.
+    This endpoint returns the latest page of messages for a given chat in
+    chronological order. When older messages exist, the X-Next-Cursor response
+    header holds the cursor for the previous page.
     """
-    messages = get_messages_by_chat_id(db, chat_id)
-    # Sort messages by timestamp ascending
-    messages = sorted(messages, key=lambda m: m.timestamp)
-    filtered = []
-    i = 0
-    while i < len(messages):
-        msg = messages[i]
-        filtered.append(msg)
-        if msg.role == "user":
-            # Find the first assistant message after this user message
-            for j in range(i+1, len(messages)):
-                if messages[j].role == "assistant":
-                    filtered.append(messages[j])
-                    i = j
-                    break
-        i += 1
+    try:
+        messages, next_cursor = get_message_page(db, chat_id, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     def serialize_source(source):
         # Get document name for the 'file' field
         file = source.document.name if source.document else "Unknown"
@@ -59,13 +58,14 @@ async def read_messages(
             "content": msg.content,
             "role": msg.role,
             "timestamp": msg.timestamp,
+            "status": msg.status,
             "sources": [serialize_source(s) for s in msg.sources] if msg.sources else [],
         }
-    for msg in filtered:
+    for msg in messages:
         if msg.role == "assistant":
             logger = logging.getLogger(__name__)
             logger.info(f"API returning message (id={msg.id}): {msg.content}")
-    return [serialize_message(msg) for msg in filtered]
+    return [serialize_message(msg) for msg in messages]
 
 @router.post("/", response_model=Message, status_code=status.HTTP_201_CREATED)
 async def create_new_message(message: MessageCreate, db: Session = Depends(get_db)):
@@ -77,7 +77,7 @@ async def create_new_message(message: MessageCreate, db: Session = Depends(get_d
     return create_message(db=db, message=message)
 
 @router.get("/{message_id}", response_model=Message)
-async def read_message(message_id: int, db: Session = Depends(get_db)):
+async def read_message(message_id: int, db: Session = Depends(get_read_db)):
     """
     Get message by ID
     
@@ -119,6 +119,7 @@ async def read_chat(chat_id: int, db: Session = Depends(get_db)):
             "content": msg.content,
             "role": msg.role,
             "timestamp": msg.timestamp,
+            "status": msg.status,
             "sources": [serialize_source(s) for s in msg.sources] if msg.sources else [],
         }
     return {
@@ -0,0 +1,35 @@
+from fastapi import APIRouter
+from typing import Dict, Any
+
+from app.services.admission import admission
+from app.services.ai import conversation_metrics
+from app.services.clients import get_clients
+from app.services.embeddings import embedding_limiter, query_embeddings
+from app.services.retrieval import retrieval_results
+
+router = APIRouter()
+
+@router.get("")
+async def get_metrics() -> Dict[str, Any]:
+    """Conversation latency, admission, cache, connection pool, LLM routing and rate limiter state of this worker
+
+    Async so it runs on the event loop, the only place admission and
+    conversation state may be read without racing its updates.
+    """
+    clients = get_clients()
+    return {
+        "conversation": conversation_metrics(),
+        "admission": admission.stats(),
+        "caches": {
+            "query_embeddings": query_embeddings.stats(),
+            "retrieval_results": retrieval_results.stats(),
+        },
+        "http_pools": clients.metrics(),
+        "llm_routing": clients.router.metrics(),
+        "embedding_limiter": {
+            "limit": embedding_limiter.limit,
+            "max_limit": embedding_limiter.max_limit,
+            "in_flight": embedding_limiter.in_flight,
+            "rate_limited": embedding_limiter.rate_limited,
+        },
+    }
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.services.user import get_user_by_id, update_user_subscription
 from app.schemas.user import User
 from app.schemas import user as schemas
@@ -13,7 +13,7 @@ router = APIRouter()
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 @router.get("/{user_id}", response_model=User)
-async def read_user(user_id: str, db: Session = Depends(get_db)):
+async def read_user(user_id: str, db: Session = Depends(get_read_db)):
     """
     Get user by ID
     
@@ -28,7 +28,7 @@ async def read_user(user_id: str, db: Session = Depends(get_db)):
     return user 
 
 @router.get("/me/subscription")
-def get_my_subscription(user_id: str, db: Session = Depends(get_db)):
+def get_my_subscription(user_id: str, db: Session = Depends(get_read_db)):
     db_user = user_service.get_user_by_id(db, user_id)
     if not db_user:
         return {"subscription_type": "Free"}
@@ -36,12 +36,9 @@ def get_my_subscription(user_id: str, db: Session = Depends(get_db)):
 
 @router.put("/me/subscription", response_model=schemas.User)
 def update_my_subscription(user_id: str, subscription_type: str, db: Session = Depends(get_db)):
-    db_user = user_service.get_user_by_id(db, user_id)
+    db_user = update_user_subscription(db, user_id, subscription_type)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    db_user.subscription_type = subscription_type
-    db.commit()
-    db.refresh(db_user)
     return db_user
 
 @router.post("/stripe/webhook")
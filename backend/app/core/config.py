@@ -1,7 +1,8 @@
 import os
+import re
 import secrets
-from typing import List
-from pydantic import Field
+from typing import Dict, List
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -32,6 +33,16 @@ class Settings(BaseSettings):
             return f"sqlite:///{sqlite_db_path}"
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    # Read replicas
+    # Comma-separated database URLs that GET endpoints may read from
+    DATABASE_REPLICA_URLS: str = Field(default="")
+    REPLICA_MAX_LAG_SECONDS: float = Field(default=5.0)
+    REPLICA_HEALTH_CHECK_INTERVAL_SECONDS: float = Field(default=15.0)
+    
+    @property
+    def DATABASE_REPLICA_URL_LIST(self) -> List[str]:
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+    
     # Security
     SECRET_KEY: str = Field(default_factory=lambda: secrets.token_urlsafe(32))
     JWT_SECRET: str = Field(default_factory=lambda: secrets.token_urlsafe(32))
@@ -41,17 +52,151 @@ class Settings(BaseSettings):
     # OpenAI
     OPENAI_API_KEY: str = Field(default="")
     OPENAI_ORG_ID: str = Field(default="")
+    OPENAI_BASE_URL: str = Field(default="")  # Empty for api.openai.com; any OpenAI-compatible endpoint otherwise
+    OPENAI_CHAT_MODEL: str = Field(default="gpt-4o")
+    
+    # Outbound HTTP connection pools shared by all LLM and embedding clients
+    HTTP_POOL_MAX_CONNECTIONS: int = Field(default=100)  # Per pool; each worker has a sync and an async pool
+    HTTP_POOL_MAX_KEEPALIVE: int = Field(default=20)  # Idle connections kept open for reuse
+    HTTP_POOL_KEEPALIVE_SECONDS: float = Field(default=60.0)  # Idle time before a kept-alive connection is closed
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = Field(default=5.0)
+    HTTP_TIMEOUT_SECONDS: float = Field(default=120.0)  # Read/write/pool timeout per request
     
     # File Storage
     UPLOAD_DIR: str = Field(default="uploads")
     MAX_UPLOAD_SIZE: int = Field(default=52428800)  # 50MB
     
+    # Retrieval
+    INDEX_DIR: str = Field(default="indexes")  # Persisted per-document search indexes
+    CHUNK_SIZE: int = Field(default=400)
+    CHUNK_OVERLAP: int = Field(default=100)
+    RETRIEVAL_K: int = Field(default=10)  # Chunks passed to the LLM
+    RETRIEVAL_FETCH_K: int = Field(default=30)  # Candidates taken from each retriever before fusion
+    RRF_K: int = Field(default=60)  # Reciprocal rank fusion damping constant
+    # Stored embeddings record the model and dimensions they were made with;
+    # run reindex_embeddings.py before changing these
+    EMBEDDING_MODEL: str = Field(default="text-embedding-ada-002")
+    EMBEDDING_DIMENSIONS: int = Field(default=1536)  # text-embedding-3 models accept fewer
+    EMBEDDING_BATCH_MAX_INPUTS: int = Field(default=256)  # Texts per embeddings request
+    EMBEDDING_BATCH_MAX_TOKENS: int = Field(default=60000)  # Tokens per embeddings request
+    EMBEDDING_MAX_CONCURRENCY: int = Field(default=4)  # In-flight embeddings requests per worker
+    EMBEDDING_MAX_ATTEMPTS: int = Field(default=6)  # Tries per batch on rate limits and transient errors
+    VECTOR_EF_SEARCH: int = Field(default=100)  # HNSW candidate list size per pgvector query
+    # pgvector: chats with at most this many chunks are searched exactly through the document_id index;
+    # larger ones through HNSW with iterative scans, which need pgvector 0.8.0 or later
+    VECTOR_EXACT_SEARCH_MAX_CHUNKS: int = Field(default=20000)
+    VECTOR_MAX_SCAN_TUPLES: int = Field(default=20000)  # Index tuples an iterative HNSW scan may visit per query
+    VECTOR_INDEX_MMAP: bool = Field(default=True)  # Memory-map on-disk vector indexes instead of loading them
+    VECTOR_INDEX_CACHE_SIZE: int = Field(default=4096)  # Open document vector indexes per worker
+    VECTOR_INDEX_CACHE_TTL_SECONDS: float = Field(default=3600.0)
+    # Index type per document: auto, flat, ivf_flat, hnsw, sq8 or ivf_pq
+    VECTOR_INDEX_MODE: str = Field(default="auto")
+    VECTOR_INDEX_FLAT_MAX_CHUNKS: int = Field(default=5000)  # auto: exact search below this
+    VECTOR_INDEX_SQ8_MIN_CHUNKS: int = Field(default=20000)  # auto: HNSW below this, IVF-SQ8 from here
+    VECTOR_INDEX_PQ_MIN_CHUNKS: int = Field(default=100000)  # auto: IVF-PQ from here
+    VECTOR_INDEX_NPROBE: int = Field(default=16)  # IVF lists scanned per query
+    LEXICAL_INDEX_CACHE_SIZE: int = Field(default=256)  # Document indexes kept in memory per worker
+    LEXICAL_INDEX_CACHE_TTL_SECONDS: float = Field(default=3600.0)
+    QUERY_EMBEDDING_CACHE_SIZE: int = Field(default=10000)  # Query vectors kept per worker, by model and text
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: float = Field(default=3600.0)
+    RETRIEVAL_CACHE_SIZE: int = Field(default=5000)  # Fused search results kept per worker
+    RETRIEVAL_CACHE_TTL_SECONDS: float = Field(default=600.0)
+    
+    # Keyword search
+    SEARCH_TEXT_CONFIG: str = Field(default="english")  # PostgreSQL text search configuration
+    SEARCH_MAX_RESULTS: int = Field(default=50)
+    
+    # Deletion
+    DELETE_BATCH_SIZE: int = Field(default=1000)  # Rows per DELETE statement
+    REAPER_INTERVAL_SECONDS: float = Field(default=30.0)  # How often deleted documents' files are cleaned up
+    ORPHAN_UPLOAD_GRACE_SECONDS: float = Field(default=3600.0)  # Minimum age before an unreferenced upload is removed
+    
+    # User existence cache
+    USER_CACHE_TTL_SECONDS: float = Field(default=300.0)
+    USER_CACHE_MAX_SIZE: int = Field(default=100000)
+    
+    # Analytics
+    ACTIVITY_FLUSH_INTERVAL_SECONDS: float = Field(default=10.0)  # How often buffered activity pings are written
+    ACTIVITY_FLUSH_BATCH_SIZE: int = Field(default=1000)  # Rows per activity upsert statement
+    
     # Stripe
     STRIPE_SECRET_KEY: str = Field(default="")
     STRIPE_WEBHOOK_SECRET: str = Field(default="")
     
-    # Groq
+    # Groq, through its OpenAI-compatible API; used for chat only when a key is set
     GROQ_API_KEY: str = Field(default="")
+    GROQ_BASE_URL: str = Field(default="https://api.groq.com/openai/v1")
+    GROQ_CHAT_MODEL: str = Field(default="llama-3.3-70b-versatile")
+    
+    # LLM routing
+    # Chat providers each subscription type may use, in order of preference, e.g.
+    # "Free:groq,openai;Pro:openai,groq"; "*" applies to any other subscription type
+    LLM_TIER_PROVIDERS: str = Field(default="Free:groq,openai;*:openai,groq")
+    LLM_ROUTING_WINDOW_SECONDS: float = Field(default=300.0)  # Latency and errors are judged over this window
+    LLM_ROUTING_MIN_SAMPLES: int = Field(default=20)  # Calls needed before a provider's statistics count
+    LLM_ROUTING_MAX_ERROR_RATE: float = Field(default=0.25)  # Providers failing more often are only used as fallback
+    LLM_ROUTING_LATENCY_MARGIN: float = Field(default=1.5)  # Leave the preferred provider when its p95 is this many times the best
+    LLM_ROUTING_EXPLORE_RATE: float = Field(default=0.05)  # Share of calls sent elsewhere to keep statistics fresh
+    LLM_MAX_RETRIES: int = Field(default=1)  # SDK retries per provider before failing over to the next
+    # A second request is sent when no token has arrived after the provider's p95 time to first token
+    LLM_HEDGING_ENABLED: bool = Field(default=True)
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = Field(default=1.0)  # Never hedge earlier than this
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = Field(default=5.0)  # Until enough first tokens have been timed
+    # Per-stage limits of a conversation turn
+    LLM_CONDENSE_TIMEOUT_SECONDS: float = Field(default=20.0)  # Rewriting the question with the chat history
+    RETRIEVAL_TIMEOUT_SECONDS: float = Field(default=15.0)  # Embedding the question and searching the documents
+    LLM_GENERATE_TIMEOUT_SECONDS: float = Field(default=60.0)  # Streaming the answer
+    CLIENT_DISCONNECT_POLL_SECONDS: float = Field(default=0.5)  # How often a turn checks that its client is still there
+    # While the LLM is failing, turns skip it and answer with the retrieved passages
+    LLM_BREAKER_FAILURE_THRESHOLD: int = Field(default=5)  # Consecutive failed LLM calls that open the circuit
+    LLM_BREAKER_RESET_SECONDS: float = Field(default=30.0)  # Time open before a single trial call is let through
+    DEGRADED_ANSWER_PASSAGES: int = Field(default=3)  # Passages quoted in an answer made without the LLM
+
+    # Idempotency-Key on the conversation endpoint
+    IDEMPOTENCY_KEY_TTL_SECONDS: float = Field(default=86400.0)  # How long a response is replayed to retries
+    IDEMPOTENCY_LOCK_SECONDS: float = Field(default=180.0)  # A claim older than this is taken over by a retry
+    IDEMPOTENCY_POLL_INTERVAL_SECONDS: float = Field(default=0.5)  # Retries waiting on another worker's answer
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: float = Field(default=3600.0)  # How often expired keys are deleted
+
+    # Admission control of conversation turns, per worker
+    ADMISSION_ENABLED: bool = Field(default=True)
+    ADMISSION_MAX_CONCURRENCY: int = Field(default=16)  # Turns running at once
+    ADMISSION_MAX_QUEUE: int = Field(default=64)  # Turns waiting for a slot before new ones get 429
+    ADMISSION_MAX_QUEUE_PER_USER: int = Field(default=4)  # Of which one user's
+    # Per subscription type, "*" for any other, e.g. "Free:1;Basic:2;Pro:4;*:1"
+    ADMISSION_TIER_WEIGHTS: str = Field(default="Free:1;Basic:2;Pro:4;*:1")  # Relative share of slots while turns wait
+    ADMISSION_TIER_CONCURRENCY: str = Field(default="Free:6;Basic:10;Pro:16;*:6")  # Turns of the type running at once
+    ADMISSION_TIER_RATE_PER_MINUTE: str = Field(default="Free:6;Basic:20;Pro:60;*:6")  # Turns a user may start
+    ADMISSION_TIER_BURST: str = Field(default="Free:3;Basic:5;Pro:10;*:3")  # Turns a user may start at once
+
+    # Batch questions endpoint
+    BATCH_MAX_QUESTIONS: int = Field(default=50)
+    BATCH_GENERATE_CONCURRENCY: int = Field(default=4)  # Questions of one batch searched and answered at once
+
+    # Answers reused for questions already asked about the same documents
+    ANSWER_CACHE_ENABLED: bool = Field(default=True)
+    ANSWER_CACHE_SIZE: int = Field(default=10000)  # Answers kept per worker
+    ANSWER_CACHE_TTL_SECONDS: float = Field(default=86400.0)
+    ANSWER_CACHE_SEMANTIC: bool = Field(default=True)  # Also serve answers to similarly worded questions
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = Field(default=0.95)  # Cosine similarity of the question embeddings
+    ANSWER_CACHE_SEMANTIC_ENTRIES: int = Field(default=1000)  # Questions compared against per document set
+    
+    @field_validator("SEARCH_TEXT_CONFIG")
+    @classmethod
+    def validate_search_text_config(cls, value: str) -> str:
+        # Written into the DDL of the generated tsvector column, which cannot take a bind parameter
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?", value):
+            raise ValueError(f"SEARCH_TEXT_CONFIG must be a text search configuration name, got {value!r}")
+        return value
+    
+    @property
+    def LLM_TIER_PROVIDER_MAP(self) -> Dict[str, List[str]]:
+        policy = {}
+        for entry in self.LLM_TIER_PROVIDERS.split(";"):
+            tier, _, providers = entry.partition(":")
+            if tier.strip():
+                policy[tier.strip()] = [name.strip() for name in providers.split(",") if name.strip()]
+        return policy
     
     class Config:
         env_file = [".env.local", ".env"]
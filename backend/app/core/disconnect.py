@@ -0,0 +1,32 @@
+import asyncio
+from typing import Awaitable, TypeVar
+from starlette.requests import Request
+
+T = TypeVar("T")
+
+class ClientDisconnected(Exception):
+    """The client went away before its response was ready"""
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_seconds: float) -> T:
+    """Await `awaitable`, cancelling it as soon as the client disconnects
+
+    The connection is checked every `poll_seconds`. Raises
+    ClientDisconnected once the cancelled work has unwound.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_seconds)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
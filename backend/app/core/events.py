@@ -1,9 +1,18 @@
+import asyncio
 import logging
-from typing import Callable
+from typing import Callable, Optional
 from fastapi import FastAPI
 from sqlalchemy import text
-from app.db.session import engine, SessionLocal
+from app.core.config import settings
+from app.db.session import engine, SessionLocal, replica_router
+from app.db.replicas import run_replica_health_checks
 from app.db.models import Base
+from app.services.analytics import run_activity_flusher, flush_activity_buffer
+from app.services.clients import open_clients, close_clients
+from app.services.idempotency import run_idempotency_key_purger
+from app.services.reaper import run_reaper, reap
+from app.services.search import ensure_search_index
+from app.services.vector_store import ensure_vector_store
 
 # Configure logging
 logging.basicConfig(
@@ -12,6 +21,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Background task writing buffered activity pings
+activity_flusher: Optional[asyncio.Task] = None
+
+# Background task re-checking read replica health and lag
+replica_health_checker: Optional[asyncio.Task] = None
+
+# Background task removing files and indexes of deleted documents
+reaper: Optional[asyncio.Task] = None
+
+# Background task deleting expired idempotency keys
+idempotency_key_purger: Optional[asyncio.Task] = None
+
 async def startup_event_handler() -> None:
     """
     Function to handle startup events:
@@ -23,6 +44,8 @@ async def startup_event_handler() -> None:
     
     # Create database tables if they don't exist
     Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
+    ensure_vector_store(engine)
     
     # Test database connection
     db = SessionLocal()
@@ -35,15 +58,70 @@ async def startup_event_handler() -> None:
         raise e
     finally:
         db.close()
+    
+    # Shared LLM and embedding clients with keep-alive connection pools
+    open_clients()
+    
+    # Start periodic flushing of buffered activity pings
+    global activity_flusher
+    activity_flusher = asyncio.create_task(
+        run_activity_flusher(settings.ACTIVITY_FLUSH_INTERVAL_SECONDS)
+    )
+    
+    # Start cleaning up after deleted documents
+    global reaper
+    reaper = asyncio.create_task(run_reaper(settings.REAPER_INTERVAL_SECONDS))
+    
+    # Stop replaying conversation responses once their idempotency keys expire
+    global idempotency_key_purger
+    idempotency_key_purger = asyncio.create_task(
+        run_idempotency_key_purger(settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS)
+    )
+    
+    # Check read replicas before serving reads from them, then keep checking
+    if replica_router.replicas:
+        global replica_health_checker
+        await asyncio.to_thread(replica_router.check_health)
+        for replica in replica_router.status():
+            logger.info(f"Read replica {replica['url']}: healthy={replica['healthy']} lag={replica['lag_seconds']}")
+        replica_health_checker = asyncio.create_task(
+            run_replica_health_checks(replica_router, settings.REPLICA_HEALTH_CHECK_INTERVAL_SECONDS)
+        )
 
 async def shutdown_event_handler() -> None:
     """
     Function to handle shutdown events:
-    - Close database connections
+    - Close database and LLM client connections
     - Release any resources
     """
     logger.info("Shutting down Pagey AI application")
     
-    # Close the database engine pool
+    # Stop the activity flusher and write whatever is still buffered
+    if activity_flusher:
+        activity_flusher.cancel()
+    try:
+        flushed = flush_activity_buffer()
+        logger.info(f"Flushed {flushed} buffered activity entries")
+    except Exception as e:
+        logger.error(f"Final activity flush failed: {str(e)}")
+    
+    # Stop the reaper and clean up what is already queued
+    if reaper:
+        reaper.cancel()
+    try:
+        reap()
+    except Exception as e:
+        logger.error(f"Final reaper run failed: {str(e)}")
+    
+    if idempotency_key_purger:
+        idempotency_key_purger.cancel()
+    
+    # Close the LLM and embedding connection pools
+    await close_clients()
+    
+    # Close the database engine pools
+    if replica_health_checker:
+        replica_health_checker.cancel()
+    replica_router.dispose()
     engine.dispose()
     logger.info("Database connections closed") 
\ No newline at end of file
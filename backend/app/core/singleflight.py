@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Run at most one computation per key at a time; concurrent callers with the same key share its result
+
+    The computation runs as its own task, so a caller that goes away does
+    not cancel it for the others. It is cancelled only once every caller
+    waiting on it has gone. Flights are per event loop, i.e. per worker.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, make: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(make()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._landed(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Removed now rather than in _landed, which runs a loop iteration
+                # later, so a caller arriving in between starts a new flight
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def _landed(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            flight.task.exception()  # Retrieved, so an error nobody waited for is not logged as unhandled
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
@@ -1,2 +1,2 @@
 # Import main DB components to make them available
-from app.db.session import Base, engine, SessionLocal, get_db 
\ No newline at end of file
+from app.db.session import Base, engine, SessionLocal, get_db, get_read_db 
\ No newline at end of file
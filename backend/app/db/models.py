@@ -2,7 +2,7 @@ from datetime import datetime, timedelta, UTC
 from typing import List
 from sqlalchemy import (
     Boolean, Column, ForeignKey, Integer, String, 
-    Text, DateTime, Float, Table, UniqueConstraint, ARRAY
+    Text, DateTime, Float, Table, UniqueConstraint, ARRAY, Index, LargeBinary
 )
 from sqlalchemy.orm import relationship
 from app.db.session import Base
@@ -11,8 +11,8 @@ from app.db.session import Base
 document_chat = Table(
     "document_chat",
     Base.metadata,
-    Column("document_id", Integer, ForeignKey("documents.id"), primary_key=True),
-    Column("chat_id", Integer, ForeignKey("chats.id"), primary_key=True),
+    Column("document_id", Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True),
+    Column("chat_id", Integer, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True),
 )
 
 class User(Base):
@@ -42,11 +42,15 @@ class Chat(Base):
     
     # Relationships
     user = relationship("User", back_populates="chats")
-    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
-    documents = relationship("Document", secondary=document_chat, back_populates="chats")
+    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan", passive_deletes=True)
+    documents = relationship("Document", secondary=document_chat, back_populates="chats", passive_deletes=True)
     
     # Calculated properties (handled in API)
     # document_count, message_count
+    
+    __table_args__ = (
+        Index('ix_chats_user_id_last_active_id', 'user_id', 'last_active', 'id'),
+    )
 
 class Document(Base):
     """Document model representing uploaded PDFs"""
@@ -64,18 +68,20 @@ class Document(Base):
     
     # Relationships
     user = relationship("User", back_populates="documents")
-    chats = relationship("Chat", secondary=document_chat, back_populates="documents")
-    content = relationship("DocumentContent", back_populates="document", cascade="all, delete-orphan")
-    sources = relationship("Source", back_populates="document", cascade="all, delete-orphan")
+    chats = relationship("Chat", secondary=document_chat, back_populates="documents", passive_deletes=True)
+    content = relationship("DocumentContent", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
+    sources = relationship("Source", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
 
 class DocumentContent(Base):
     """Document content model representing extracted text from PDFs"""
     __tablename__ = "document_content"
     
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"))
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"))
     page_number = Column(Integer)
     content = Column(Text)
+    # Full-text index (search_vector + GIN on PostgreSQL, FTS5 on SQLite) is
+    # maintained by the database, see app.services.search
     
     # Relationships
     document = relationship("Document", back_populates="content")
@@ -84,19 +90,58 @@ class DocumentContent(Base):
         UniqueConstraint('document_id', 'page_number', name='uix_document_page'),
     )
 
+class ChunkEmbedding(Base):
+    """Embedding of one retrieval chunk of a document"""
+    __tablename__ = "chunk_embeddings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    chunk_index = Column(Integer)  # Position of the chunk within the document
+    page_number = Column(Integer)
+    content = Column(Text)
+    embedding_model = Column(String)
+    embedding_dimensions = Column(Integer)
+    # Raw float32 vector, used when pgvector is unavailable; with pgvector the
+    # vector lives in an `embedding` column maintained by app.services.vector_store
+    embedding_blob = Column(LargeBinary, nullable=True)
+    
+    __table_args__ = (
+        UniqueConstraint(
+            'document_id', 'embedding_model', 'embedding_dimensions', 'chunk_index',
+            name='uix_chunk_embeddings_document_model_chunk',
+        ),
+    )
+
 class Message(Base):
     """Message model representing chat messages"""
     __tablename__ = "messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(Integer, ForeignKey("chats.id"))
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"))
     content = Column(Text)
     role = Column(String)  # "user" or "assistant"
     timestamp = Column(DateTime, default=lambda: datetime.now(UTC))
+    status = Column(String, default="complete", server_default="complete")  # "cancelled" when the turn was abandoned
     
     # Relationships
     chat = relationship("Chat", back_populates="messages")
-    sources = relationship("Source", back_populates="message", cascade="all, delete-orphan")
+    sources = relationship("Source", back_populates="message", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('ix_messages_chat_id_timestamp_id', 'chat_id', 'timestamp', 'id'),
+    )
+
+class IdempotencyKey(Base):
+    """Response to a conversation request, replayed to retries sent with the same Idempotency-Key"""
+    __tablename__ = "idempotency_keys"
+    
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String)  # SHA-256 of the message; a key may not be reused for another one
+    status = Column(String, default="in_progress")  # in_progress or completed
+    response = Column(Text, nullable=True)  # JSON of the response, once completed
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC), index=True)
+    claimed_at = Column(DateTime, default=lambda: datetime.now(UTC))  # When the current attempt started
 
 class Source(Base):
     """Source model representing citations/references from documents"""
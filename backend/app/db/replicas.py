@@ -0,0 +1,109 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Replication lag in seconds; 0 when the replica has replayed everything it received
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+@dataclass
+class ReplicaState:
+    """Health of one read replica as seen by the last check"""
+    url: str
+    engine: Engine
+    healthy: bool = False
+    lag_seconds: Optional[float] = None
+    last_checked: Optional[float] = None
+    last_error: Optional[str] = None
+
+class ReplicaRouter:
+    """Choose the engine read-only sessions are bound to
+
+    Reads are spread round-robin over replicas that answered the last health
+    check and are within `max_lag_seconds` of the primary. When no replica
+    qualifies, reads fall back to the primary engine.
+    """
+
+    def __init__(self, primary: Engine, replica_urls: List[str], max_lag_seconds: float):
+        self.primary = primary
+        self.max_lag_seconds = max_lag_seconds
+        self.replicas = [
+            ReplicaState(url=url, engine=create_engine(url, pool_pre_ping=True))
+            for url in replica_urls
+        ]
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def _measure_lag(self, replica: ReplicaState) -> float:
+        with replica.engine.connect() as connection:
+            if replica.engine.dialect.name != "postgresql":
+                # Nothing to measure (e.g. local SQLite replicas), only check reachability
+                connection.execute(text("SELECT 1"))
+                return 0.0
+            return float(connection.execute(REPLICA_LAG_QUERY).scalar() or 0)
+
+    def check_health(self):
+        """Probe every replica and record reachability and replication lag"""
+        for replica in self.replicas:
+            try:
+                lag = self._measure_lag(replica)
+                healthy, error = lag <= self.max_lag_seconds, None
+                if not healthy:
+                    error = f"replication lag {lag:.1f}s exceeds {self.max_lag_seconds:.1f}s"
+            except Exception as e:
+                lag, healthy, error = None, False, str(e)
+            with self._lock:
+                if replica.healthy and not healthy:
+                    logger.warning(f"Read replica {replica.engine.url!r} taken out of rotation: {error}")
+                elif healthy and not replica.healthy:
+                    logger.info(f"Read replica {replica.engine.url!r} in rotation (lag {lag:.1f}s)")
+                replica.healthy = healthy
+                replica.lag_seconds = lag
+                replica.last_error = error
+                replica.last_checked = time.time()
+
+    def get_read_engine(self) -> Engine:
+        """Engine for the next read-only session, the primary if no replica is usable"""
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return self.primary
+        return healthy[next(self._next) % len(healthy)].engine
+
+    def status(self) -> List[dict]:
+        """Current replica health, for logging and diagnostics"""
+        with self._lock:
+            return [
+                {
+                    "url": replica.engine.url.render_as_string(hide_password=True),
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag_seconds,
+                    "last_checked": replica.last_checked,
+                    "last_error": replica.last_error,
+                }
+                for replica in self.replicas
+            ]
+
+    def dispose(self):
+        """Close all replica connection pools"""
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+async def run_replica_health_checks(router: ReplicaRouter, interval_seconds: float):
+    """Re-check replica health every interval until cancelled"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await asyncio.to_thread(router.check_health)
@@ -1,11 +1,28 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, delete, event, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.core.config import settings
+from app.db.replicas import ReplicaRouter
 
 # Create database engine
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 
+if engine.dialect.name == "sqlite":
+    # SQLite only honours ON DELETE CASCADE with foreign keys enabled per connection
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+# Route read-only sessions to healthy replicas, falling back to the primary
+replica_router = ReplicaRouter(
+    engine,
+    settings.DATABASE_REPLICA_URL_LIST,
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+)
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -18,4 +35,36 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency for read-only routes; may be served by a replica that lags the primary
+def get_read_db():
+    db = SessionLocal(bind=replica_router.get_read_engine())
+    try:
+        yield db
+    finally:
+        db.close()
+
+def dialect_insert(db: Session):
+    """Return the dialect-specific INSERT construct that supports ON CONFLICT"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+def delete_in_batches(db: Session, model, *criteria, batch_size: int = 1000) -> int:
+    """Delete matching rows with set-based DELETEs, committing every batch
+
+    Dependent rows are removed by the database's ON DELETE CASCADE, and short
+    transactions keep row locks brief. Returns the number of rows deleted.
+    """
+    deleted = 0
+    while True:
+        ids = db.scalars(select(model.id).where(*criteria).limit(batch_size)).all()
+        if not ids:
+            return deleted
+        db.execute(
+            delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.commit()
+        deleted += len(ids)
+
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -8,7 +8,7 @@ class UserAnalytics(Base):
     __tablename__ = "user_analytics"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True)
+    user_id = Column(String, unique=True, index=True)
     total_chats = Column(Integer, default=0)
     total_pdfs = Column(Integer, default=0)
     active_time_minutes = Column(Float, default=0)
@@ -30,5 +30,10 @@ class DailyUsage(Base):
     chats_created = Column(Integer, default=0)
     pdfs_uploaded = Column(Integer, default=0)
     messages_sent = Column(Integer, default=0)
+    messages_received = Column(Integer, default=0)
     
-    analytics = relationship("UserAnalytics", back_populates="daily_usage") 
\ No newline at end of file
+    analytics = relationship("UserAnalytics", back_populates="daily_usage")
+
+    __table_args__ = (
+        UniqueConstraint('analytics_id', 'date', name='uix_daily_usage_analytics_date'),
+    ) 
\ No newline at end of file
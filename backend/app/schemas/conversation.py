@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.schemas.source import SourceBase
 
 class ChatSource(SourceBase):
@@ -11,6 +11,10 @@ class ChatRequest(BaseModel):
     message: str
     chat_id: int
 
+class BatchChatRequest(BaseModel):
+    """Independent questions about a chat's documents, answered together"""
+    questions: List[str] = Field(min_length=1)
+
 class ChatResponse(BaseModel):
     """Chat response schema for AI conversation"""
     id: int
@@ -29,6 +29,14 @@ class DocumentInDB(Document):
     """Document in database schema"""
     file_path: str
 
+class DocumentSearchHit(BaseModel):
+    """Page matching a keyword search"""
+    document_id: int
+    document_name: str
+    page_number: int
+    rank: float
+    snippet: str
+
 class PageContent(BaseModel):
     """Page content schema"""
     page_number: int
@@ -17,6 +17,7 @@ class Message(MessageBase):
     id: int
     chat_id: int
     timestamp: datetime
+    status: Optional[str] = "complete"  # "cancelled" when the client left before the turn was answered
     sources: List[Source] = []
     
     class Config:
@@ -0,0 +1,269 @@
+import asyncio
+import itertools
+import math
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.llm_router import LatencyStats
+
+def parse_tier_values(spec: str) -> Dict[str, float]:
+    """Per-subscription-type numbers from e.g. "Free:1;Pro:4;*:1", "*" applying to any other type"""
+    values = {}
+    for entry in spec.split(";"):
+        tier, _, value = entry.partition(":")
+        if tier.strip() and value.strip():
+            values[tier.strip()] = float(value)
+    return values
+
+class AdmissionRejected(Exception):
+    """A turn was turned away; the client may try again after `retry_after` seconds"""
+
+    def __init__(self, message: str, reason: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Up to `burst` turns at once, refilled at `rate_per_second`"""
+
+    def __init__(self, rate_per_second: float, burst: float, now: float):
+        self.rate_per_second = rate_per_second
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = now
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available, 0 when one is"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate_per_second if self.rate_per_second > 0 else math.inf
+
+    def take(self, now: float) -> float:
+        """Take a token; returns 0 when one was available, else the seconds until one is"""
+        wait = self.wait(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+@dataclass(eq=False)
+class _Waiter:
+    user_id: str
+    tier: str
+    start: float  # Virtual start and finish tags of the weighted fair queue
+    finish: float
+    seq: int
+    enqueued_at: float
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+class AdmissionController:
+    """Rate limits and a weighted fair queue in front of the conversation pipeline
+
+    Each user may start `rates_per_minute` turns per minute, with bursts of
+    up to `bursts` turns, by subscription type. Admitted turns run at most
+    `max_concurrency` at a time per worker and at most `tier_concurrency`
+    per subscription type. Turns waiting for a slot are served in weighted
+    fair order (start-time fair queuing): every user is a flow weighted by
+    its subscription type, so a user with many turns queued only delays
+    their own turns, and a "Pro" user with weight 4 gets four times the
+    slots of a "Free" user with weight 1 when both keep the queue busy.
+    Turns are turned away with AdmissionRejected when the user is over
+    their rate, or when the queue, or the user's share of it, is full.
+    State is per worker and only touched from its event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        max_queue_per_user: int,
+        weights: Dict[str, float],
+        tier_concurrency: Dict[str, float],
+        rates_per_minute: Dict[str, float],
+        bursts: Dict[str, float],
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.weights = weights
+        self.tier_concurrency = tier_concurrency
+        self.rates_per_minute = rates_per_minute
+        self.bursts = bursts
+        self.enabled = enabled
+        self._clock = clock
+        self._buckets = TTLCache(max_size=100000, ttl_seconds=3600.0)
+        self._queue: List[_Waiter] = []
+        self._queued_by_user: Counter = Counter()
+        self._last_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self.running = 0
+        self._running_by_tier: Counter = Counter()
+        self.admitted: Counter = Counter()
+        self.rejected: Counter = Counter()
+        self.delayed: Counter = Counter()
+        self.wait_times: Dict[str, LatencyStats] = {}
+        self.run_times = LatencyStats(settings.LLM_ROUTING_WINDOW_SECONDS, clock)
+
+    @staticmethod
+    def _for_tier(values: Dict[str, float], tier: str, default: float) -> float:
+        return values.get(tier, values.get("*", default))
+
+    def _check_rate(self, user_id: str, tier: str, take: bool = True):
+        now = self._clock()
+        bucket = self._buckets.get((user_id, tier))
+        if bucket is None:
+            rate = self._for_tier(self.rates_per_minute, tier, math.inf) / 60
+            bucket = TokenBucket(rate, self._for_tier(self.bursts, tier, 1), now)
+        wait = bucket.take(now) if take else bucket.wait(now)
+        # Re-set on every turn, so only idle users' buckets (full again by then) expire
+        self._buckets.set((user_id, tier), bucket)
+        if wait > 0:
+            raise AdmissionRejected(f"Too many messages, try again in {math.ceil(wait)}s", "rate_limited", wait)
+
+    def _queue_retry_after(self) -> float:
+        typical = self.run_times.snapshot()["p50_seconds"] or 1.0
+        return typical * math.ceil((len(self._queue) + 1) / self.max_concurrency)
+
+    def _check_queue(self, user_id: str):
+        if len(self._queue) >= self.max_queue or self._queued_by_user[user_id] >= self.max_queue_per_user:
+            reason = "queue_full" if len(self._queue) >= self.max_queue else "user_queue_full"
+            retry_after = self._queue_retry_after()
+            raise AdmissionRejected(f"Too many messages waiting, try again in {math.ceil(retry_after)}s", reason, retry_after)
+
+    def _enqueue(self, user_id: str, tier: str) -> _Waiter:
+        start = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+        finish = start + 1 / max(self._for_tier(self.weights, tier, 1), 1e-6)
+        self._last_finish[user_id] = finish
+        waiter = _Waiter(user_id, tier, start, finish, next(self._seq), self._clock())
+        self._queue.append(waiter)
+        self._queued_by_user[user_id] += 1
+        return waiter
+
+    def _dequeue(self, waiter: _Waiter):
+        self._queue.remove(waiter)
+        self._queued_by_user[waiter.user_id] -= 1
+        if not self._queued_by_user[waiter.user_id]:
+            del self._queued_by_user[waiter.user_id]
+
+    def _dispatch(self):
+        """Start the waiting turns with the smallest finish tags while slots are free"""
+        while self.running < self.max_concurrency:
+            # A cancelled waiter stays queued until its task resumes and takes itself out
+            eligible = [
+                waiter for waiter in self._queue
+                if not waiter.future.done()
+                and self._running_by_tier[waiter.tier] < self._for_tier(self.tier_concurrency, waiter.tier, math.inf)
+            ]
+            if not eligible:
+                break
+            waiter = min(eligible, key=lambda waiter: (waiter.finish, waiter.seq))
+            self._dequeue(waiter)
+            self._virtual_time = max(self._virtual_time, waiter.start)
+            self.running += 1
+            self._running_by_tier[waiter.tier] += 1
+            self.admitted[waiter.tier] += 1
+            self.wait_times.setdefault(
+                waiter.tier, LatencyStats(settings.LLM_ROUTING_WINDOW_SECONDS, self._clock)
+            ).record(self._clock() - waiter.enqueued_at, True)
+            waiter.future.set_result(None)
+        # Finish tags behind the virtual clock no longer affect anyone's order
+        self._last_finish = {
+            user_id: finish for user_id, finish in self._last_finish.items()
+            if finish > self._virtual_time or user_id in self._queued_by_user
+        }
+
+    def _release(self, tier: str):
+        self.running -= 1
+        self._running_by_tier[tier] -= 1
+        self._dispatch()
+
+    def check(self, user_id: str, tier: str):
+        """Raise AdmissionRejected if a turn of the user would be turned away now, without taking a token"""
+        if not self.enabled:
+            return
+        try:
+            self._check_queue(user_id)
+            self._check_rate(user_id, tier, take=False)
+        except AdmissionRejected as e:
+            self.rejected[e.reason] += 1
+            raise
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, tier: str, wait: bool = False) -> AsyncIterator[None]:
+        """Hold a slot for one turn, waiting for it in fair order; raises AdmissionRejected
+
+        With `wait`, a turn over the user's rate or finding the queue full
+        waits until it may try again instead, as the questions of a batch do.
+        """
+        if not self.enabled:
+            yield
+            return
+        while True:
+            try:
+                self._check_queue(user_id)
+                self._check_rate(user_id, tier)
+                break
+            except AdmissionRejected as e:
+                if not wait or math.isinf(e.retry_after):
+                    self.rejected[e.reason] += 1
+                    raise
+                self.delayed[e.reason] += 1
+                await asyncio.sleep(e.retry_after)
+        waiter = self._enqueue(user_id, tier)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(tier)  # Granted just as the caller went away
+            else:
+                self._dequeue(waiter)
+                self._dispatch()
+            raise
+        started = self._clock()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            self.run_times.record(self._clock() - started, succeeded)
+            self._release(tier)
+
+    def stats(self) -> Dict[str, Any]:
+        queued = Counter(waiter.tier for waiter in self._queue)
+        tiers = set(queued) | set(self._running_by_tier) | set(self.wait_times)
+        return {
+            "running": self.running,
+            "queued": len(self._queue),
+            "rejected": dict(self.rejected),
+            "delayed": dict(self.delayed),
+            "tiers": {
+                tier: {
+                    "running": self._running_by_tier[tier],
+                    "queued": queued[tier],
+                    "admitted": self.admitted[tier],
+                    "wait": self.wait_times[tier].snapshot() if tier in self.wait_times else None,
+                }
+                for tier in sorted(tiers)
+            },
+        }
+
+# Every conversation turn of the worker passes through here
+admission = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_queue_per_user=settings.ADMISSION_MAX_QUEUE_PER_USER,
+    weights=parse_tier_values(settings.ADMISSION_TIER_WEIGHTS),
+    tier_concurrency=parse_tier_values(settings.ADMISSION_TIER_CONCURRENCY),
+    rates_per_minute=parse_tier_values(settings.ADMISSION_TIER_RATE_PER_MINUTE),
+    bursts=parse_tier_values(settings.ADMISSION_TIER_BURST),
+    enabled=settings.ADMISSION_ENABLED,
+)
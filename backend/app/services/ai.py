@@ -1,60 +1,354 @@
+import asyncio
 import os
-from typing import List, Dict, Any, Optional
+import time
+from collections import Counter
+from typing import AsyncIterator, Awaitable, List, Dict, Any, Optional, Tuple, TypeVar
 import logging
 import re
 from difflib import SequenceMatcher
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain.chains import ConversationalRetrievalChain
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain.chains.question_answering.stuff_prompt import CHAT_PROMPT as QA_PROMPT
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from app.core.config import settings
+from app.core.singleflight import SingleFlight
 from app.db.models import Chat, Document, DocumentContent, Message
+from app.db.session import SessionLocal
 from app.schemas.message import MessageCreate
 from app.services.message import create_message, create_message_with_sources
+from app.services.user import get_subscription_type
+from app.services.retrieval import HybridRetriever, LexicalIndex, get_document_index, index_version
+from app.services.vector_store import ChunkEmbeddingStore
+from app.services.clients import get_clients
+from app.services.llm_router import LatencyStats
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.answer_cache import answer_cache
+from app.services.admission import admission
+from app.services.embeddings import EmbeddingPipeline, current_embedding_config
 from sqlalchemy.orm import Session
 from langchain_core.documents import Document as LCDocument
 import difflib
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Part of the answer cache key: bump it when the prompts below change, so answers to the old prompts are not served
+PROMPT_VERSION = "1"
+
+# End-to-end latency of conversation turns; the SLA is on its p99
+conversation_latency = LatencyStats(settings.LLM_ROUTING_WINDOW_SECONDS)
+
+# Turns abandoned per stage for exceeding its timeout
+stage_timeouts: Counter = Counter()
+
+# Requests whose client left before the answer, turns stopped because of it, and the stages they were stopped in
+turn_cancellations: Counter = Counter()
+cancelled_stages: Counter = Counter()
+
+# Shared by every conversation turn in the worker, so an LLM outage is noticed once
+llm_breaker = CircuitBreaker("llm", settings.LLM_BREAKER_FAILURE_THRESHOLD, settings.LLM_BREAKER_RESET_SECONDS)
+
+# Turns answered from retrieved passages alone, by why the LLM was skipped
+degraded_answers: Counter = Counter()
+
+class StageTimeoutError(Exception):
+    pass
+
+async def run_stage(stage: str, awaitable: Awaitable[T], timeout: float) -> T:
+    """Await one stage of a conversation turn, giving up after its timeout"""
+    try:
+        async with asyncio.timeout(timeout):
+            return await awaitable
+    except TimeoutError:
+        stage_timeouts[stage] += 1
+        raise StageTimeoutError(f"{stage} did not finish within {timeout:g}s")
+    except asyncio.CancelledError:
+        cancelled_stages[stage] += 1
+        raise
+
+# Index builds for the same documents, and identical questions in flight for the same chat, run once
+index_flights = SingleFlight()
+turn_flights = SingleFlight()
+
+def conversation_metrics() -> Dict[str, Any]:
+    return {
+        "single_flight": {"turns": turn_flights.stats(), "index_builds": index_flights.stats()},
+        "latency": conversation_latency.snapshot(),
+        "stage_timeouts": dict(stage_timeouts),
+        "cancellations": {**turn_cancellations, "stages": dict(cancelled_stages)},
+        "llm_breaker": llm_breaker.metrics(),
+        "degraded_answers": dict(degraded_answers),
+        "answer_cache": answer_cache.stats(),
+    }
+
+def passages_answer(source_documents: List[LCDocument], max_passages: int) -> Tuple[str, List[Dict[str, Any]]]:
+    """An answer quoting the best retrieved passages with their page citations, for when the LLM is unavailable"""
+    passages, seen_pages = [], set()
+    for doc in source_documents:
+        key = (doc.metadata.get("document_id"), doc.metadata.get("page"))
+        if key not in seen_pages:
+            seen_pages.add(key)
+            passages.append(doc)
+        if len(passages) == max_passages:
+            break
+
+    parts = [
+        "⚠️ The AI assistant is temporarily unavailable, so here are the passages from your documents "
+        "that best match your question:"
+    ]
+    sources = []
+    for i, doc in enumerate(passages, 1):
+        name, page = doc.metadata.get("document_name", "Unknown"), doc.metadata.get("page", 0)
+        text = doc.page_content.strip()
+        quote = "\n".join(f"> {line}" if line.strip() else ">" for line in text.splitlines())
+        parts.append(f"**{i}. {name}, page {page}**\n\n{quote}")
+        highlight = text[:200] + "..." if len(text) > 200 else text
+        sources.append({
+            "document_id": doc.metadata.get("document_id"),
+            "file": name,
+            "page": page,
+            "highlight": highlight,
+            "highlights": [highlight],
+            "content": highlight,
+            "key_phrases": [],
+        })
+    parts.append("Please try again in a moment for a full answer.")
+    return "\n\n---\n\n".join(parts), sources
+
 class PDFChatBot:
     def __init__(self, chat_id: int, db: Session):
         self.chat_id = chat_id
         self.db = db
-        self.embeddings = OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
+        self.clients = get_clients()
+        self.embeddings = self.clients.embeddings()
         self.vectorstore = None
         self.retriever = None
 
-    def _initialize_retrieval_chain(self, documents):
-        documents_text = []
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=100)
-        for document in documents:
-            document_contents = (
-                self.db.query(DocumentContent)
-                .filter(DocumentContent.document_id == document.id)
-                .all()
+    def _build_indexes(self, document_ids: List[int]) -> LexicalIndex:
+        # Runs in a worker thread on its own session, shared by every turn waiting on the same documents
+        with SessionLocal(bind=self.db.get_bind()) as db:
+            documents = db.query(Document).filter(Document.id.in_(document_ids)).order_by(Document.id).all()
+            # Chunks and their lexical postings are built once per document and persisted
+            lexical_index = LexicalIndex([get_document_index(db, document) for document in documents])
+            if lexical_index.chunks:
+                # Embeddings are stored in the database, so only chunks without one are embedded
+                ChunkEmbeddingStore(
+                    db, self.embeddings, document_ids, pipeline=EmbeddingPipeline(self.clients.embedder())
+                ).add_chunks(lexical_index.chunks)
+            return lexical_index
+
+    async def _initialize_retrieval_chain(self, documents):
+        document_ids = sorted(document.id for document in documents)
+        lexical_index = await index_flights.do(
+            (tuple(document_ids), current_embedding_config()),
+            lambda: asyncio.to_thread(self._build_indexes, document_ids),
+        )
+        if lexical_index.chunks:
+            self.vectorstore = ChunkEmbeddingStore(self.db, self.embeddings, document_ids)
+            self.retriever = HybridRetriever(
+                vectorstore=self.vectorstore,
+                lexical_index=lexical_index,
+                k=settings.RETRIEVAL_K,
+                fetch_k=settings.RETRIEVAL_FETCH_K,
+                rrf_k=settings.RRF_K,
+                index_version=index_version(self.vectorstore.document_ids, self.vectorstore.config),
             )
-            for content in document_contents:
-                if content.content:
-                    cleaned_text = re.sub(r"Page \\d+ of \\d+", "", content.content)
-                    cleaned_text = re.sub(r"\\s{2,}", " ", cleaned_text)
-                    splits = text_splitter.split_text(cleaned_text)
-                    for split in splits:
-                        documents_text.append(
-                            LCDocument(
-                                page_content=split,
-                                metadata={
-                                    "document_id": document.id,
-                                    "document_name": document.name,
-                                    "page": content.page_number,
-                                }
-                            )
-                        )
-        if documents_text:
-            self.vectorstore = FAISS.from_documents(documents_text, self.embeddings)
-            self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 10})
+
+    def _retrieve(self, question: str) -> List[LCDocument]:
+        # Runs in a worker thread on its own session, so a search that outlives its timeout
+        # never touches the request's session
+        if self.retriever is None:
+            return []
+        with Session(bind=self.db.get_bind()) as db:
+            vectorstore = ChunkEmbeddingStore(db, self.embeddings, self.vectorstore.document_ids)
+            return self.retriever.model_copy(update={"vectorstore": vectorstore}).invoke(question)
+
+    async def _ask_llm(self, stage: str, tier: Optional[str], messages: List[BaseMessage], timeout: float) -> str:
+        # Fails at once with CircuitOpenError while recent LLM calls keep failing
+        return await llm_breaker.call(
+            lambda: run_stage(stage, self.clients.complete(tier, messages, temperature=0.4), timeout)
+        )
+
+    def _save_answer(self, answer: str, sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+        db_sources = [
+            {
+                "document_id": s["document_id"],
+                "page": s["page"],
+                "highlight": s.get("highlight"),
+                "content": s.get("content"),
+                "key_phrases": s.get("key_phrases", [])  # Include key phrases in DB sources
+            }
+            for s in sources if "document_id" in s
+        ]
+
+        ai_db_message = create_message_with_sources(
+            self.db,
+            MessageCreate(chat_id=self.chat_id, content=answer, role="assistant"),
+            db_sources
+        )
+
+        return {"id": ai_db_message.id, "content": answer, "role": "assistant", "sources": sources}
+
+    def _sources_for(self, answer: str, source_documents: List[LCDocument]) -> List[Dict[str, Any]]:
+        """Cited passages of the retrieved documents, with the spans and phrases to highlight"""
+        def extract_relevant_spans(answer: str, page_content: str):
+            # Clean up answer and page_content for better matching
+            answer_lower = answer.lower()
+            
+            # Split page content into paragraphs
+            paragraphs = [p.strip() for p in re.split(r'\n{2,}', page_content) if p.strip()]
+            
+            relevant_spans = []
+            
+            # First try exact phrase matching for better highlighting precision
+            for para in paragraphs:
+                para_clean = para.replace('\n', ' ').strip()
+                if len(para_clean) < 10:  # Skip very short segments
+                    continue
+                    
+                # Look for exact phrases (3+ words) from the paragraph in the answer
+                words = para_clean.lower().split()
+                if len(words) >= 3:
+                    for i in range(len(words) - 2):
+                        phrase = ' '.join(words[i:i+3])
+                        if phrase in answer_lower and phrase not in [span.lower() for span in relevant_spans]:
+                            relevant_spans.append(para)
+                            break
+            
+            # If no exact matches, fall back to similarity-based matching
+            if not relevant_spans:
+                for para in paragraphs:
+                    para_clean = para.replace('\n', ' ').strip()
+                    if len(para_clean) < 20:
+                        continue
+                        
+                    # Count word matches between paragraph and answer
+                    match_count = sum(1 for word in para_clean.lower().split() 
+                                     if word.lower() in answer_lower and len(word) > 3)
+                    match_ratio = match_count / max(1, len(para_clean.split()))
+                    
+                    # Add paragraph if it has significant word overlap with the answer
+                    if match_ratio > 0.3 or para_clean.lower() in answer_lower:
+                        relevant_spans.append(para)
+            
+            return relevant_spans
+
+        # Extract and process key phrases from the answer for bi-directional highlighting
+        def extract_key_phrases(text, min_length=4, max_phrases=15):
+            # Split into sentences and clean up
+            sentences = re.split(r'[.!?]', text)
+            sentences = [s.strip() for s in sentences if len(s.strip()) > 10]
+            
+            # Extract important phrases
+            phrases = []
+            for sentence in sentences:
+                # Extract 3-5 word phrases as potential highlights
+                words = sentence.split()
+                if len(words) >= 3:
+                    for i in range(len(words) - 2):
+                        # Get phrases of different lengths
+                        for phrase_len in range(3, min(6, len(words) - i + 1)):
+                            phrase = ' '.join(words[i:i+phrase_len])
+                            if len(phrase) >= min_length and phrase.lower() not in [p.lower() for p in phrases]:
+                                phrases.append(phrase)
+            
+            # Return top phrases sorted by length (prefer longer phrases)
+            return sorted(phrases[:max_phrases], key=len, reverse=True)
+        
+        # Extract key phrases from the AI's answer to use for bi-directional highlighting
+        answer_key_phrases = extract_key_phrases(answer)
+        
+        # Filter sources to only include high-quality, truly relevant ones
+        def is_high_quality_source(doc, page_content, highlights):
+            # Skip if no clear highlights or content is too short
+            if not highlights or len(page_content) < 50:
+                return False
+                
+            # Ensure content has substantial matching with the answer
+            has_significant_match = False
+            for highlight in highlights:
+                if len(highlight) > 40:  # Only substantial highlights
+                    has_significant_match = True
+                    break
+                    
+            return has_significant_match
+            
+        # In the code where sources are processed:
+        filtered_sources = []
+        seen_pages = set()
+        
+        for doc in source_documents:
+            metadata = doc.metadata
+            doc_id, doc_name, page = metadata.get("document_id"), metadata.get("document_name"), metadata.get("page")
+            
+            if (doc_id, page) in seen_pages:
+                continue
+                
+            seen_pages.add((doc_id, page))
+            page_content = doc.page_content
+            
+            # Get relevant spans from the document
+            highlights = extract_relevant_spans(answer, page_content)
+            
+            # Skip if this source isn't high quality
+            if not is_high_quality_source(doc, page_content, highlights):
+                continue
+                
+            highlight_text = '\n\n'.join(highlights) if highlights else (page_content[:200] + "..." if len(page_content) > 200 else page_content)
+            
+            # Find document phrases that appear in the answer
+            doc_to_answer_matches = []
+            for highlight in highlights:
+                for phrase in answer_key_phrases:
+                    if phrase.lower() in highlight.lower():
+                        doc_to_answer_matches.append(phrase)
+            
+            # Find answer phrases that appear in the document
+            answer_to_doc_matches = []
+            for phrase in answer_key_phrases:
+                if phrase.lower() in page_content.lower():
+                    answer_to_doc_matches.append(phrase)
+            
+            # Combine both directions for better highlighting
+            all_highlight_phrases = list(set(doc_to_answer_matches + answer_to_doc_matches))
+            
+            filtered_sources.append({
+                "document_id": doc_id,
+                "file": doc_name,
+                "page": page,
+                "highlight": highlight_text,
+                "highlights": highlights,
+                "content": highlight_text,
+                "key_phrases": all_highlight_phrases
+            })
+            
+        # Limit sources to most relevant ones (max 4)
+        filtered_sources = filtered_sources[:4]
+        
+        sources = filtered_sources
+        
+        # Use only the most relevant one if there's a fallback needed
+        if not sources and source_documents:
+            doc = source_documents[0]
+            metadata = doc.metadata
+            page_content = doc.page_content
+            highlight = page_content[:200] + "..." if len(page_content) > 200 else page_content
+            
+            # Extract some key phrases for highlighting
+            key_phrases = extract_key_phrases(answer)
+            answer_phrases = [phrase for phrase in key_phrases if phrase.lower() in page_content.lower()]
+            
+            sources.append({
+                "document_id": metadata.get("document_id"),
+                "file": metadata.get("document_name", "Unknown"),
+                "page": metadata.get("page", 0),
+                "highlight": highlight,
+                "highlights": [highlight],
+                "content": highlight,
+                "key_phrases": answer_phrases
+            })
+
+        return sources
 
     async def process_message(self, user_message: str) -> Dict[str, Any]:
         # Always fetch the latest chat and documents
@@ -62,15 +356,7 @@ class PDFChatBot:
         if not chat:
             raise ValueError(f"Chat with ID {self.chat_id} not found")
         documents = chat.documents if chat else []
-        self._initialize_retrieval_chain(documents)
-
-        relevant_docs = []
-        if self.vectorstore:
-            relevant_docs = self.vectorstore.max_marginal_relevance_search(
-                user_message, k=10, fetch_k=20, lambda_mult=0.5
-            )
-            if not relevant_docs:
-                relevant_docs = self.vectorstore.similarity_search(user_message, k=5)
+        await self._initialize_retrieval_chain(documents)
 
         messages = (
             self.db.query(Message)
@@ -79,6 +365,9 @@ class PDFChatBot:
             .all()
         )
 
+        # Questions whose client left before they were answered are not part of the conversation
+        messages = [message for message in messages if message.status != "cancelled"]
+
         chat_history = []
         for message in messages[-10:]:
             if message.role == "user":
@@ -91,8 +380,6 @@ class PDFChatBot:
             MessageCreate(chat_id=self.chat_id, content=user_message, role="user")
         )
 
-        llm = ChatOpenAI(api_key=settings.OPENAI_API_KEY, temperature=0.4, model="gpt-4o")
-
         system_prompt = (
             "You are a highly capable AI assistant analyzing the PDF documents uploaded to this chat.\n"
             "IMPORTANT: NEVER say phrases like 'I don't have access' or similar disclaimers. You DO have complete access to all uploaded documents.\n"
@@ -113,201 +400,203 @@ class PDFChatBot:
             ("human", "{question}")
         ])
 
-        qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=llm,
-            retriever=self.retriever,
-            return_source_documents=True,
-            verbose=True,
-            condense_question_prompt=condense_prompt
-        )
-
+        started = time.perf_counter()
         try:
-            result = qa_chain.invoke({"question": user_message, "chat_history": chat_history})
-            answer = result["answer"]
-            source_documents = result.get("source_documents", [])
+            # Routed to OpenAI or Groq by subscription type and recent latency, hedged and failed over between them
+            tier = get_subscription_type(self.db, chat.user_id)
 
-            logger.warning("AI Final Answer Before Saving:\n" + answer)
+            # Looked up by the user's own words, before any LLM call. A follow-up's
+            # answer depends on its chat, so only first questions are looked up or stored
+            document_ids = tuple(sorted(document.id for document in documents))
+            use_cache = settings.ANSWER_CACHE_ENABLED and bool(document_ids) and not chat_history
+            question_embedding = None
+            if use_cache:
+                cached = answer_cache.get(document_ids, user_message, PROMPT_VERSION)
+                if cached is None and settings.ANSWER_CACHE_SEMANTIC:
+                    question_embedding = await run_stage(
+                        "retrieve", asyncio.to_thread(self.embeddings.embed_query, user_message),
+                        settings.RETRIEVAL_TIMEOUT_SECONDS,
+                    )
+                    cached = answer_cache.get_similar(document_ids, PROMPT_VERSION, question_embedding)
+                if cached is not None:
+                    conversation_latency.record(time.perf_counter() - started, True)
+                    return self._save_answer(cached.content, cached.sources)
 
-            def extract_relevant_spans(answer: str, page_content: str):
-                # Clean up answer and page_content for better matching
-                answer_lower = answer.lower()
-                
-                # Split page content into paragraphs
-                paragraphs = [p.strip() for p in re.split(r'\n{2,}', page_content) if p.strip()]
-                
-                relevant_spans = []
-                
-                # First try exact phrase matching for better highlighting precision
-                for para in paragraphs:
-                    para_clean = para.replace('\n', ' ').strip()
-                    if len(para_clean) < 10:  # Skip very short segments
-                        continue
-                        
-                    # Look for exact phrases (3+ words) from the paragraph in the answer
-                    words = para_clean.lower().split()
-                    if len(words) >= 3:
-                        for i in range(len(words) - 2):
-                            phrase = ' '.join(words[i:i+3])
-                            if phrase in answer_lower and phrase not in [span.lower() for span in relevant_spans]:
-                                relevant_spans.append(para)
-                                break
-                
-                # If no exact matches, fall back to similarity-based matching
-                if not relevant_spans:
-                    for para in paragraphs:
-                        para_clean = para.replace('\n', ' ').strip()
-                        if len(para_clean) < 20:
-                            continue
-                            
-                        # Count word matches between paragraph and answer
-                        match_count = sum(1 for word in para_clean.lower().split() 
-                                         if word.lower() in answer_lower and len(word) > 3)
-                        match_ratio = match_count / max(1, len(para_clean.split()))
-                        
-                        # Add paragraph if it has significant word overlap with the answer
-                        if match_ratio > 0.3 or para_clean.lower() in answer_lower:
-                            relevant_spans.append(para)
-                
-                return relevant_spans
+            question = user_message
+            llm_error = None
+            if chat_history:
+                # The condense step ConversationalRetrievalChain ran: the system prompt and the question
+                try:
+                    question = await self._ask_llm(
+                        "condense", tier, condense_prompt.format_messages(question=user_message),
+                        settings.LLM_CONDENSE_TIMEOUT_SECONDS,
+                    )
+                except Exception as e:
+                    llm_error = e
 
-            # Extract and process key phrases from the answer for bi-directional highlighting
-            def extract_key_phrases(text, min_length=4, max_phrases=15):
-                # Split into sentences and clean up
-                sentences = re.split(r'[.!?]', text)
-                sentences = [s.strip() for s in sentences if len(s.strip()) > 10]
-                
-                # Extract important phrases
-                phrases = []
-                for sentence in sentences:
-                    # Extract 3-5 word phrases as potential highlights
-                    words = sentence.split()
-                    if len(words) >= 3:
-                        for i in range(len(words) - 2):
-                            # Get phrases of different lengths
-                            for phrase_len in range(3, min(6, len(words) - i + 1)):
-                                phrase = ' '.join(words[i:i+phrase_len])
-                                if len(phrase) >= min_length and phrase.lower() not in [p.lower() for p in phrases]:
-                                    phrases.append(phrase)
-                
-                # Return top phrases sorted by length (prefer longer phrases)
-                return sorted(phrases[:max_phrases], key=len, reverse=True)
-            
-            # Extract key phrases from the AI's answer to use for bi-directional highlighting
-            answer_key_phrases = extract_key_phrases(answer)
-            
-            # Filter sources to only include high-quality, truly relevant ones
-            def is_high_quality_source(doc, page_content, highlights):
-                # Skip if no clear highlights or content is too short
-                if not highlights or len(page_content) < 50:
-                    return False
-                    
-                # Ensure content has substantial matching with the answer
-                has_significant_match = False
-                for highlight in highlights:
-                    if len(highlight) > 40:  # Only substantial highlights
-                        has_significant_match = True
-                        break
-                        
-                return has_significant_match
-                
-            # In the code where sources are processed:
-            filtered_sources = []
-            seen_pages = set()
-            
-            for doc in source_documents:
-                metadata = doc.metadata
-                doc_id, doc_name, page = metadata.get("document_id"), metadata.get("document_name"), metadata.get("page")
-                
-                if (doc_id, page) in seen_pages:
-                    continue
-                    
-                seen_pages.add((doc_id, page))
-                page_content = doc.page_content
-                
-                # Get relevant spans from the document
-                highlights = extract_relevant_spans(answer, page_content)
-                
-                # Skip if this source isn't high quality
-                if not is_high_quality_source(doc, page_content, highlights):
-                    continue
-                    
-                highlight_text = '\n\n'.join(highlights) if highlights else (page_content[:200] + "..." if len(page_content) > 200 else page_content)
-                
-                # Find document phrases that appear in the answer
-                doc_to_answer_matches = []
-                for highlight in highlights:
-                    for phrase in answer_key_phrases:
-                        if phrase.lower() in highlight.lower():
-                            doc_to_answer_matches.append(phrase)
-                
-                # Find answer phrases that appear in the document
-                answer_to_doc_matches = []
-                for phrase in answer_key_phrases:
-                    if phrase.lower() in page_content.lower():
-                        answer_to_doc_matches.append(phrase)
-                
-                # Combine both directions for better highlighting
-                all_highlight_phrases = list(set(doc_to_answer_matches + answer_to_doc_matches))
-                
-                filtered_sources.append({
-                    "document_id": doc_id,
-                    "file": doc_name,
-                    "page": page,
-                    "highlight": highlight_text,
-                    "highlights": highlights,
-                    "content": highlight_text,
-                    "key_phrases": all_highlight_phrases
-                })
-                
-            # Limit sources to most relevant ones (max 4)
-            filtered_sources = filtered_sources[:4]
-            
-            sources = filtered_sources
-            
-            # Use only the most relevant one if there's a fallback needed
-            if not sources and source_documents:
-                doc = source_documents[0]
-                metadata = doc.metadata
-                page_content = doc.page_content
-                highlight = page_content[:200] + "..." if len(page_content) > 200 else page_content
-                
-                # Extract some key phrases for highlighting
-                key_phrases = extract_key_phrases(answer)
-                answer_phrases = [phrase for phrase in key_phrases if phrase.lower() in page_content.lower()]
-                
-                sources.append({
-                    "document_id": metadata.get("document_id"),
-                    "file": metadata.get("document_name", "Unknown"),
-                    "page": metadata.get("page", 0),
-                    "highlight": highlight,
-                    "highlights": [highlight],
-                    "content": highlight,
-                    "key_phrases": answer_phrases
-                })
-
-            db_sources = [
-                {
-                    "document_id": s["document_id"],
-                    "page": s["page"],
-                    "highlight": s.get("highlight"),
-                    "content": s.get("content"),
-                    "key_phrases": s.get("key_phrases", [])  # Include key phrases in DB sources
-                }
-                for s in sources if "document_id" in s
-            ]
-
-            ai_db_message = create_message_with_sources(
-                self.db,
-                MessageCreate(chat_id=self.chat_id, content=answer, role="assistant"),
-                db_sources
+            source_documents = await run_stage(
+                "retrieve", asyncio.to_thread(self._retrieve, question), settings.RETRIEVAL_TIMEOUT_SECONDS
             )
+            if llm_error is None:
+                context = "\n\n".join(doc.page_content for doc in source_documents)
+                try:
+                    answer = await self._ask_llm(
+                        "generate", tier, QA_PROMPT.format_messages(context=context, question=question),
+                        settings.LLM_GENERATE_TIMEOUT_SECONDS,
+                    )
+                except Exception as e:
+                    llm_error = e
+            if llm_error is not None:
+                if not source_documents:
+                    raise llm_error
+                # Keep answering through an LLM outage with what retrieval found
+                degraded_answers["circuit_open" if isinstance(llm_error, CircuitOpenError) else "llm_error"] += 1
+                logger.warning(f"Answering from retrieved passages, LLM unavailable: {str(llm_error)}")
+                answer, sources = passages_answer(source_documents, settings.DEGRADED_ANSWER_PASSAGES)
+                conversation_latency.record(time.perf_counter() - started, True)
+                return self._save_answer(answer, sources)
+            conversation_latency.record(time.perf_counter() - started, True)
+
+            logger.warning("AI Final Answer Before Saving:\n" + answer)
+
+            sources = self._sources_for(answer, source_documents)
 
-            return {"id": ai_db_message.id, "content": answer, "role": "assistant", "sources": sources}
+            if use_cache:
+                answer_cache.set(document_ids, user_message, PROMPT_VERSION, answer, sources, question_embedding)
 
+            return self._save_answer(answer, sources)
+
+        except asyncio.CancelledError:
+            # Every request waiting on this turn has gone: no answer is generated or stored
+            turn_cancellations["turns_stopped"] += 1
+            user_db_message.status = "cancelled"
+            self.db.commit()
+            raise
         except Exception as e:
+            conversation_latency.record(time.perf_counter() - started, False)
             logger.error(f"Error processing message: {str(e)}")
             ai_db_message = create_message(
                 self.db,
                 MessageCreate(chat_id=self.chat_id, content="I'm sorry, I encountered an error processing your request.", role="assistant")
             )
-            return {"id": ai_db_message.id, "content": ai_db_message.content, "role": "assistant", "sources": []}
+            # Flagged so an Idempotency-Key is released rather than replaying the error
+            return {"id": ai_db_message.id, "content": ai_db_message.content, "role": "assistant", "sources": [], "error": True}
+
+    async def process_batch(self, questions: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Answer independent questions about the chat's documents, yielding each result as it is ready
+
+        The documents' indexes are loaded once, every question is embedded
+        in one request, and at most BATCH_GENERATE_CONCURRENCY questions are
+        searched and answered at a time. Each question is a turn of its own
+        for the admission controller: it takes a token from the user's rate
+        limit and a slot under the worker and tier caps, waiting for them
+        rather than failing. The questions are answered like first
+        questions, without the chat history. Each answered question is stored as a user and assistant
+        message pair; a question that fails yields an error instead, and so
+        does every question when the indexes or embeddings cannot be prepared.
+        """
+        try:
+            chat = self.db.query(Chat).filter(Chat.id == self.chat_id).first()
+            if not chat:
+                raise ValueError(f"Chat with ID {self.chat_id} not found")
+            documents = chat.documents
+            await self._initialize_retrieval_chain(documents)
+            tier = get_subscription_type(self.db, chat.user_id)
+            document_ids = tuple(sorted(document.id for document in documents))
+            use_cache = settings.ANSWER_CACHE_ENABLED and bool(document_ids)
+
+            # Retrieval and the answer cache then find each question's vector cached
+            vectors = await run_stage(
+                "retrieve", asyncio.to_thread(self.embeddings.embed_queries, questions), settings.RETRIEVAL_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            # Like a single message whose retrieval fails, every question gets an error reply
+            logger.error(f"Error preparing batch for chat {self.chat_id}: {str(e)}")
+            for index, question in enumerate(questions):
+                yield {"index": index, "question": question, "error": "I'm sorry, I encountered an error processing this question."}
+            return
+        question_slots = asyncio.Semaphore(max(1, settings.BATCH_GENERATE_CONCURRENCY))
+
+        async def answer(question: str, vector: List[float]) -> Tuple[str, List[Dict[str, Any]]]:
+            if use_cache:
+                cached = answer_cache.get(document_ids, question, PROMPT_VERSION)
+                if cached is None and settings.ANSWER_CACHE_SEMANTIC:
+                    cached = answer_cache.get_similar(document_ids, PROMPT_VERSION, vector)
+                if cached is not None:
+                    return cached.content, cached.sources
+            source_documents = await run_stage(
+                "retrieve", asyncio.to_thread(self._retrieve, question), settings.RETRIEVAL_TIMEOUT_SECONDS
+            )
+            context = "\n\n".join(doc.page_content for doc in source_documents)
+            try:
+                content = await self._ask_llm(
+                    "generate", tier, QA_PROMPT.format_messages(context=context, question=question),
+                    settings.LLM_GENERATE_TIMEOUT_SECONDS,
+                )
+            except Exception as e:
+                if not source_documents:
+                    raise
+                degraded_answers["circuit_open" if isinstance(e, CircuitOpenError) else "llm_error"] += 1
+                return passages_answer(source_documents, settings.DEGRADED_ANSWER_PASSAGES)
+            sources = self._sources_for(content, source_documents)
+            if use_cache:
+                answer_cache.set(document_ids, question, PROMPT_VERSION, content, sources, vector)
+            return content, sources
+
+        async def result(index: int) -> Tuple[int, Any]:
+            started = time.perf_counter()
+            try:
+                async with question_slots, admission.admit(chat.user_id, tier, wait=True):
+                    outcome = await answer(questions[index], vectors[index])
+            except Exception as e:
+                conversation_latency.record(time.perf_counter() - started, False)
+                return index, e
+            conversation_latency.record(time.perf_counter() - started, True)
+            return index, outcome
+
+        tasks = [asyncio.ensure_future(result(index)) for index in range(len(questions))]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                index, outcome = await next_result
+                question = questions[index]
+                if isinstance(outcome, Exception):
+                    logger.error(f"Error answering batch question {index}: {str(outcome)}")
+                    yield {"index": index, "question": question, "error": "I'm sorry, I encountered an error processing this question."}
+                    continue
+                create_message(self.db, MessageCreate(chat_id=self.chat_id, content=question, role="user"))
+                yield {"index": index, "question": question, "message": self._save_answer(*outcome)}
+        finally:
+            # The client went away: stop the questions still being answered
+            for task in tasks:
+                task.cancel()
+
+async def answer_message(db: Session, chat_id: int, user_message: str) -> Dict[str, Any]:
+    """Process a chat message; identical messages already in flight for the chat share its answer
+
+    Double-clicks, client retries and several open tabs then store one
+    user and one assistant message. The turn runs on its own session, as
+    it may outlive the request that started it. It waits for a slot from
+    the admission controller first, and raises AdmissionRejected when the
+    user is over their rate or the queue is full.
+    """
+    async def turn():
+        with SessionLocal(bind=db.get_bind()) as session:
+            user_id = session.query(Chat.user_id).filter(Chat.id == chat_id).scalar()
+            async with admission.admit(user_id, get_subscription_type(session, user_id)):
+                return await PDFChatBot(chat_id=chat_id, db=session).process_message(user_message)
+
+    return await turn_flights.do((chat_id, user_message.strip()), turn)
+
+async def answer_batch(db: Session, chat_id: int, questions: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Answer a batch of questions for a chat, yielding results as they finish
+
+    Like answer_message it runs on its own session, as the results are
+    streamed after the request's session is closed. The first step raises
+    AdmissionRejected when a single message of the user would be turned
+    away now; after that, the questions wait for their turns.
+    """
+    with SessionLocal(bind=db.get_bind()) as session:
+        user_id = session.query(Chat.user_id).filter(Chat.id == chat_id).scalar()
+        admission.check(user_id, get_subscription_type(session, user_id))
+        async for result in PDFChatBot(chat_id=chat_id, db=session).process_batch(questions):
+            yield result
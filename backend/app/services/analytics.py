@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import threading
+from datetime import date, datetime, time, timedelta, UTC
+from typing import Dict, Optional, Tuple
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import Chat, Document, Message
+from app.db.session import SessionLocal, dialect_insert
+from app.models.analytics import UserAnalytics, DailyUsage
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COUNTERS = ("chats_created", "pdfs_uploaded", "messages_sent", "messages_received")
+
+def day_bucket(db: Session, column):
+    """Truncate a timestamp column to its day, portably across PostgreSQL and SQLite"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("day", column)
+    return func.date(column)
+
+def as_date(value) -> date:
+    """Normalize a day bucket returned by the database to a date"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(UTC)
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+def day_start(day: date) -> datetime:
+    """Key under which a day's DailyUsage row is stored (midnight UTC)"""
+    return datetime.combine(day, time.min, tzinfo=UTC)
+
+def get_analytics_id(db: Session, user_id: str) -> int:
+    """Get the UserAnalytics id for a user, creating the row if needed"""
+    analytics_id = db.scalar(select(UserAnalytics.id).where(UserAnalytics.user_id == user_id))
+    if analytics_id is None:
+        db.execute(
+            dialect_insert(db)(UserAnalytics)
+            .values(
+                user_id=user_id,
+                total_chats=0,
+                total_pdfs=0,
+                active_time_minutes=0,
+                messages_sent=0,
+                messages_received=0,
+            )
+            .on_conflict_do_nothing(index_elements=[UserAnalytics.user_id])
+        )
+        analytics_id = db.scalar(select(UserAnalytics.id).where(UserAnalytics.user_id == user_id))
+    return analytics_id
+
+def record_daily_usage(
+    db: Session,
+    user_id: str,
+    day: Optional[date] = None,
+    minutes_active: float = 0,
+    **counters: int,
+):
+    """Add to a user's DailyUsage rollup for a day with a single upsert
+
+    The statement joins the caller's transaction; committing is left to the
+    write path that triggered it so the rollup and the source row land together.
+    """
+    unknown = set(counters) - set(ROLLUP_COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown rollup counters: {', '.join(sorted(unknown))}")
+    if not user_id:
+        return
+    values = {name: counters.get(name, 0) for name in ROLLUP_COUNTERS}
+    values["minutes_active"] = minutes_active
+    stmt = dialect_insert(db)(DailyUsage).values(
+        analytics_id=get_analytics_id(db, user_id),
+        date=day_start(day or datetime.now(UTC).date()),
+        **values,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyUsage.analytics_id, DailyUsage.date],
+        set_={
+            name: func.coalesce(getattr(DailyUsage, name), 0) + getattr(stmt.excluded, name)
+            for name in values
+        },
+    )
+    db.execute(stmt)
+
+def record_chat_created(db: Session, user_id: str):
+    """Count a newly created chat in today's rollup"""
+    record_daily_usage(db, user_id, chats_created=1)
+
+def record_document_uploaded(db: Session, user_id: str):
+    """Count a newly uploaded PDF in today's rollup"""
+    record_daily_usage(db, user_id, pdfs_uploaded=1)
+
+def record_message_created(db: Session, chat_id: int, role: str):
+    """Count a newly created message in today's rollup of the chat owner"""
+    user_id = db.scalar(select(Chat.user_id).where(Chat.id == chat_id))
+    if role == "user":
+        record_daily_usage(db, user_id, messages_sent=1)
+    elif role == "assistant":
+        record_daily_usage(db, user_id, messages_received=1)
+
+def get_daily_usage_data(db: Session, analytics_id: Optional[int], days: int = 14) -> Dict[str, list]:
+    """Get daily usage data for charts from the DailyUsage rollups
+
+    This is a single range scan over the (analytics_id, date) unique index.
+    """
+    today = datetime.now(UTC).date()
+    window_start = day_start(today - timedelta(days=days - 1))
+    rows = db.execute(
+        select(DailyUsage)
+        .where(DailyUsage.analytics_id == analytics_id, DailyUsage.date >= window_start)
+        .order_by(DailyUsage.date)
+    ).scalars()
+    by_day = {as_date(row.date): row for row in rows}
+
+    # Format data for charts, oldest day first
+    dates = []
+    minutes = []
+    chats = []
+    pdfs = []
+    messages = []
+    for i in reversed(range(days)):
+        day = today - timedelta(days=i)
+        row = by_day.get(day)
+        counts = {name: (getattr(row, name) or 0) if row else 0 for name in ROLLUP_COUNTERS}
+        dates.append(day.strftime("%m/%d"))
+        # Estimated activity, matching the overview estimate
+        minutes.append(
+            (counts["messages_sent"] + counts["messages_received"]) * 1.5
+            + counts["chats_created"] * 2
+            + counts["pdfs_uploaded"] * 3
+        )
+        chats.append(counts["chats_created"])
+        pdfs.append(counts["pdfs_uploaded"])
+        messages.append(counts["messages_sent"])
+    return {
+        "dates": dates,
+        "minutes": minutes,
+        "chats": chats,
+        "pdfs": pdfs,
+        "messages": messages,
+    }
+
+def backfill_daily_usage(db: Session, since: Optional[date] = None) -> int:
+    """Rebuild DailyUsage counters from raw chats, documents and messages
+
+    Counters are overwritten rather than incremented, so the backfill can be
+    re-run safely. Tracked minutes_active are left untouched. Returns the
+    number of (user, day) rollups written.
+    """
+    since_start = datetime.combine(since, time.min) if since else None
+    rollups: Dict[tuple, Dict[str, int]] = {}
+
+    def add(user_id, day, name, count):
+        if user_id is None or day is None:
+            return
+        counters = rollups.setdefault((user_id, as_date(day)), dict.fromkeys(ROLLUP_COUNTERS, 0))
+        counters[name] += count
+
+    chat_day = day_bucket(db, Chat.created_at).label("day")
+    query = select(Chat.user_id, chat_day, func.count(Chat.id)).group_by(Chat.user_id, chat_day)
+    if since_start:
+        query = query.where(Chat.created_at >= since_start)
+    for user_id, day, count in db.execute(query):
+        add(user_id, day, "chats_created", count)
+
+    document_day = day_bucket(db, Document.upload_date).label("day")
+    query = select(Document.user_id, document_day, func.count(Document.id)).group_by(Document.user_id, document_day)
+    if since_start:
+        query = query.where(Document.upload_date >= since_start)
+    for user_id, day, count in db.execute(query):
+        add(user_id, day, "pdfs_uploaded", count)
+
+    message_day = day_bucket(db, Message.timestamp).label("day")
+    query = (
+        select(
+            Chat.user_id,
+            message_day,
+            func.coalesce(func.sum(case((Message.role == "user", 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Message.role == "assistant", 1), else_=0)), 0),
+        )
+        .join(Chat, Chat.id == Message.chat_id)
+        .group_by(Chat.user_id, message_day)
+    )
+    if since_start:
+        query = query.where(Message.timestamp >= since_start)
+    for user_id, day, sent, received in db.execute(query):
+        add(user_id, day, "messages_sent", sent)
+        add(user_id, day, "messages_received", received)
+
+    analytics_ids = {}
+    for (user_id, day), counters in rollups.items():
+        if user_id not in analytics_ids:
+            analytics_ids[user_id] = get_analytics_id(db, user_id)
+        stmt = dialect_insert(db)(DailyUsage).values(
+            analytics_id=analytics_ids[user_id],
+            date=day_start(day),
+            minutes_active=0,
+            **counters,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyUsage.analytics_id, DailyUsage.date],
+            set_={name: getattr(stmt.excluded, name) for name in ROLLUP_COUNTERS},
+        )
+        db.execute(stmt)
+    db.commit()
+    return len(rollups)
+
+class ActivityBuffer:
+    """In-process accumulator for activity pings
+
+    Pings are summed per (user, day) in memory and written in batched upserts
+    by flush(), so a ping costs a dict update instead of several queries and
+    commits. Pings still buffered when the process dies are lost, which bounds
+    the loss to one flush interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._minutes: Dict[Tuple[str, date], float] = {}
+
+    def add(self, user_id: str, minutes: float, day: Optional[date] = None):
+        """Buffer active minutes for a user"""
+        key = (user_id, day or datetime.now(UTC).date())
+        with self._lock:
+            self._minutes[key] = self._minutes.get(key, 0) + minutes
+
+    def pending(self) -> int:
+        """Number of (user, day) entries waiting to be flushed"""
+        with self._lock:
+            return len(self._minutes)
+
+    def _drain(self) -> Dict[Tuple[str, date], float]:
+        with self._lock:
+            drained, self._minutes = self._minutes, {}
+        return drained
+
+    def _restore(self, drained: Dict[Tuple[str, date], float]):
+        with self._lock:
+            for key, minutes in drained.items():
+                self._minutes[key] = self._minutes.get(key, 0) + minutes
+
+    def flush(self, db: Session) -> int:
+        """Write buffered minutes with batched upserts; returns entries written
+
+        Entries are upserted ACTIVITY_FLUSH_BATCH_SIZE at a time, one
+        transaction per batch, so a statement stays under the driver's bind
+        parameter limit however many users are buffered. A batch that fails
+        goes back into the buffer; the others are still written, and the
+        first error is raised once every batch has been tried.
+        """
+        drained = list(self._drain().items())
+        batch_size = max(1, settings.ACTIVITY_FLUSH_BATCH_SIZE)
+        written = 0
+        error = None
+        for offset in range(0, len(drained), batch_size):
+            batch = dict(drained[offset:offset + batch_size])
+            try:
+                self._upsert(db, batch)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self._restore(batch)
+                error = error or e
+                continue
+            written += len(batch)
+        if error is not None:
+            raise error
+        return written
+
+    def _upsert(self, db: Session, batch: Dict[Tuple[str, date], float]):
+        totals: Dict[str, float] = {}
+        for (user_id, _), minutes in batch.items():
+            totals[user_id] = totals.get(user_id, 0) + minutes
+
+        stmt = dialect_insert(db)(UserAnalytics).values([
+            {
+                "user_id": user_id,
+                "total_chats": 0,
+                "total_pdfs": 0,
+                "active_time_minutes": minutes,
+                "messages_sent": 0,
+                "messages_received": 0,
+            }
+            for user_id, minutes in totals.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[UserAnalytics.user_id],
+            set_={
+                "active_time_minutes": func.coalesce(UserAnalytics.active_time_minutes, 0)
+                + stmt.excluded.active_time_minutes,
+            },
+        ))
+        analytics_ids = dict(db.execute(
+            select(UserAnalytics.user_id, UserAnalytics.id).where(UserAnalytics.user_id.in_(totals))
+        ).all())
+
+        stmt = dialect_insert(db)(DailyUsage).values([
+            {
+                "analytics_id": analytics_ids[user_id],
+                "date": day_start(day),
+                "minutes_active": minutes,
+                **dict.fromkeys(ROLLUP_COUNTERS, 0),
+            }
+            for (user_id, day), minutes in batch.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[DailyUsage.analytics_id, DailyUsage.date],
+            set_={
+                "minutes_active": func.coalesce(DailyUsage.minutes_active, 0)
+                + stmt.excluded.minutes_active,
+            },
+        ))
+
+activity_buffer = ActivityBuffer()
+
+def flush_activity_buffer() -> int:
+    """Flush the process-wide activity buffer using a fresh session"""
+    db = SessionLocal()
+    try:
+        return activity_buffer.flush(db)
+    finally:
+        db.close()
+
+async def run_activity_flusher(interval_seconds: float):
+    """Flush the activity buffer every interval until cancelled"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(flush_activity_buffer)
+        except Exception as e:
+            logger.error(f"Activity buffer flush failed: {str(e)}")
@@ -0,0 +1,143 @@
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.reaper import register_document_cleanup
+
+DocumentSet = Tuple[int, ...]
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation do not make a different question"""
+    return re.sub(r"\s+", " ", question).strip().strip("\"'").rstrip("?!. ").lower()
+
+@dataclass
+class CachedAnswer:
+    question: str
+    content: str
+    sources: List[Dict[str, Any]]
+
+class _QuestionVectors:
+    """Unit-normalised embeddings of the questions answered for one document set"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.questions: List[str] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    def add(self, question: str, vector: np.ndarray):
+        if question in self.questions:
+            return
+        self.questions.append(question)
+        vectors = vector[None, :] if self.vectors is None else np.vstack([self.vectors, vector])
+        if len(self.questions) > self.max_entries:
+            self.questions.pop(0)
+            vectors = vectors[1:]
+        self.vectors = vectors
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        if self.vectors is None or len(self.vectors[0]) != len(vector):
+            return None, 0.0
+        scores = self.vectors @ vector
+        best = int(np.argmax(scores))
+        return self.questions[best], float(scores[best])
+
+def _unit(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class AnswerCache:
+    """Answers to questions already asked about the same set of documents
+
+    The exact tier is keyed by the sorted document ids, the normalised
+    question and the prompt version. The semantic tier serves the answer to
+    the most similar earlier question about the same documents when the
+    cosine similarity of their embeddings reaches `similarity_threshold`.
+    Entries about a document are dropped when it is deleted.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, similarity_threshold: float, semantic_entries: int):
+        self.answers = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.question_vectors = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.similarity_threshold = similarity_threshold
+        self.semantic_entries = semantic_entries
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, document_ids: DocumentSet, question: str, version: str) -> Optional[CachedAnswer]:
+        """Exact tier: the same question, normalised, about the same documents"""
+        self._count("lookups")
+        answer = self.answers.get((document_ids, version, normalize_question(question)))
+        if answer is not None:
+            self._count("exact_hits")
+        return answer
+
+    def get_similar(
+        self, document_ids: DocumentSet, version: str, embedding: Sequence[float]
+    ) -> Optional[CachedAnswer]:
+        """Semantic tier, consulted after an exact miss"""
+        vectors = self.question_vectors.get((document_ids, version))
+        if vectors is not None:
+            with self._lock:
+                question, similarity = vectors.nearest(_unit(embedding))
+            if question is not None and similarity >= self.similarity_threshold:
+                answer = self.answers.get((document_ids, version, question))
+                if answer is not None:
+                    self._count("semantic_hits")
+                    return answer
+        return None
+
+    def set(
+        self,
+        document_ids: DocumentSet,
+        question: str,
+        version: str,
+        content: str,
+        sources: List[Dict[str, Any]],
+        embedding: Optional[Sequence[float]] = None,
+    ):
+        normalized = normalize_question(question)
+        self.answers.set((document_ids, version, normalized), CachedAnswer(question, content, sources))
+        if embedding is None:
+            return
+        with self._lock:
+            vectors = self.question_vectors.get((document_ids, version))
+            if vectors is None:
+                vectors = _QuestionVectors(self.semantic_entries)
+            vectors.add(normalized, _unit(embedding))
+            # Re-set to restart the TTL, which otherwise runs from the set's first answer
+            self.question_vectors.set((document_ids, version), vectors)
+
+    def drop_document(self, document_id: int):
+        """Forget every answer about a document"""
+        self.answers.delete_where(lambda key, _: document_id in key[0])
+        self.question_vectors.delete_where(lambda key, _: document_id in key[0])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "size": len(self.answers),
+                "lookups": self.lookups,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            }
+
+answer_cache = AnswerCache(
+    max_size=settings.ANSWER_CACHE_SIZE,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    semantic_entries=settings.ANSWER_CACHE_SEMANTIC_ENTRIES,
+)
+
+register_document_cleanup(answer_cache.drop_document)
@@ -1,8 +1,13 @@
 from datetime import datetime, UTC
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from sqlalchemy import delete, func, select, tuple_
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.db import models
+from app.db.session import delete_in_batches
 from app.schemas import chat as schemas
+from app.services.analytics import record_chat_created
+from app.services.pagination import decode_cursor, encode_cursor
 
 def get_chat_by_id(db: Session, chat_id: int):
     """Get a chat by ID with related messages and documents"""
@@ -17,7 +22,9 @@ def get_chats_by_user_id(db: Session, user_id: str, include_archived: bool = Fal
     """Get all chats for a user, optionally including archived chats"""
     query = db.query(models.Chat).filter(models.Chat.user_id == user_id)
     
-    if not include_archived:
+    if archived_only:
+        query = query.filter(models.Chat.is_archived == True)
+    elif not include_archived:
         query = query.filter(models.Chat.is_archived == False)
     
     chats = query.order_by(models.Chat.last_active.desc()).all()
@@ -29,6 +36,55 @@ def get_chats_by_user_id(db: Session, user_id: str, include_archived: bool = Fal
     
     return chats
 
+def get_chat_page(
+    db: Session,
+    user_id: str,
+    include_archived: bool = False,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    archived_only: bool = False,
+) -> Tuple[List[models.Chat], Optional[str]]:
+    """Get one page of a user's chats, most recently active first
+
+    With archived_only, only archived chats are returned (the trash).
+
+    Pages are keyed on (last_active, id); the returned cursor fetches the next
+    page. Document and message counts are computed in the same query instead
+    of loading every chat's relationships.
+    """
+    document_count = (
+        select(func.count())
+        .select_from(models.document_chat)
+        .where(models.document_chat.c.chat_id == models.Chat.id)
+        .correlate(models.Chat)
+        .scalar_subquery()
+    )
+    message_count = (
+        select(func.count(models.Message.id))
+        .where(models.Message.chat_id == models.Chat.id)
+        .correlate(models.Chat)
+        .scalar_subquery()
+    )
+    query = db.query(models.Chat, document_count, message_count).filter(models.Chat.user_id == user_id)
+    if not include_archived:
+        query = query.filter(models.Chat.is_archived == False)
+    if cursor:
+        query = query.filter(tuple_(models.Chat.last_active, models.Chat.id) < tuple_(*decode_cursor(cursor)))
+
+    rows = query.order_by(models.Chat.last_active.desc(), models.Chat.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_chat = rows[-1][0]
+        next_cursor = encode_cursor(last_chat.last_active, last_chat.id)
+
+    chats = []
+    for chat, documents, messages in rows:
+        setattr(chat, 'document_count', documents)
+        setattr(chat, 'message_count', messages)
+        chats.append(chat)
+    return chats, next_cursor
+
 def create_chat(db: Session, chat: schemas.ChatCreate):
     """Create a new chat"""
     db_chat = models.Chat(
@@ -38,6 +94,7 @@ def create_chat(db: Session, chat: schemas.ChatCreate):
         preview="New chat",
     )
     db.add(db_chat)
+    record_chat_created(db, chat.user_id)
     db.commit()
     db.refresh(db_chat)
     
@@ -67,12 +124,19 @@ def update_chat(db: Session, chat_id: int, chat_update: schemas.ChatUpdate):
     
     return db_chat
 
+def chat_exists(db: Session, chat_id: int) -> bool:
+    """Check whether a chat exists without loading it"""
+    return db.scalar(select(models.Chat.id).where(models.Chat.id == chat_id)) is not None
+
 def delete_chat_by_id(db: Session, chat_id: int):
-    """Delete a chat and all associated messages"""
-    db_chat = get_chat_by_id(db, chat_id)
-    if db_chat:
-        db.delete(db_chat)
-        db.commit()
+    """Delete a chat and all associated messages
+
+    Messages are deleted in batches with set-based DELETEs; their sources and
+    the chat's document links are removed by ON DELETE CASCADE.
+    """
+    delete_in_batches(db, models.Message, models.Message.chat_id == chat_id, batch_size=settings.DELETE_BATCH_SIZE)
+    db.execute(delete(models.Chat).where(models.Chat.id == chat_id).execution_options(synchronize_session=False))
+    db.commit()
     return True
 
 def add_document_to_chat(db: Session, chat_id: int, document_id: int):
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    pass
+
+@dataclass(frozen=True)
+class CallTicket:
+    """An allowed call: whether it is the half-open trial, and the circuit generation it was let through in"""
+    trial: bool
+    generation: int
+
+class CircuitBreaker:
+    """Stop calling a dependency that keeps failing, and retry it once in a while
+
+    Closed: calls go through, and `failure_threshold` consecutive failures
+    open the circuit. Open: calls fail at once with CircuitOpenError for
+    `reset_seconds`. Half-open: a single trial call is let through; its
+    success closes the circuit and its failure opens it again. Calls let
+    through before the circuit last opened cannot change its state when
+    they finish late; only the trial decides a half-open circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._generation = 0  # Bumped each time the circuit opens
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def _open(self):
+        if self._state != self.OPEN:
+            self.times_opened += 1
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._generation += 1
+
+    def allow(self) -> Optional[CallTicket]:
+        """A ticket if a call may go through now, else None
+
+        Every ticket must be handed back to record() or release().
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return CallTicket(trial=False, generation=self._generation)
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return CallTicket(trial=True, generation=self._generation)
+            self.rejected += 1
+            return None
+
+    def record(self, ticket: CallTicket, succeeded: bool):
+        with self._lock:
+            if ticket.trial:
+                self._trial_in_flight = False
+                if succeeded:
+                    self._failures = 0
+                    self._state = self.CLOSED
+                else:
+                    self._open()
+                return
+            if ticket.generation != self._generation or self._current_state() != self.CLOSED:
+                return  # Let through before the circuit opened; the trial decides now
+            if succeeded:
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open()
+
+    def release(self, ticket: CallTicket):
+        """Give back an allowed call that ended without telling anything about the dependency"""
+        if ticket.trial:
+            with self._lock:
+                self._trial_in_flight = False
+
+    async def call(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        ticket = self.allow()
+        if ticket is None:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            result = await make_call()
+        except asyncio.CancelledError:
+            self.release(ticket)
+            raise
+        except Exception:
+            self.record(ticket, False)
+            raise
+        self.record(ticket, True)
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
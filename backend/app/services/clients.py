@@ -0,0 +1,205 @@
+import logging
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+import httpx
+import openai
+from langchain_core.messages import BaseMessage
+from langchain_openai import ChatOpenAI
+from app.core.config import settings
+from app.services.embeddings import (
+    CachedQueryEmbeddings, EmbeddingConfig, current_embedding_config, get_embeddings, openai_embedder
+)
+from app.services.llm_router import LLMProvider, LLMRouter, configured_providers
+
+logger = logging.getLogger(__name__)
+
+class PoolStats:
+    """Request and connection counters of one HTTP connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def finished(self, error: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += error
+
+    def trace(self, event: str, info: Dict[str, Any]):
+        # httpcore reports every new TCP connection; requests without one reused a kept-alive connection
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+
+class MeteredTransport(httpx.HTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = self.stats.trace
+        self.stats.started()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            self.stats.finished(error=True)
+            raise
+        self.stats.finished()
+        return response
+
+class AsyncMeteredTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async def trace(event: str, info: Dict[str, Any]):
+            self.stats.trace(event, info)
+
+        request.extensions["trace"] = trace
+        self.stats.started()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            self.stats.finished(error=True)
+            raise
+        self.stats.finished()
+        return response
+
+def pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_SECONDS,
+    )
+
+def pool_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.HTTP_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+def _pool_metrics(transport, stats: PoolStats) -> Dict[str, Any]:
+    connections = transport._pool.connections
+    idle = sum(1 for connection in connections if connection.is_idle())
+    active = len(connections) - idle
+    return {
+        "max_connections": settings.HTTP_POOL_MAX_CONNECTIONS,
+        "open_connections": len(connections),
+        "active_connections": active,
+        "idle_connections": idle,
+        "utilization": round(active / settings.HTTP_POOL_MAX_CONNECTIONS, 3),
+        "in_flight": stats.in_flight,
+        "requests": stats.requests,
+        "errors": stats.errors,
+        "connections_opened": stats.connections_opened,
+        "connections_reused": max(0, stats.requests - stats.connections_opened),
+    }
+
+class ClientRegistry:
+    """Application-wide LLM and embedding clients sharing keep-alive connection pools
+
+    One sync and one async httpx pool serve every OpenAI call in the
+    process, so requests reuse TLS connections instead of opening new ones
+    per chat turn. langchain models are cached per configuration, and chat
+    models report their latency to the provider router.
+    """
+
+    def __init__(self):
+        self.sync_stats = PoolStats()
+        self.async_stats = PoolStats()
+        self.http_client = httpx.Client(
+            transport=MeteredTransport(self.sync_stats, limits=pool_limits()), timeout=pool_timeout()
+        )
+        self.http_async_client = httpx.AsyncClient(
+            transport=AsyncMeteredTransport(self.async_stats, limits=pool_limits()), timeout=pool_timeout()
+        )
+        self.openai = openai.OpenAI(
+            api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL or None, http_client=self.http_client
+        )
+        self.router = LLMRouter(configured_providers(), settings.LLM_TIER_PROVIDER_MAP)
+        self._lock = threading.Lock()
+        self._chat_models: Dict[Tuple[LLMProvider, float], ChatOpenAI] = {}
+        self._embeddings: Dict[EmbeddingConfig, CachedQueryEmbeddings] = {}
+
+    def chat_model(self, provider: LLMProvider, temperature: float) -> ChatOpenAI:
+        key = (provider, temperature)
+        with self._lock:
+            if key not in self._chat_models:
+                self._chat_models[key] = ChatOpenAI(
+                    api_key=provider.api_key,
+                    base_url=provider.base_url,
+                    model=provider.model,
+                    temperature=temperature,
+                    max_retries=settings.LLM_MAX_RETRIES,
+                    callbacks=[self.router.trackers[provider.name]],
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                )
+            return self._chat_models[key]
+
+    async def complete(
+        self, tier: Optional[str], messages: Sequence[BaseMessage], temperature: float, hedging: Optional[bool] = None
+    ) -> str:
+        """Routed, hedged chat completion for a subscription type"""
+        return await self.router.acomplete(
+            tier, messages, lambda provider: self.chat_model(provider, temperature), hedging
+        )
+
+    def embeddings(self, config: Optional[EmbeddingConfig] = None) -> CachedQueryEmbeddings:
+        """Embeddings client for a configuration; query vectors are cached per worker"""
+        config = config or current_embedding_config()
+        with self._lock:
+            if config not in self._embeddings:
+                self._embeddings[config] = CachedQueryEmbeddings(
+                    get_embeddings(
+                        config,
+                        base_url=settings.OPENAI_BASE_URL or None,
+                        http_client=self.http_client,
+                        http_async_client=self.http_async_client,
+                    ),
+                    config,
+                )
+            return self._embeddings[config]
+
+    def embedder(self, config: Optional[EmbeddingConfig] = None):
+        """Batch embedding function for EmbeddingPipeline; the pipeline does its own retrying"""
+        return openai_embedder(config or current_embedding_config(), self.openai.with_options(max_retries=0))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "sync": _pool_metrics(self.http_client._transport, self.sync_stats),
+            "async": _pool_metrics(self.http_async_client._transport, self.async_stats),
+        }
+
+    async def aclose(self):
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+def open_clients() -> ClientRegistry:
+    """Create the shared clients; called at startup"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
+
+def get_clients() -> ClientRegistry:
+    """The shared clients, created on first use outside the app (scripts, workers)"""
+    return _registry or open_clients()
+
+async def close_clients():
+    """Close the shared connection pools; called at shutdown"""
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
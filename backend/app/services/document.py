@@ -3,12 +3,16 @@ import uuid
 from typing import List, Optional
 from fastapi import UploadFile
 import aiofiles
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 from app.db import models
+from app.db.session import delete_in_batches
 from app.schemas import document as schemas
 from app.core.config import settings
 from app.services.pdf import extract_pdf_content
 from app.services.chat import add_document_to_chat
+from app.services.analytics import record_document_uploaded
+from app.services.reaper import schedule_document_cleanup
 import pdfplumber
 import pytesseract
 pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
@@ -50,6 +54,7 @@ async def create_document(db: Session, file: UploadFile, user_id: str, chat_id:
     )
     
     db.add(db_document)
+    record_document_uploaded(db, user_id)
     db.commit()
     db.refresh(db_document)
     
@@ -86,14 +91,17 @@ def get_documents_by_chat_id(db: Session, chat_id: int) -> List[models.Document]
     return []
 
 def delete_document_by_id(db: Session, document_id: int):
-    """Delete a document and its file"""
-    db_document = get_document_by_id(db, document_id)
-    if db_document:
-        # Delete file from disk if it exists
-        if os.path.exists(db_document.file_path):
-            os.remove(db_document.file_path)
-        
-        # Delete from database
-        db.delete(db_document)
-        db.commit()
+    """Delete a document; its file is removed later by the background reaper
+
+    Page content, sources and embeddings are deleted in batches with set-based DELETEs,
+    chat links are removed by ON DELETE CASCADE.
+    """
+    file_path = db.query(models.Document.file_path).filter(models.Document.id == document_id).scalar()
+    batch_size = settings.DELETE_BATCH_SIZE
+    delete_in_batches(db, models.Source, models.Source.document_id == document_id, batch_size=batch_size)
+    delete_in_batches(db, models.DocumentContent, models.DocumentContent.document_id == document_id, batch_size=batch_size)
+    delete_in_batches(db, models.ChunkEmbedding, models.ChunkEmbedding.document_id == document_id, batch_size=batch_size)
+    db.execute(delete(models.Document).where(models.Document.id == document_id).execution_options(synchronize_session=False))
+    db.commit()
+    schedule_document_cleanup(document_id, file_path)
     return True 
\ No newline at end of file
@@ -0,0 +1,282 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import openai
+from langchain_core.documents import Document as LCDocument
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Output size of each model when no shortened dimension is requested
+NATIVE_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+@dataclass(frozen=True)
+class EmbeddingConfig:
+    """Embedding model and output dimensions that stored vectors were produced with"""
+    model: str
+    dimensions: int
+
+    @property
+    def tag(self) -> str:
+        """Filesystem-safe name for indexes built with this configuration"""
+        return f"{self.model}-{self.dimensions}".replace("/", "_")
+
+    @property
+    def supports_shortening(self) -> bool:
+        return self.model.startswith("text-embedding-3")
+
+    def validate(self):
+        native = NATIVE_DIMENSIONS.get(self.model)
+        if self.dimensions <= 0:
+            raise ValueError(f"Embedding dimensions must be positive, got {self.dimensions}")
+        if native and self.dimensions > native:
+            raise ValueError(f"{self.model} produces at most {native} dimensions")
+        if native and not self.supports_shortening and self.dimensions != native:
+            raise ValueError(f"{self.model} only produces {native} dimensions")
+
+def current_embedding_config() -> EmbeddingConfig:
+    """Configuration new embeddings are written with and queries are embedded with"""
+    return EmbeddingConfig(model=settings.EMBEDDING_MODEL, dimensions=settings.EMBEDDING_DIMENSIONS)
+
+def get_embeddings(config: Optional[EmbeddingConfig] = None, **client_kwargs) -> OpenAIEmbeddings:
+    """OpenAI embeddings client for a configuration, the current one by default
+
+    The app gets these from the shared client registry (app.services.clients),
+    which passes its pooled http_client / http_async_client.
+    """
+    config = config or current_embedding_config()
+    config.validate()
+    return OpenAIEmbeddings(
+        api_key=settings.OPENAI_API_KEY,
+        model=config.model,
+        dimensions=config.dimensions if config.supports_shortening else None,
+        **client_kwargs,
+    )
+
+# Query vectors by (configuration, text); follow-ups, retries and regenerations embed the same strings
+query_embeddings = TTLCache(
+    max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    ttl_seconds=settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+)
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings client whose query vectors are served from query_embeddings when already computed"""
+
+    def __init__(self, embeddings: Embeddings, config: EmbeddingConfig, cache: TTLCache = query_embeddings):
+        self.embeddings = embeddings
+        self.config = config
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get((self.config, text))
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set((self.config, text), vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Query vectors for many texts, embedding the ones not yet cached in a single request"""
+        vectors = {text: self.cache.get((self.config, text)) for text in texts}
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            for text, vector in zip(missing, self.embeddings.embed_documents(missing)):
+                vectors[text] = vector
+                self.cache.set((self.config, text), vector)
+        return [vectors[text] for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self.cache.get((self.config, text))
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.set((self.config, text), vector)
+        return vector
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Tokens in text with tiktoken when its encoding is available, else about 4 characters per token"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+class AdaptiveConcurrencyLimiter:
+    """Bound in-flight embedding requests, shrinking the bound on rate limiting
+
+    Additive increase, multiplicative decrease: each success raises the
+    limit by one up to `max_limit`, each 429 halves it and holds back new
+    requests for the Retry-After the provider asked for, so throttled
+    batches do not stampede back together and burn their retries. The
+    limiter is shared by every pipeline in the process so that concurrent
+    uploads and re-index runs together respect the provider's limits.
+    """
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.rate_limited = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < self.limit:
+                    break
+                self._condition.wait(timeout=pause if pause > 0 else None)
+            self.in_flight += 1
+
+    def release(self, rate_limited: bool = False, retry_after: float = 0.0):
+        with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.limit = max(1, self.limit // 2)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            elif self.limit < self.max_limit:
+                self.limit += 1
+            self._condition.notify_all()
+
+embedding_limiter = AdaptiveConcurrencyLimiter(settings.EMBEDDING_MAX_CONCURRENCY)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError,
+)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay the provider asked for in a Retry-After header, if any"""
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(header), 60.0) if header is not None else None
+    except ValueError:
+        return None
+
+def _wait(retry_state) -> float:
+    """Rate-limited batches wait in the limiter's pause; other errors back off exponentially with jitter"""
+    if isinstance(retry_state.outcome.exception(), openai.RateLimitError):
+        return random.uniform(0, 0.1)
+    return wait_random_exponential(multiplier=0.5, max=30)(retry_state)
+
+def openai_embedder(config: EmbeddingConfig, client: openai.OpenAI) -> Callable[[List[str]], List[List[float]]]:
+    """Embed one batch with the OpenAI SDK; retries are left to the pipeline"""
+    extra = {"dimensions": config.dimensions} if config.supports_shortening else {}
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        response = client.embeddings.create(model=config.model, input=texts, **extra)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    return embed
+
+class EmbeddingPipeline:
+    """Embed many chunks in token-aware batches with bounded concurrency and retries
+
+    Batches hold at most EMBEDDING_BATCH_MAX_INPUTS texts and
+    EMBEDDING_BATCH_MAX_TOKENS tokens. Batches run on up to
+    EMBEDDING_MAX_CONCURRENCY threads through the shared adaptive limiter
+    and are retried with tenacity on rate limits and transient errors.
+    Each finished batch is handed to `on_batch` on the calling thread as
+    soon as it completes, so callers can persist progress and resume at
+    batch granularity after a failure.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], List[List[float]]],
+        max_inputs: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
+        self.embed = embed
+        self.max_inputs = max_inputs or settings.EMBEDDING_BATCH_MAX_INPUTS
+        self.max_tokens = max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+        self.max_attempts = max_attempts or settings.EMBEDDING_MAX_ATTEMPTS
+        self.limiter = limiter or embedding_limiter
+
+    def batches(self, chunks: List[LCDocument]) -> List[List[LCDocument]]:
+        """Split chunks into batches bounded by input count and token count"""
+        batches, batch, tokens = [], [], 0
+        for chunk in chunks:
+            chunk_tokens = count_tokens(chunk.page_content)
+            if batch and (len(batch) >= self.max_inputs or tokens + chunk_tokens > self.max_tokens):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(chunk)
+            tokens += chunk_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, batch: List[LCDocument]) -> List[List[float]]:
+        texts = [chunk.page_content for chunk in batch]
+
+        @retry(
+            retry=retry_if_exception_type(RETRYABLE_ERRORS),
+            wait=_wait,
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=True,
+        )
+        def attempt():
+            self.limiter.acquire()
+            rate_limited, retry_after = False, 0.0
+            try:
+                return self.embed(texts)
+            except openai.RateLimitError as e:
+                rate_limited = True
+                retry_after = retry_after_seconds(e) or random.uniform(1, 2)
+                raise
+            finally:
+                self.limiter.release(rate_limited, retry_after)
+        return attempt()
+
+    def run(
+        self,
+        chunks: List[LCDocument],
+        on_batch: Optional[Callable[[List[LCDocument], List[List[float]]], None]] = None,
+    ) -> int:
+        """Embed chunks, calling on_batch(batch, vectors) per finished batch; returns chunks embedded
+
+        Batches that still fail after all retries do not stop the others;
+        the first such error is raised once every batch has finished.
+        """
+        embedded, error = 0, None
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            futures = {pool.submit(self._embed_batch, batch): batch for batch in self.batches(chunks)}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    vectors = future.result()
+                    if on_batch:
+                        on_batch(batch, vectors)
+                    embedded += len(batch)
+                except Exception as e:
+                    logger.warning(f"Embedding batch of {len(batch)} chunks failed: {str(e)}")
+                    error = error or e
+        if error:
+            raise error
+        return embedded
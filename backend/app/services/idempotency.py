@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from sqlalchemy import delete, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+from app.db.models import IdempotencyKey
+from app.db.session import SessionLocal, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+# Requests this worker is answering, so a retry arriving here attaches instead of polling
+idempotency_flights = SingleFlight()
+
+class IdempotencyKeyReused(Exception):
+    """The key was first sent with a different message"""
+
+def request_hash(message: str) -> str:
+    return hashlib.sha256(message.encode()).hexdigest()
+
+def _claim(db: Session, chat_id: int, key: str, message_hash: str) -> Tuple[Optional[IdempotencyKey], bool]:
+    """Record a new attempt under the key; returns the key's row and whether this request owns the attempt
+
+    Expired keys are free again, and an attempt in progress for longer than
+    IDEMPOTENCY_LOCK_SECONDS (its worker died) is taken over.
+    """
+    now = datetime.now(UTC)
+    match = (IdempotencyKey.chat_id == chat_id, IdempotencyKey.key == key)
+    db.execute(delete(IdempotencyKey).where(
+        *match, IdempotencyKey.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+    ).execution_options(synchronize_session=False))
+    insert = dialect_insert(db)(IdempotencyKey).values(
+        chat_id=chat_id, key=key, request_hash=message_hash, status=IN_PROGRESS, created_at=now, claimed_at=now,
+    ).on_conflict_do_nothing()
+    claimed = db.execute(insert).rowcount == 1
+    if not claimed:
+        claimed = db.execute(update(IdempotencyKey).where(
+            *match,
+            IdempotencyKey.request_hash == message_hash,
+            IdempotencyKey.status == IN_PROGRESS,
+            IdempotencyKey.claimed_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+        ).values(claimed_at=now).execution_options(synchronize_session=False)).rowcount == 1
+    db.commit()
+    record = db.query(IdempotencyKey).filter(*match).populate_existing().first()
+    return record, claimed
+
+def _release(bind: Engine, chat_id: int, key: str):
+    with SessionLocal(bind=bind) as db:
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.chat_id == chat_id, IdempotencyKey.key == key, IdempotencyKey.status == IN_PROGRESS
+        ))
+        db.commit()
+
+async def _run_and_store(
+    bind: Engine, chat_id: int, key: str, run: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    match = (IdempotencyKey.chat_id == chat_id, IdempotencyKey.key == key)
+    try:
+        response = await run()
+    except BaseException:
+        # Nothing to replay: release the key so a retry runs the request again
+        _release(bind, chat_id, key)
+        raise
+    if response.get("error"):
+        # An apology for a failed turn is not the answer a retry should get
+        _release(bind, chat_id, key)
+        return response
+    with SessionLocal(bind=bind) as db:
+        db.execute(update(IdempotencyKey).where(*match).values(status=COMPLETED, response=json.dumps(response)))
+        db.commit()
+    return response
+
+async def run_idempotent(
+    db: Session, chat_id: int, key: str, message: str, run: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Tuple[Dict[str, Any], bool]:
+    """Answer a request sent with an Idempotency-Key at most once
+
+    The first request runs `run` and stores its response, unless the
+    response is flagged as an error; retries get the stored response, or wait for it while the first is still in flight,
+    here or on another worker. Returns the response and whether it was
+    replayed. Raises IdempotencyKeyReused when the key came with another
+    message.
+    """
+    message_hash = request_hash(message)
+    flight_key = (chat_id, key, message_hash)
+    run_once = lambda: _run_and_store(db.get_bind(), chat_id, key, run)
+    while True:
+        if idempotency_flights.in_flight(flight_key):
+            # A retry of a request this worker is still answering
+            return await idempotency_flights.do(flight_key, run_once), True
+        record, claimed = _claim(db, chat_id, key, message_hash)
+        if record is None:
+            continue  # Released by a failed attempt in between
+        if record.request_hash != message_hash:
+            raise IdempotencyKeyReused(f"Idempotency-Key {key!r} was used with a different message")
+        if record.status == COMPLETED:
+            return json.loads(record.response), True
+        if claimed:
+            return await idempotency_flights.do(flight_key, run_once), False
+        # Being answered by another worker
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_INTERVAL_SECONDS)
+
+def purge_expired_keys() -> int:
+    """Delete keys whose responses are no longer replayed; returns the count"""
+    cutoff = datetime.now(UTC) - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+    with SessionLocal() as db:
+        deleted = db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff).execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+    return deleted
+
+async def run_idempotency_key_purger(interval_seconds: float):
+    """Purge expired idempotency keys every interval"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            deleted = await asyncio.to_thread(purge_expired_keys)
+            if deleted:
+                logger.info(f"Purged {deleted} expired idempotency keys")
+        except Exception as e:
+            logger.error(f"Idempotency key purge failed: {str(e)}")
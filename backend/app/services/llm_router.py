@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+from uuid import UUID
+import numpy as np
+import openai
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Failures worth trying another provider for; anything else (bad request, auth) is raised
+FAILOVER_ERRORS = (
+    openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError,
+)
+
+@dataclass(frozen=True)
+class LLMProvider:
+    """An OpenAI-compatible chat endpoint"""
+    name: str
+    model: str
+    api_key: str
+    base_url: Optional[str] = None
+
+def configured_providers() -> Dict[str, LLMProvider]:
+    """Providers with credentials in Settings, by name"""
+    providers = {}
+    if settings.OPENAI_API_KEY:
+        providers["openai"] = LLMProvider(
+            name="openai",
+            model=settings.OPENAI_CHAT_MODEL,
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+        )
+    if settings.GROQ_API_KEY:
+        providers["groq"] = LLMProvider(
+            name="groq",
+            model=settings.GROQ_CHAT_MODEL,
+            api_key=settings.GROQ_API_KEY,
+            base_url=settings.GROQ_BASE_URL,
+        )
+    return providers
+
+class LatencyStats:
+    """Latencies and outcomes of calls over a rolling time window"""
+
+    def __init__(self, window_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls: deque = deque()  # (finished at, seconds, succeeded)
+
+    def record(self, seconds: float, succeeded: bool):
+        with self._lock:
+            self._calls.append((self._clock(), seconds, succeeded))
+            self._prune()
+
+    def _prune(self):
+        cutoff = self._clock() - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune()
+            calls = list(self._calls)
+        latencies = [seconds for _, seconds, succeeded in calls if succeeded]
+        errors = sum(1 for _, _, succeeded in calls if not succeeded)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (None, None, None)
+        return {
+            "calls": len(calls),
+            "errors": errors,
+            "error_rate": errors / len(calls) if calls else 0.0,
+            "p50_seconds": None if p50 is None else round(float(p50), 3),
+            "p95_seconds": None if p95 is None else round(float(p95), 3),
+            "p99_seconds": None if p99 is None else round(float(p99), 3),
+        }
+
+class LatencyTracker(BaseCallbackHandler):
+    """Callback timing every chat model call made against one provider
+
+    Records the whole call and, for streamed calls, the time to the first
+    token. Calls cancelled because a hedged twin won are not counted as
+    errors.
+    """
+    run_inline = True
+
+    def __init__(self, stats: LatencyStats, first_token_stats: LatencyStats):
+        self.stats = stats
+        self.first_token_stats = first_token_stats
+        self._started: Dict[UUID, float] = {}
+        self._streaming: set = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        started = self._started.get(run_id)
+        if started is not None and run_id not in self._streaming:
+            self._streaming.add(run_id)
+            self.first_token_stats.record(time.perf_counter() - started, True)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._streaming.discard(run_id)
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.stats.record(time.perf_counter() - started, True)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._streaming.discard(run_id)
+        started = self._started.pop(run_id, None)
+        if started is not None and not isinstance(error, asyncio.CancelledError):
+            self.stats.record(time.perf_counter() - started, False)
+
+@dataclass
+class _Attempt:
+    provider: LLMProvider
+    task: asyncio.Task
+    first_token: asyncio.Event
+    hedge: bool
+
+async def _stream_text(model: BaseChatModel, messages: Sequence[BaseMessage], first_token: asyncio.Event) -> str:
+    parts = []
+    async for chunk in model.astream(messages):
+        if chunk.content:
+            first_token.set()
+            parts.append(chunk.content)
+    first_token.set()
+    return "".join(parts)
+
+class LLMRouter:
+    """Pick a chat provider per call from tier policy and observed latency and errors
+
+    Each subscription type lists the providers it may use in order of
+    preference. The preferred healthy provider is used unless another
+    allowed one has a p95 latency `LLM_ROUTING_LATENCY_MARGIN` times
+    better; providers whose error rate exceeds `LLM_ROUTING_MAX_ERROR_RATE`
+    are only tried after the healthy ones. A small share of calls goes to
+    a random other provider so that statistics of unused providers stay
+    current. `run` fails over down the same order on connection errors,
+    timeouts, 429s and 5xx responses.
+    """
+
+    def __init__(
+        self,
+        providers: Dict[str, LLMProvider],
+        tier_policy: Dict[str, List[str]],
+        window_seconds: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        max_error_rate: Optional[float] = None,
+        latency_margin: Optional[float] = None,
+        explore_rate: Optional[float] = None,
+    ):
+        self.providers = providers
+        self.tier_policy = tier_policy
+        self.min_samples = settings.LLM_ROUTING_MIN_SAMPLES if min_samples is None else min_samples
+        self.max_error_rate = settings.LLM_ROUTING_MAX_ERROR_RATE if max_error_rate is None else max_error_rate
+        self.latency_margin = settings.LLM_ROUTING_LATENCY_MARGIN if latency_margin is None else latency_margin
+        self.explore_rate = settings.LLM_ROUTING_EXPLORE_RATE if explore_rate is None else explore_rate
+        window_seconds = window_seconds or settings.LLM_ROUTING_WINDOW_SECONDS
+        self.stats = {name: LatencyStats(window_seconds) for name in providers}
+        self.first_token_stats = {name: LatencyStats(window_seconds) for name in providers}
+        self.trackers = {name: LatencyTracker(self.stats[name], self.first_token_stats[name]) for name in providers}
+        self._lock = threading.Lock()
+        self.routed = {name: 0 for name in providers}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def allowed(self, tier: Optional[str]) -> List[LLMProvider]:
+        names = self.tier_policy.get(tier or "", self.tier_policy.get("*", list(self.providers)))
+        return [self.providers[name] for name in names if name in self.providers]
+
+    def candidates(self, tier: Optional[str]) -> List[LLMProvider]:
+        """Providers to try for a call, best first"""
+        allowed = self.allowed(tier)
+        snapshots = {provider.name: self.stats[provider.name].snapshot() for provider in allowed}
+
+        def known(name: str) -> bool:
+            return snapshots[name]["calls"] >= self.min_samples
+
+        healthy = [p for p in allowed if not known(p.name) or snapshots[p.name]["error_rate"] <= self.max_error_rate]
+        unhealthy = sorted(
+            (p for p in allowed if p not in healthy), key=lambda p: snapshots[p.name]["error_rate"]
+        )
+        if healthy:
+            chosen = healthy[0]
+            # Only the preferred provider needs a full sample to be judged slow; an alternative
+            # picked on a few lucky calls quickly gathers enough of its own to be judged in turn
+            measured = [p for p in healthy if snapshots[p.name]["p95_seconds"] is not None]
+            if known(chosen.name) and measured:
+                fastest = min(measured, key=lambda p: (snapshots[p.name]["p95_seconds"], snapshots[p.name]["p50_seconds"]))
+                if snapshots[chosen.name]["p95_seconds"] > self.latency_margin * snapshots[fastest.name]["p95_seconds"]:
+                    chosen = fastest
+            if len(healthy) > 1 and random.random() < self.explore_rate:
+                chosen = random.choice([p for p in healthy if p is not chosen])
+            healthy.remove(chosen)
+            healthy.insert(0, chosen)
+        return healthy + unhealthy
+
+    def run(self, tier: Optional[str], call: Callable[[LLMProvider], T]) -> T:
+        """Call the best provider for the tier, failing over to the next on provider errors"""
+        candidates = self.candidates(tier)
+        if not candidates:
+            raise RuntimeError(f"No LLM provider configured for subscription type {tier!r}")
+        for attempt, provider in enumerate(candidates):
+            self._routed(provider)
+            try:
+                return call(provider)
+            except FAILOVER_ERRORS as e:
+                if attempt == len(candidates) - 1:
+                    raise
+                self._increment("failovers")
+                logger.warning(f"LLM provider {provider.name} failed, failing over: {str(e)}")
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """Seconds to wait for a first token before hedging: the provider's observed p95"""
+        snapshot = self.first_token_stats[provider.name].snapshot()
+        if snapshot["calls"] >= self.min_samples and snapshot["p95_seconds"] is not None:
+            delay = snapshot["p95_seconds"]
+        else:
+            delay = settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(delay, settings.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+    def _routed(self, provider: LLMProvider):
+        with self._lock:
+            self.routed[provider.name] += 1
+
+    def _increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def acomplete(
+        self,
+        tier: Optional[str],
+        messages: Sequence[BaseMessage],
+        chat_model: Callable[[LLMProvider], BaseChatModel],
+        hedging: Optional[bool] = None,
+    ) -> str:
+        """Stream a completion from the best provider, hedging a slow start and failing over on errors
+
+        If no token has arrived after the provider's p95 time to first
+        token, a second request goes to the next candidate (or the same
+        provider when it is the only one). Whichever streams first is kept
+        and the other is cancelled, which closes its connection. Attempts
+        failing with provider errors before their first token are replaced
+        by the next candidate. Callers bound the whole call with a timeout.
+        """
+        candidates = self.candidates(tier)
+        if not candidates:
+            raise RuntimeError(f"No LLM provider configured for subscription type {tier!r}")
+        hedging = settings.LLM_HEDGING_ENABLED if hedging is None else hedging
+        untried = list(candidates)
+        attempts: List[_Attempt] = []
+        last_error: Optional[BaseException] = None
+
+        def launch(provider: LLMProvider, hedge: bool = False):
+            self._routed(provider)
+            first_token = asyncio.Event()
+            task = asyncio.create_task(_stream_text(chat_model(provider), messages, first_token))
+            attempts.append(_Attempt(provider, task, first_token, hedge))
+
+        loop = asyncio.get_running_loop()
+        launch(untried.pop(0))
+        hedge_at = loop.time() + self.hedge_delay(candidates[0]) if hedging else None
+        try:
+            while True:
+                winner = next((a for a in attempts if a.first_token.is_set()), None)
+                if winner is not None:
+                    break
+                if not attempts:
+                    if not untried:
+                        raise last_error
+                    self._increment("failovers")
+                    launch(untried.pop(0))
+                    continue
+                if hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    self._increment("hedges")
+                    launch(untried.pop(0) if untried else attempts[0].provider, hedge=True)
+                    continue
+                waiters = [asyncio.ensure_future(a.first_token.wait()) for a in attempts]
+                timeout = None if hedge_at is None else max(0.0, hedge_at - loop.time())
+                try:
+                    await asyncio.wait(
+                        waiters + [a.task for a in attempts], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    for waiter in waiters:
+                        waiter.cancel()
+                for attempt in [a for a in attempts if a.task.done() and not a.first_token.is_set()]:
+                    attempts.remove(attempt)
+                    error = attempt.task.exception()
+                    if not isinstance(error, FAILOVER_ERRORS):
+                        raise error
+                    last_error = error
+                    logger.warning(f"LLM provider {attempt.provider.name} failed, failing over: {str(error)}")
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.task.cancel()
+            if winner.hedge:
+                self._increment("hedge_wins")
+            return await winner.task
+        finally:
+            for attempt in attempts:
+                attempt.task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "providers": {
+                name: dict(
+                    self.stats[name].snapshot(),
+                    model=provider.model,
+                    routed=self.routed[name],
+                    first_token_p95_seconds=self.first_token_stats[name].snapshot()["p95_seconds"],
+                )
+                for name, provider in self.providers.items()
+            },
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
@@ -1,8 +1,11 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy import and_, case, exists, func, or_, select, tuple_
+from sqlalchemy.orm import Session, selectinload
 from app.db import models
 from app.schemas import message as schemas
 from app.services.chat import update_chat_last_active, update_chat_preview
+from app.services.analytics import record_message_created
+from app.services.pagination import decode_cursor, encode_cursor
 import logging
 
 def get_message_by_id(db: Session, message_id: int):
@@ -18,6 +21,108 @@ def get_messages_by_chat_id(db: Session, chat_id: int) -> List[models.Message]:
         .all()
     )
 
+def get_message_page(
+    db: Session,
+    chat_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Tuple[List[models.Message], Optional[str]]:
+    """Get one page of a chat's conversation, newest page first
+
+    Pages are keyed on (timestamp, id): without a cursor the latest `limit`
+    messages are returned, and the returned cursor fetches the page before
+    them. Messages come back in chronological order.
+
+    Only answered user/assistant pairs are shown: a user message that directly
+    follows another user message is hidden once an assistant reply exists
+    after it (e.g. retried questions). Cancelled questions are left out
+    entirely, so they never pair with a later answer. The rule is evaluated
+    in SQL with window functions over a bounded backward index scan, so the
+    cost of a page does not depend on the length of the chat.
+    """
+    conditions = [models.Message.chat_id == chat_id, models.Message.status != "cancelled"]
+    answered_after_cursor = None
+    if cursor:
+        position = decode_cursor(cursor)
+        conditions.append(tuple_(models.Message.timestamp, models.Message.id) < tuple_(*position))
+        # Whether a reply exists in the pages already served
+        answered_after_cursor = exists().where(
+            models.Message.chat_id == chat_id,
+            models.Message.role == "assistant",
+            models.Message.status != "cancelled",
+            tuple_(models.Message.timestamp, models.Message.id) >= tuple_(*position),
+        )
+
+    # Hidden messages are rare, so scanning twice the page size is almost always
+    # enough; the scan is widened only when a page comes up short.
+    scan = 2 * (limit + 1)
+    while True:
+        recent = (
+            select(models.Message.id, models.Message.timestamp, models.Message.role)
+            .where(*conditions)
+            .order_by(models.Message.timestamp.desc(), models.Message.id.desc())
+            .limit(scan)
+            .subquery()
+        )
+        newest_first = (recent.c.timestamp.desc(), recent.c.id.desc())
+        ordered = select(
+            recent.c.id,
+            recent.c.timestamp,
+            recent.c.role,
+            func.row_number().over(order_by=newest_first).label("position"),
+            func.count().over().label("scanned"),
+            func.lead(recent.c.role).over(order_by=newest_first).label("previous_role"),
+            func.max(case((recent.c.role == "assistant", 1), else_=0))
+            .over(order_by=newest_first, rows=(None, -1))
+            .label("answered"),
+        ).subquery()
+
+        unanswered = ordered.c.answered == 0
+        if answered_after_cursor is not None:
+            unanswered = and_(unanswered, ~answered_after_cursor)
+        visible = or_(
+            ordered.c.role != "user",
+            ordered.c.previous_role.is_(None),
+            ordered.c.previous_role != "user",
+            unanswered,
+        )
+        # The newest row is always returned so the scan size is known even
+        # when every scanned message is hidden
+        rows = db.execute(
+            select(
+                ordered.c.id,
+                ordered.c.timestamp,
+                ordered.c.position,
+                ordered.c.scanned,
+                case((visible, 1), else_=0).label("visible"),
+            )
+            .where(or_(visible, ordered.c.position == 1))
+            .order_by(ordered.c.position)
+        ).all()
+
+        exhausted = not rows or rows[0].scanned < scan
+        # Unless the scan reached the first message, the oldest scanned row
+        # cannot see its predecessor and is left for the next scan
+        rows = [row for row in rows if row.visible and (exhausted or row.position < scan)]
+        if exhausted or len(rows) > limit:
+            break
+        scan *= 4
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+    ids = [row.id for row in rows]
+    messages = (
+        db.query(models.Message)
+        .options(selectinload(models.Message.sources).selectinload(models.Source.document))
+        .filter(models.Message.id.in_(ids))
+        .order_by(models.Message.timestamp, models.Message.id)
+        .all()
+    ) if ids else []
+    return messages, next_cursor
+
 def create_message(db: Session, message: schemas.MessageCreate):
     """Create a new message"""
     db_message = models.Message(
@@ -26,6 +131,7 @@ def create_message(db: Session, message: schemas.MessageCreate):
         role=message.role,
     )
     db.add(db_message)
+    record_message_created(db, message.chat_id, message.role)
     db.commit()
     db.refresh(db_message)
     
@@ -75,6 +181,7 @@ def create_message_with_sources(db: Session, message: schemas.MessageCreate, sou
         )
         db.add(db_source)
 
+    record_message_created(db, message.chat_id, message.role)
     db.commit()
     db.refresh(db_message)
     return db_message 
\ No newline at end of file
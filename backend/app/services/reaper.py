@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import Document
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Called with the id of every deleted document, e.g. to drop its search indexes
+document_cleanup_handlers: List[Callable[[int], None]] = []
+
+_lock = threading.Lock()
+_pending_documents: Dict[int, Optional[str]] = {}
+_attempts: Dict[int, int] = {}
+MAX_ATTEMPTS = 5
+
+def register_document_cleanup(handler: Callable[[int], None]):
+    """Run handler(document_id) in the background for every deleted document"""
+    document_cleanup_handlers.append(handler)
+
+def schedule_document_cleanup(document_id: int, file_path: Optional[str]):
+    """Queue the stored file and derived data of a deleted document for removal"""
+    with _lock:
+        _pending_documents[document_id] = file_path
+
+def pending() -> int:
+    """Number of deleted documents waiting for cleanup"""
+    with _lock:
+        return len(_pending_documents)
+
+def reap() -> int:
+    """Remove files and derived data of deleted documents; returns documents cleaned
+
+    Documents whose cleanup fails are retried on the next run, up to
+    MAX_ATTEMPTS times; files missed entirely are picked up by the orphan sweep.
+    """
+    with _lock:
+        batch = dict(_pending_documents)
+        _pending_documents.clear()
+
+    cleaned = 0
+    for document_id, file_path in batch.items():
+        try:
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            for handler in document_cleanup_handlers:
+                handler(document_id)
+            _attempts.pop(document_id, None)
+            cleaned += 1
+        except Exception as e:
+            attempts = _attempts.get(document_id, 0) + 1
+            if attempts < MAX_ATTEMPTS:
+                _attempts[document_id] = attempts
+                schedule_document_cleanup(document_id, file_path)
+            else:
+                _attempts.pop(document_id, None)
+            logger.warning(f"Cleanup of document {document_id} failed (attempt {attempts}): {str(e)}")
+    return cleaned
+
+def sweep_orphaned_uploads(db: Session, grace_seconds: float) -> int:
+    """Delete upload files no document refers to, e.g. after a crash before reaping
+
+    Files younger than grace_seconds are skipped so uploads still being
+    processed are never touched. Returns the number of files removed.
+    """
+    referenced = {
+        os.path.basename(path)
+        for path in db.scalars(select(Document.file_path).where(Document.file_path.is_not(None)))
+    }
+    removed = 0
+    cutoff = time.time() - grace_seconds
+    with os.scandir(settings.UPLOAD_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith(".") or entry.name in referenced:
+                continue
+            if entry.stat().st_mtime > cutoff:
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not remove orphaned upload {entry.path}: {str(e)}")
+    return removed
+
+def sweep() -> int:
+    """Run the orphan sweep with a fresh session"""
+    db = SessionLocal()
+    try:
+        return sweep_orphaned_uploads(db, settings.ORPHAN_UPLOAD_GRACE_SECONDS)
+    finally:
+        db.close()
+
+async def run_reaper(interval_seconds: float, sweep_every: int = 120):
+    """Reap deleted documents every interval and sweep orphans every sweep_every runs"""
+    runs = 0
+    while True:
+        await asyncio.sleep(interval_seconds)
+        runs += 1
+        try:
+            await asyncio.to_thread(reap)
+            if runs % sweep_every == 0:
+                removed = await asyncio.to_thread(sweep)
+                if removed:
+                    logger.info(f"Removed {removed} orphaned upload files")
+        except Exception as e:
+            logger.error(f"Reaper run failed: {str(e)}")
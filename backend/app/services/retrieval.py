@@ -0,0 +1,260 @@
+import logging
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document as LCDocument
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.models import Document, DocumentContent
+from app.services.reaper import register_document_cleanup
+
+logger = logging.getLogger(__name__)
+
+# Bump when the chunking or tokenization changes so persisted indexes are rebuilt
+INDEX_FORMAT_VERSION = 1
+
+# Identifiers such as "14.2", "AB-1234" or "v2/api" are kept as single tokens
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/]\w+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were will with what which who how when where does do".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms for the lexical index; compound identifiers also yield their parts"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token not in STOPWORDS:
+            tokens.append(token)
+        if any(separator in token for separator in ".-/"):
+            tokens.extend(part for part in re.split(r"[.\-/]", token) if part and part not in STOPWORDS)
+    return tokens
+
+def split_pages(document: Document, pages: Iterable[DocumentContent]) -> List[LCDocument]:
+    """Split a document's pages into overlapping chunks carrying their location"""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP
+    )
+    chunks = []
+    for content in pages:
+        if not content.content:
+            continue
+        cleaned_text = re.sub(r"Page \\d+ of \\d+", "", content.content)
+        cleaned_text = re.sub(r"\\s{2,}", " ", cleaned_text)
+        for split in text_splitter.split_text(cleaned_text):
+            chunks.append(
+                LCDocument(
+                    page_content=split,
+                    metadata={
+                        "document_id": document.id,
+                        "document_name": document.name,
+                        "page": content.page_number,
+                        "chunk": len(chunks),
+                    }
+                )
+            )
+    return chunks
+
+@dataclass
+class DocumentIndex:
+    """Chunks of one document with their term postings, persisted to disk"""
+    document_id: int
+    chunks: List[LCDocument]
+    postings: Dict[str, List[Tuple[int, int]]]  # term -> [(chunk position, term frequency)]
+    lengths: List[int]  # tokens per chunk
+    version: int = INDEX_FORMAT_VERSION
+    params: Tuple[int, int] = field(default_factory=lambda: (settings.CHUNK_SIZE, settings.CHUNK_OVERLAP))
+
+    @classmethod
+    def build(cls, document: Document, pages: Iterable[DocumentContent]) -> "DocumentIndex":
+        chunks = split_pages(document, pages)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for position, chunk in enumerate(chunks):
+            terms = tokenize(chunk.page_content)
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings[term].append((position, frequency))
+        return cls(document_id=document.id, chunks=chunks, postings=dict(postings), lengths=lengths)
+
+    def is_current(self) -> bool:
+        return self.version == INDEX_FORMAT_VERSION and tuple(self.params) == (settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+
+def index_path(document_id: int) -> str:
+    return os.path.join(settings.INDEX_DIR, "lexical", f"{document_id}.pkl")
+
+def save_document_index(index: DocumentIndex):
+    """Write an index atomically so concurrent readers never see a partial file"""
+    path = index_path(index.document_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as out_file:
+        pickle.dump(index, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def _read_document_index(document_id: int) -> Optional[DocumentIndex]:
+    try:
+        with open(index_path(document_id), "rb") as in_file:
+            index = pickle.load(in_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Discarding unreadable index for document {document_id}: {str(e)}")
+        return None
+    return index if index.is_current() else None
+
+# Loaded document indexes, so repeated turns in a chat do not re-read them
+document_indexes = TTLCache(
+    max_size=settings.LEXICAL_INDEX_CACHE_SIZE,
+    ttl_seconds=settings.LEXICAL_INDEX_CACHE_TTL_SECONDS,
+)
+
+def get_document_index(db: Session, document: Document) -> DocumentIndex:
+    """Load a document's index from memory or disk, building and persisting it on first use"""
+    index = document_indexes.get(document.id)
+    if index is not None:
+        return index
+    index = _read_document_index(document.id)
+    if index is None:
+        pages = (
+            db.query(DocumentContent)
+            .filter(DocumentContent.document_id == document.id)
+            .order_by(DocumentContent.page_number)
+            .all()
+        )
+        index = DocumentIndex.build(document, pages)
+        try:
+            save_document_index(index)
+        except OSError as e:
+            logger.warning(f"Could not persist index for document {document.id}: {str(e)}")
+    document_indexes.set(document.id, index)
+    return index
+
+def drop_document_index(document_id: int):
+    """Forget a deleted document's index in memory and on disk"""
+    document_indexes.delete(document_id)
+    try:
+        os.remove(index_path(document_id))
+    except FileNotFoundError:
+        pass
+
+register_document_cleanup(drop_document_index)
+
+def chunk_key(chunk: LCDocument) -> Hashable:
+    """Identity of a chunk across retrievers"""
+    return (chunk.metadata.get("document_id"), chunk.metadata.get("chunk"))
+
+class LexicalIndex:
+    """Okapi BM25 over the chunks of several documents
+
+    Collection statistics (document frequency, average length) are merged
+    from the per-document postings at query time, so documents can be
+    added to or removed from a chat without rebuilding anything.
+    """
+
+    def __init__(self, indexes: List[DocumentIndex], k1: float = 1.2, b: float = 0.75):
+        self.indexes = indexes
+        self.k1 = k1
+        self.b = b
+        self.size = sum(len(index.chunks) for index in indexes)
+        total_length = sum(sum(index.lengths) for index in indexes)
+        self.average_length = total_length / self.size if self.size else 0.0
+
+    @property
+    def chunks(self) -> List[LCDocument]:
+        return [chunk for index in self.indexes for chunk in index.chunks]
+
+    def search(self, query: str, k: int) -> List[Tuple[LCDocument, float]]:
+        """Best k chunks for the query with their BM25 scores"""
+        if not self.size:
+            return []
+        scores: Dict[Tuple[int, int], float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = [(i, index.postings.get(term)) for i, index in enumerate(self.indexes)]
+            frequency = sum(len(p) for _, p in postings if p)
+            if not frequency:
+                continue
+            idf = math.log(1 + (self.size - frequency + 0.5) / (frequency + 0.5))
+            for i, term_postings in postings:
+                if not term_postings:
+                    continue
+                lengths = self.indexes[i].lengths
+                for position, tf in term_postings:
+                    norm = 1 - self.b + self.b * lengths[position] / self.average_length
+                    scores[(i, position)] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.indexes[i].chunks[position], score) for (i, position), score in best]
+
+def reciprocal_rank_fusion(rankings: List[List[LCDocument]], k: int = 60) -> List[LCDocument]:
+    """Merge ranked lists, scoring each chunk by the sum of 1 / (k + rank)"""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    chunks: Dict[Hashable, LCDocument] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            key = chunk_key(chunk)
+            scores[key] += 1.0 / (k + rank)
+            chunks.setdefault(key, chunk)
+    return [chunks[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+def index_version(document_ids: Iterable[int], embedding_config: Hashable) -> Tuple:
+    """Identity of the searchable index over a set of documents
+
+    Documents never change once uploaded, so their ids, the embedding
+    configuration and the chunking parameters determine every search result.
+    """
+    return (
+        tuple(sorted(document_ids)), embedding_config, INDEX_FORMAT_VERSION, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP
+    )
+
+# Fused results by (index version, query, k, fetch_k, rrf_k), so retries and regenerations skip the search
+retrieval_results = TTLCache(
+    max_size=settings.RETRIEVAL_CACHE_SIZE,
+    ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+)
+
+def drop_retrieval_results(document_id: int):
+    """Forget cached results over a deleted document"""
+    retrieval_results.delete_where(lambda key, _: document_id in key[0][0])
+
+register_document_cleanup(drop_retrieval_results)
+
+class HybridRetriever(BaseRetriever):
+    """Fuse vector similarity and BM25 results with reciprocal rank fusion
+
+    With an index_version, results are cached in retrieval_results.
+    """
+    vectorstore: Optional[VectorStore] = None
+    lexical_index: Optional[LexicalIndex] = None
+    k: int = 10
+    fetch_k: int = 30
+    rrf_k: int = 60
+    index_version: Optional[Tuple] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[LCDocument]:
+        key = None if self.index_version is None else (self.index_version, query, self.k, self.fetch_k, self.rrf_k)
+        if key is not None:
+            cached = retrieval_results.get(key)
+            if cached is not None:
+                return list(cached)
+        rankings = []
+        if self.vectorstore is not None:
+            rankings.append(self.vectorstore.similarity_search(query, k=self.fetch_k))
+        if self.lexical_index is not None:
+            rankings.append([chunk for chunk, _ in self.lexical_index.search(query, self.fetch_k)])
+        results = reciprocal_rank_fusion(rankings, k=self.rrf_k)[:self.k]
+        if key is not None:
+            retrieval_results.set(key, results)
+        return list(results)
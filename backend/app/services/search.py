@@ -0,0 +1,149 @@
+import logging
+import re
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.schemas.document import DocumentSearchHit
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_START = "<mark>"
+SNIPPET_STOP = "</mark>"
+
+# PostgreSQL: a generated tsvector column kept in sync by the database, with a GIN index.
+# Its expression takes no bind parameters, so the configuration name, validated
+# as an identifier by the settings, is written into the DDL.
+POSTGRES_SEARCH_DDL = [
+    f"""
+    ALTER TABLE document_content ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('{settings.SEARCH_TEXT_CONFIG}'::regconfig, coalesce(content, ''))) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_document_content_search_vector
+    ON document_content USING gin (search_vector)
+    """,
+]
+
+# SQLite: an external-content FTS5 table over document_content, kept in sync by triggers
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_content_fts USING fts5(
+        content, content='document_content', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS document_content_fts_insert AFTER INSERT ON document_content BEGIN
+        INSERT INTO document_content_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS document_content_fts_delete AFTER DELETE ON document_content BEGIN
+        INSERT INTO document_content_fts(document_content_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS document_content_fts_update AFTER UPDATE ON document_content BEGIN
+        INSERT INTO document_content_fts(document_content_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO document_content_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+# Rank on the index first and only build headlines for the page of hits returned
+POSTGRES_SEARCH_QUERY = f"""
+    SELECT hits.document_id, d.name AS document_name, hits.page_number, hits.rank,
+           ts_headline(CAST(:text_config AS regconfig), dc.content, hits.query,
+                       'StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, MaxWords=35, MinWords=15, MaxFragments=2')
+               AS snippet
+    FROM (
+        SELECT dc.id, dc.document_id, dc.page_number, q.query,
+               ts_rank_cd(dc.search_vector, q.query) AS rank
+        FROM document_content dc
+        JOIN documents d ON d.id = dc.document_id,
+             websearch_to_tsquery(CAST(:text_config AS regconfig), :query) AS q(query)
+        WHERE d.user_id = :user_id
+          AND dc.search_vector @@ q.query
+          {{filters}}
+        ORDER BY rank DESC, dc.id
+        LIMIT :limit
+    ) hits
+    JOIN document_content dc ON dc.id = hits.id
+    JOIN documents d ON d.id = hits.document_id
+    ORDER BY hits.rank DESC, hits.id
+"""
+
+# bm25() is lower for better matches; it is negated so higher rank means better everywhere
+SQLITE_SEARCH_QUERY = f"""
+    SELECT dc.document_id, d.name AS document_name, dc.page_number,
+           -bm25(document_content_fts) AS rank,
+           snippet(document_content_fts, 0, '{SNIPPET_START}', '{SNIPPET_STOP}', '…', 35) AS snippet
+    FROM document_content_fts
+    JOIN document_content dc ON dc.id = document_content_fts.rowid
+    JOIN documents d ON d.id = dc.document_id
+    WHERE document_content_fts MATCH :query
+      AND d.user_id = :user_id
+      {{filters}}
+    ORDER BY bm25(document_content_fts), dc.id
+    LIMIT :limit
+"""
+
+def ensure_search_index(engine: Engine):
+    """Create the full-text index over document pages if it does not exist yet"""
+    dialect = engine.dialect.name
+    with engine.begin() as connection:
+        if dialect == "postgresql":
+            for statement in POSTGRES_SEARCH_DDL:
+                connection.execute(text(statement))
+        elif dialect == "sqlite":
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'document_content_fts'")
+            ).first()
+            for statement in SQLITE_SEARCH_DDL:
+                connection.execute(text(statement))
+            if not exists:
+                # Index pages stored before the FTS table existed
+                connection.execute(text("INSERT INTO document_content_fts(document_content_fts) VALUES ('rebuild')"))
+        else:
+            logger.warning(f"Full-text search is not supported on {dialect}")
+
+def to_fts5_query(query: str) -> str:
+    """Quote every term so user input is never parsed as FTS5 query syntax"""
+    terms = re.findall(r"\w+(?:[.\-]\w+)*", query)
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def search_document_pages(
+    db: Session,
+    user_id: str,
+    query: str,
+    chat_id: Optional[int] = None,
+    document_id: Optional[int] = None,
+    limit: int = 20,
+) -> List[DocumentSearchHit]:
+    """Keyword search over a user's document pages, best matches first
+
+    Uses the tsvector column and GIN index on PostgreSQL and the FTS5 table
+    on SQLite. Snippets highlight matches with <mark> tags.
+    """
+    params = {"user_id": user_id, "limit": limit}
+    filters = []
+    if chat_id is not None:
+        filters.append("AND dc.document_id IN (SELECT document_id FROM document_chat WHERE chat_id = :chat_id)")
+        params["chat_id"] = chat_id
+    if document_id is not None:
+        filters.append("AND dc.document_id = :document_id")
+        params["document_id"] = document_id
+
+    if db.get_bind().dialect.name == "postgresql":
+        statement = POSTGRES_SEARCH_QUERY
+        params["query"] = query
+        params["text_config"] = settings.SEARCH_TEXT_CONFIG
+    else:
+        statement = SQLITE_SEARCH_QUERY
+        params["query"] = to_fts5_query(query)
+        if not params["query"]:
+            return []
+
+    rows = db.execute(text(statement.format(filters="\n          ".join(filters))), params).mappings()
+    return [DocumentSearchHit(**row) for row in rows]
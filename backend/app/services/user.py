@@ -1,7 +1,16 @@
 from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.db import models
+from app.db.session import dialect_insert
 from app.schemas import user as schemas
 
+# Process-local cache of user ids known to exist, mapped to their subscription type
+known_users = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
+
 def get_user_by_id(db: Session, user_id: str):
     """Get a user by ID"""
     return db.query(models.User).filter(models.User.id == user_id).first()
@@ -26,8 +35,41 @@ def create_user_if_not_exists(db: Session, user: schemas.UserCreate):
     """Create a user if it doesn't exist, otherwise return existing user"""
     db_user = get_user_by_id(db, user.id)
     if db_user:
+        known_users.set(db_user.id, db_user.subscription_type or "Free")
         return db_user
-    return create_user(db, user) 
+    db_user = create_user(db, user)
+    known_users.set(db_user.id, db_user.subscription_type or "Free")
+    return db_user
+
+def ensure_user(db: Session, user: schemas.UserCreate) -> str:
+    """Make sure a user row exists, returning the user's subscription type
+
+    Known users are answered from the process-local cache without touching
+    the database. Unknown users are created with INSERT ... ON CONFLICT DO
+    NOTHING, so concurrent first requests for the same user cannot race.
+    """
+    subscription_type = known_users.get(user.id)
+    if subscription_type is not None:
+        return subscription_type
+    db.execute(
+        dialect_insert(db)(models.User)
+        .values(id=user.id, email=user.email, subscription_type=user.subscription_type or "Free")
+        .on_conflict_do_nothing()
+    )
+    db.commit()
+    subscription_type = db.query(models.User.subscription_type).filter(models.User.id == user.id).scalar()
+    subscription_type = subscription_type or "Free"
+    known_users.set(user.id, subscription_type)
+    return subscription_type
+
+def get_subscription_type(db: Session, user_id: str) -> str:
+    """A user's subscription type, from the process-local cache when known"""
+    subscription_type = known_users.get(user_id)
+    if subscription_type is None:
+        subscription_type = db.query(models.User.subscription_type).filter(models.User.id == user_id).scalar()
+        subscription_type = subscription_type or "Free"
+        known_users.set(user_id, subscription_type)
+    return subscription_type
 
 def update_user_subscription(db: Session, user_id: str, subscription_type: str):
     db_user = get_user_by_id(db, user_id)
@@ -36,4 +78,5 @@ def update_user_subscription(db: Session, user_id: str, subscription_type: str):
     db_user.subscription_type = subscription_type
     db.commit()
     db.refresh(db_user)
-    return db_user 
\ No newline at end of file
+    known_users.delete(user_id)
+    return db_user
@@ -0,0 +1,247 @@
+import glob
+import logging
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+import faiss
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.models import ChunkEmbedding
+from app.services.embeddings import EmbeddingConfig, current_embedding_config
+from app.services.reaper import register_document_cleanup
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class VectorIndex:
+    """Unit-normalised float32 vectors of one document's chunks
+
+    With memory-mapping the matrix is backed by the page cache, so every
+    worker process on a host shares a single copy and pages that are never
+    searched are never read.
+    """
+    document_id: int
+    chunk_indexes: np.ndarray  # int32, one per row
+    vectors: np.ndarray  # float32, rows x dimensions
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """Best k (cosine similarity, chunk index) pairs for a normalised query"""
+        if not len(self.chunk_indexes):
+            return []
+        scores = self.vectors @ query
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return [(float(scores[i]), int(self.chunk_indexes[i])) for i in top]
+
+@dataclass
+class FaissVectorIndex:
+    """Approximate or compressed FAISS index over one document's chunks"""
+    document_id: int
+    chunk_indexes: np.ndarray  # int32, one per FAISS id
+    index: Any
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """Best k (inner product, chunk index) pairs for a normalised query"""
+        if not len(self.chunk_indexes):
+            return []
+        scores, ids = self.index.search(query.reshape(1, -1), min(k, len(self.chunk_indexes)))
+        return [(float(score), int(self.chunk_indexes[i])) for score, i in zip(scores[0], ids[0]) if i >= 0]
+
+INDEX_MODES = ("flat", "ivf_flat", "hnsw", "sq8", "ivf_pq")
+
+def choose_index_spec(count: int, dimensions: int, mode: Optional[str] = None) -> str:
+    """FAISS index_factory string for a document's chunks, or "flat" for an exact .npy index
+
+    In "auto" mode small documents stay exact; larger ones trade a little
+    recall for speed (HNSW), then for memory: SQ8 stores a byte per dimension
+    and IVF-PQ one byte per 4 dimensions.
+    """
+    mode = (mode or settings.VECTOR_INDEX_MODE).lower()
+    if mode == "auto":
+        if count < settings.VECTOR_INDEX_FLAT_MAX_CHUNKS:
+            mode = "flat"
+        elif count < settings.VECTOR_INDEX_SQ8_MIN_CHUNKS:
+            mode = "hnsw"
+        elif count < settings.VECTOR_INDEX_PQ_MIN_CHUNKS:
+            mode = "sq8"
+        else:
+            mode = "ivf_pq"
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown vector index mode: {mode}")
+    # Each IVF list should get enough training points for k-means to be meaningful
+    nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+    if mode == "ivf_pq" and count < 256 * 39:
+        mode = "sq8"  # Too few vectors to train 256 centroids per PQ sub-quantizer
+    if mode in ("ivf_flat", "ivf_pq", "sq8") and nlist < 2:
+        return "flat"
+    if mode == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if mode == "hnsw":
+        return "HNSW32,Flat"
+    if mode == "sq8":
+        return f"IVF{nlist},SQ8"
+    if mode == "ivf_pq":
+        subquantizers = max(m for m in range(1, dimensions // 4 + 1) if dimensions % m == 0 and dimensions // m >= 4)
+        return f"IVF{nlist},PQ{subquantizers}x8"
+    return "flat"
+
+def vector_index_dir(config: Optional[EmbeddingConfig] = None) -> str:
+    """Indexes are kept apart per embedding configuration, so switching models never mixes them"""
+    return os.path.join(settings.INDEX_DIR, "vectors", (config or current_embedding_config()).tag)
+
+def vector_index_paths(document_id: int, config: Optional[EmbeddingConfig] = None) -> Tuple[str, str]:
+    directory = vector_index_dir(config)
+    return os.path.join(directory, f"{document_id}.npy"), os.path.join(directory, f"{document_id}.chunks.npy")
+
+def faiss_index_path(document_id: int, config: Optional[EmbeddingConfig] = None) -> str:
+    return os.path.join(vector_index_dir(config), f"{document_id}.faiss")
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def _save_array(path: str, array: np.ndarray):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as out_file:
+        np.save(out_file, array)
+    os.replace(tmp_path, path)
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def save_vector_index(
+    document_id: int, chunk_indexes: np.ndarray, vectors: np.ndarray, config: Optional[EmbeddingConfig] = None
+):
+    """Write a document's normalised vectors as raw .npy files, atomically"""
+    vectors_path, chunks_path = vector_index_paths(document_id, config)
+    os.makedirs(os.path.dirname(vectors_path), exist_ok=True)
+    _save_array(chunks_path, np.asarray(chunk_indexes, dtype=np.int32))
+    _save_array(vectors_path, normalize(vectors))
+    _remove(faiss_index_path(document_id, config))
+
+def build_vector_index(
+    document_id: int,
+    chunk_indexes: np.ndarray,
+    vectors: np.ndarray,
+    mode: Optional[str] = None,
+    config: Optional[EmbeddingConfig] = None,
+) -> str:
+    """Train and persist the index type chosen for this many chunks; returns its spec
+
+    Called at ingestion, so training cost is paid once per document rather
+    than on the query path.
+    """
+    vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(len(chunk_indexes), -1))
+    spec = choose_index_spec(len(vectors), vectors.shape[1], mode)
+    if spec == "flat":
+        save_vector_index(document_id, chunk_indexes, vectors, config)
+        return spec
+    index = faiss.index_factory(vectors.shape[1], spec, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add(vectors)
+    path = faiss_index_path(document_id, config)
+    vectors_path, chunks_path = vector_index_paths(document_id, config)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _save_array(chunks_path, np.asarray(chunk_indexes, dtype=np.int32))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+    _remove(vectors_path)
+    return spec
+
+def _configure_search(index: Any):
+    """Apply query-time accuracy knobs of IVF and HNSW indexes"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.VECTOR_INDEX_NPROBE, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.VECTOR_EF_SEARCH
+
+def read_vector_index(document_id: int, mmap: Optional[bool] = None, config: Optional[EmbeddingConfig] = None):
+    """Open a persisted index, memory-mapped unless VECTOR_INDEX_MMAP is off"""
+    if mmap is None:
+        mmap = settings.VECTOR_INDEX_MMAP
+    vectors_path, chunks_path = vector_index_paths(document_id, config)
+    path = faiss_index_path(document_id, config)
+    try:
+        chunk_indexes = np.load(chunks_path)
+        if os.path.exists(path):
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP if mmap else faiss.IO_FLAG_READ_ONLY)
+            if index.ntotal != len(chunk_indexes):
+                return None
+            _configure_search(index)
+            return FaissVectorIndex(document_id=document_id, chunk_indexes=chunk_indexes, index=index)
+        vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Discarding unreadable vector index for document {document_id}: {str(e)}")
+        return None
+    if len(vectors) != len(chunk_indexes):
+        return None
+    return VectorIndex(document_id=document_id, chunk_indexes=chunk_indexes, vectors=vectors)
+
+def export_vector_index(db: Session, document_id: int, config: Optional[EmbeddingConfig] = None):
+    """Persist a document's stored BLOB embeddings as an on-disk index"""
+    config = config or current_embedding_config()
+    rows = db.execute(
+        select(ChunkEmbedding.chunk_index, ChunkEmbedding.embedding_blob)
+        .where(
+            ChunkEmbedding.document_id == document_id,
+            ChunkEmbedding.embedding_model == config.model,
+            ChunkEmbedding.embedding_dimensions == config.dimensions,
+            ChunkEmbedding.embedding_blob.is_not(None),
+        )
+        .order_by(ChunkEmbedding.chunk_index)
+    ).all()
+    if not rows:
+        return None
+    chunk_indexes = np.fromiter((row.chunk_index for row in rows), dtype=np.int32, count=len(rows))
+    vectors = np.frombuffer(b"".join(row.embedding_blob for row in rows), dtype=np.float32)
+    build_vector_index(document_id, chunk_indexes, vectors.reshape(len(rows), -1), config=config)
+    return read_vector_index(document_id, config=config)
+
+def rebuild_vector_index(db: Session, document_id: int, config: Optional[EmbeddingConfig] = None):
+    """Replace a document's on-disk index with one built from every embedding now stored"""
+    config = config or current_embedding_config()
+    drop_vector_index(document_id, config)
+    return export_vector_index(db, document_id, config)
+
+# Opened indexes; with memory-mapping an entry costs little more than a file handle
+vector_indexes = TTLCache(
+    max_size=settings.VECTOR_INDEX_CACHE_SIZE,
+    ttl_seconds=settings.VECTOR_INDEX_CACHE_TTL_SECONDS,
+)
+
+def get_vector_index(db: Session, document_id: int, config: Optional[EmbeddingConfig] = None):
+    """Open a document's vector index, exporting it from the database on first use"""
+    config = config or current_embedding_config()
+    index = vector_indexes.get((config, document_id))
+    if index is not None:
+        return index
+    index = read_vector_index(document_id, config=config)
+    if index is None:
+        try:
+            index = export_vector_index(db, document_id, config)
+        except OSError as e:
+            logger.warning(f"Could not persist vector index for document {document_id}: {str(e)}")
+            return None
+    if index is not None:
+        vector_indexes.set((config, document_id), index)
+    return index
+
+def drop_vector_index(document_id: int, config: Optional[EmbeddingConfig] = None):
+    """Forget a document's vector indexes in memory and on disk, for one or every configuration"""
+    vector_indexes.delete_where(lambda key, _: key[1] == document_id and (config is None or key[0] == config))
+    directory = vector_index_dir(config) if config else os.path.join(settings.INDEX_DIR, "vectors", "*")
+    for path in glob.glob(os.path.join(directory, f"{document_id}.*")):
+        _remove(path)
+
+register_document_cleanup(drop_vector_index)
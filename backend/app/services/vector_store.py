@@ -0,0 +1,444 @@
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document as LCDocument
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from sqlalchemy import bindparam, func, select, text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import ChunkEmbedding, Document
+from app.db.session import dialect_insert
+from app.services.embeddings import EmbeddingConfig, EmbeddingPipeline, current_embedding_config
+from app.services.vector_index import get_vector_index, normalize, rebuild_vector_index
+
+logger = logging.getLogger(__name__)
+
+PGVECTOR = "pgvector"
+NUMPY = "numpy"
+
+# Backend per database URL, detected on first use
+_backends: Dict[str, str] = {}
+
+PGVECTOR_AVAILABLE = text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")
+
+PGVECTOR_VERSION = text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+
+# Filtered HNSW searches keep scanning the index until enough rows pass the filters from 0.8.0 on
+ITERATIVE_SCAN_MIN_VERSION = (0, 8, 0)
+
+# Installed pgvector version per database URL, detected with the backend
+_pgvector_versions: Dict[str, Tuple[int, ...]] = {}
+
+PGVECTOR_COLUMN_EXISTS = text("""
+    SELECT 1 FROM information_schema.columns
+    WHERE table_name = 'chunk_embeddings' AND column_name = 'embedding' AND udt_name = 'vector'
+""")
+
+# Declared length of the embedding column; vectors of several sizes need an untyped column
+PGVECTOR_COLUMN_TYPMOD = text("""
+    SELECT atttypmod FROM pg_attribute
+    WHERE attrelid = 'chunk_embeddings'::regclass AND attname = 'embedding'
+""")
+
+PGVECTOR_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS vector",
+    "ALTER TABLE chunk_embeddings ADD COLUMN IF NOT EXISTS embedding vector",
+]
+
+PGVECTOR_INSERT = text("""
+    INSERT INTO chunk_embeddings
+        (document_id, chunk_index, page_number, content, embedding_model, embedding_dimensions, embedding)
+    VALUES
+        (:document_id, :chunk_index, :page_number, :content, :embedding_model, :embedding_dimensions,
+         CAST(:embedding AS vector))
+    ON CONFLICT (document_id, embedding_model, embedding_dimensions, chunk_index) DO NOTHING
+""")
+
+def pgvector_index_ddl(dimensions: int) -> str:
+    """Partial HNSW index over the vectors of one size, as pgvector indexes need a fixed length"""
+    return f"""
+        CREATE INDEX IF NOT EXISTS ix_chunk_embeddings_embedding_hnsw_{int(dimensions)}
+        ON chunk_embeddings USING hnsw ((embedding::vector({int(dimensions)})) vector_cosine_ops)
+        WHERE embedding_dimensions = {int(dimensions)}
+    """
+
+def pgvector_search(dimensions: int):
+    """Nearest-neighbour query matching the partial HNSW index for this size
+
+    The index answers the ORDER BY and the document and model filters are
+    applied to its candidates, so the query must run with
+    hnsw.iterative_scan enabled: the scan then goes on until k candidates
+    pass the filters (or hnsw.max_scan_tuples is reached) instead of
+    stopping after hnsw.ef_search. Relaxed order returns them slightly out
+    of order, hence the re-sort outside the materialized CTE.
+    """
+    vector = f"vector({int(dimensions)})"
+    return text(f"""
+        WITH nearest AS MATERIALIZED (
+            SELECT ce.document_id, ce.page_number, ce.chunk_index, ce.content,
+                   ce.embedding::{vector} <=> CAST(:embedding AS {vector}) AS distance
+            FROM chunk_embeddings ce
+            WHERE ce.embedding_dimensions = {int(dimensions)}
+              AND ce.embedding_model = :embedding_model
+              AND ce.document_id IN :document_ids
+              AND ce.embedding IS NOT NULL
+            ORDER BY distance
+            LIMIT :k
+        )
+        SELECT n.document_id, d.name AS document_name, n.page_number, n.chunk_index, n.content,
+               1 - n.distance AS score
+        FROM nearest n
+        JOIN documents d ON d.id = n.document_id
+        ORDER BY n.distance
+    """).bindparams(bindparam("document_ids", expanding=True))
+
+def pgvector_exact_search(dimensions: int):
+    """Exact nearest-neighbour query over the given documents' chunks
+
+    The ORDER BY does not match the HNSW index expression, so the rows are
+    found through the (document_id, ...) unique index and all of them are
+    ranked.
+    """
+    return text(f"""
+        SELECT ce.document_id, d.name AS document_name, ce.page_number, ce.chunk_index, ce.content,
+               1 - (ce.embedding <=> CAST(:embedding AS vector)) AS score
+        FROM chunk_embeddings ce
+        JOIN documents d ON d.id = ce.document_id
+        WHERE ce.embedding_dimensions = {int(dimensions)}
+          AND ce.embedding_model = :embedding_model
+          AND ce.document_id IN :document_ids
+          AND ce.embedding IS NOT NULL
+        ORDER BY ce.embedding <=> CAST(:embedding AS vector)
+        LIMIT :k
+    """).bindparams(bindparam("document_ids", expanding=True))
+
+PGVECTOR_CHUNK_COUNT = text("""
+    SELECT count(*) FROM chunk_embeddings
+    WHERE document_id IN :document_ids AND embedding_model = :embedding_model
+      AND embedding_dimensions = :embedding_dimensions
+""").bindparams(bindparam("document_ids", expanding=True))
+
+def ensure_vector_store(engine: Engine) -> str:
+    """Add the pgvector column and HNSW index where possible; returns the backend in use"""
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as connection:
+                if connection.execute(PGVECTOR_AVAILABLE).first():
+                    for statement in PGVECTOR_DDL:
+                        connection.execute(text(statement))
+                    if (connection.execute(PGVECTOR_COLUMN_TYPMOD).scalar() or -1) > 0:
+                        connection.execute(text("DROP INDEX IF EXISTS ix_chunk_embeddings_embedding_hnsw"))
+                        connection.execute(text("ALTER TABLE chunk_embeddings ALTER COLUMN embedding TYPE vector"))
+                    connection.execute(text(pgvector_index_ddl(settings.EMBEDDING_DIMENSIONS)))
+        except Exception as e:
+            logger.warning(f"pgvector unavailable, falling back to NumPy vector search: {str(e)}")
+    _backends.pop(str(engine.url), None)
+    backend = detect_backend(engine)
+    logger.info(f"Vector store backend: {backend}")
+    return backend
+
+def detect_backend(engine: Engine) -> str:
+    """pgvector when the embedding column exists, otherwise NumPy over on-disk indexes"""
+    key = str(engine.url)
+    if key not in _backends:
+        backend = NUMPY
+        if engine.dialect.name == "postgresql":
+            with engine.connect() as connection:
+                if connection.execute(PGVECTOR_COLUMN_EXISTS).first():
+                    backend = PGVECTOR
+                    version = connection.execute(PGVECTOR_VERSION).scalar() or "0"
+                    _pgvector_versions[key] = tuple(int(part) for part in re.findall(r"\d+", version)[:3])
+                    if _pgvector_versions[key] < ITERATIVE_SCAN_MIN_VERSION:
+                        logger.warning(
+                            f"pgvector {version} has no iterative index scans; "
+                            "upgrade to 0.8.0 or later to search large chats through the HNSW index"
+                        )
+        _backends[key] = backend
+    return _backends[key]
+
+def supports_iterative_scan(engine: Engine) -> bool:
+    return _pgvector_versions.get(str(engine.url), ()) >= ITERATIVE_SCAN_MIN_VERSION
+
+def to_vector_literal(embedding: Sequence[float]) -> str:
+    return "[" + ",".join(format(float(value), ".8g") for value in embedding) + "]"
+
+def to_blob(embedding: Sequence[float]) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def missing_chunks(
+    db: Session, chunks: List[LCDocument], config: Optional[EmbeddingConfig] = None
+) -> List[LCDocument]:
+    """Chunks without a stored embedding for a configuration
+
+    Completed documents are recognised from per-document counts; stored
+    chunk indexes are only fetched for documents a previous run left
+    half-done, so resuming costs one small query per such document.
+    """
+    config = config or current_embedding_config()
+    expected: Dict[int, int] = {}
+    for chunk in chunks:
+        expected[chunk.metadata["document_id"]] = expected.get(chunk.metadata["document_id"], 0) + 1
+    if not expected:
+        return []
+    scope = (
+        ChunkEmbedding.embedding_model == config.model,
+        ChunkEmbedding.embedding_dimensions == config.dimensions,
+    )
+    stored_counts = dict(db.execute(
+        select(ChunkEmbedding.document_id, func.count())
+        .where(ChunkEmbedding.document_id.in_(list(expected)), *scope)
+        .group_by(ChunkEmbedding.document_id)
+    ).all())
+    partial = [document_id for document_id, count in stored_counts.items() if count < expected[document_id]]
+    stored = set()
+    if partial:
+        stored = set(db.execute(
+            select(ChunkEmbedding.document_id, ChunkEmbedding.chunk_index)
+            .where(ChunkEmbedding.document_id.in_(partial), *scope)
+        ).tuples())
+    return [
+        chunk for chunk in chunks
+        if stored_counts.get(chunk.metadata["document_id"], 0) < expected[chunk.metadata["document_id"]]
+        and (chunk.metadata["document_id"], chunk.metadata["chunk"]) not in stored
+    ]
+
+def store_chunk_embeddings(
+    db: Session, chunks: List[LCDocument], vectors: List[List[float]], config: Optional[EmbeddingConfig] = None
+):
+    """Insert embeddings for chunks; chunks already stored by another worker are skipped"""
+    if not chunks:
+        return
+    config = config or current_embedding_config()
+    rows = [
+        {
+            "document_id": chunk.metadata["document_id"],
+            "chunk_index": chunk.metadata["chunk"],
+            "page_number": chunk.metadata.get("page"),
+            "content": chunk.page_content,
+            "embedding_model": config.model,
+            "embedding_dimensions": config.dimensions,
+            "embedding": vector,
+        }
+        for chunk, vector in zip(chunks, vectors)
+    ]
+    if detect_backend(db.get_bind()) == PGVECTOR:
+        for row in rows:
+            row["embedding"] = to_vector_literal(row["embedding"])
+        db.execute(PGVECTOR_INSERT, rows)
+    else:
+        for row in rows:
+            row["embedding_blob"] = to_blob(row.pop("embedding"))
+        db.execute(dialect_insert(db)(ChunkEmbedding).on_conflict_do_nothing(), rows)
+    db.commit()
+
+def search_chunk_embeddings(
+    db: Session,
+    document_ids: List[int],
+    embedding: Sequence[float],
+    k: int,
+    config: Optional[EmbeddingConfig] = None,
+) -> List[Tuple[LCDocument, float]]:
+    """Nearest chunks of the given documents by cosine similarity, best first"""
+    if not document_ids or k <= 0:
+        return []
+    config = config or current_embedding_config()
+    if detect_backend(db.get_bind()) == PGVECTOR:
+        rows = _pgvector_search(db.get_bind(), document_ids, embedding, k, config)
+    else:
+        rows = _numpy_search(db, document_ids, embedding, k, config)
+    return [
+        (
+            LCDocument(
+                page_content=row["content"],
+                metadata={
+                    "document_id": row["document_id"],
+                    "document_name": row["document_name"],
+                    "page": row["page_number"],
+                    "chunk": row["chunk_index"],
+                },
+            ),
+            float(row["score"]),
+        )
+        for row in rows
+    ]
+
+def _pgvector_search(
+    engine: Engine, document_ids: List[int], embedding: Sequence[float], k: int, config: EmbeddingConfig
+) -> List[Dict[str, Any]]:
+    """Exact search for chats with few chunks, a filtered HNSW scan for the others
+
+    The HNSW index covers every chat's chunks. Without iterative scans
+    (pgvector < 0.8) it returns only hnsw.ef_search candidates before the
+    document filter, which can leave a small chat with fewer than k
+    results or none, so such versions always search exactly.
+    """
+    params = {
+        "embedding": to_vector_literal(embedding),
+        "embedding_model": config.model,
+        "document_ids": document_ids,
+        "k": k,
+    }
+    # Own short transaction so SET LOCAL never leaks into the caller's session
+    with engine.begin() as connection:
+        chunks = connection.execute(PGVECTOR_CHUNK_COUNT, {
+            "document_ids": document_ids,
+            "embedding_model": config.model,
+            "embedding_dimensions": config.dimensions,
+        }).scalar()
+        if chunks <= settings.VECTOR_EXACT_SEARCH_MAX_CHUNKS or not supports_iterative_scan(engine):
+            return connection.execute(pgvector_exact_search(config.dimensions), params).mappings().all()
+        connection.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(settings.VECTOR_EF_SEARCH), k)}"))
+        connection.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+        connection.execute(text(f"SET LOCAL hnsw.max_scan_tuples = {int(settings.VECTOR_MAX_SCAN_TUPLES)}"))
+        return connection.execute(pgvector_search(config.dimensions), params).mappings().all()
+
+def _numpy_search(
+    db: Session, document_ids: List[int], embedding: Sequence[float], k: int, config: EmbeddingConfig
+) -> List[Dict[str, Any]]:
+    """Exact cosine search over memory-mapped per-document indexes, then fetch only the winning rows"""
+    query = normalize(embedding)
+    candidates: List[Tuple[float, int, int]] = []  # (score, document_id, chunk_index)
+    unindexed = []
+    for document_id in document_ids:
+        index = get_vector_index(db, document_id, config)
+        if index is None:
+            unindexed.append(document_id)
+            continue
+        candidates.extend((score, document_id, chunk) for score, chunk in index.search(query, k))
+    if unindexed:
+        candidates.extend(_scan_blobs(db, unindexed, query, k, config))
+    best = sorted(candidates, reverse=True)[:k]
+    if not best:
+        return []
+    score_by_chunk = {(document_id, chunk): score for score, document_id, chunk in best}
+    rows = db.execute(
+        select(
+            ChunkEmbedding.document_id, Document.name.label("document_name"),
+            ChunkEmbedding.page_number, ChunkEmbedding.chunk_index, ChunkEmbedding.content,
+        )
+        .join(Document, Document.id == ChunkEmbedding.document_id)
+        .where(
+            ChunkEmbedding.embedding_model == config.model,
+            ChunkEmbedding.embedding_dimensions == config.dimensions,
+            tuple_(ChunkEmbedding.document_id, ChunkEmbedding.chunk_index).in_(list(score_by_chunk)),
+        )
+    ).mappings().all()
+    rows = [dict(row, score=score_by_chunk[(row["document_id"], row["chunk_index"])]) for row in rows]
+    return sorted(rows, key=lambda row: row["score"], reverse=True)
+
+def _scan_blobs(
+    db: Session, document_ids: List[int], query: np.ndarray, k: int, config: EmbeddingConfig
+) -> List[Tuple[float, int, int]]:
+    """Brute-force scan of BLOB embeddings for documents without an on-disk index"""
+    stored = db.execute(
+        select(ChunkEmbedding.document_id, ChunkEmbedding.chunk_index, ChunkEmbedding.embedding_blob)
+        .where(
+            ChunkEmbedding.document_id.in_(document_ids),
+            ChunkEmbedding.embedding_model == config.model,
+            ChunkEmbedding.embedding_dimensions == config.dimensions,
+            ChunkEmbedding.embedding_blob.is_not(None),
+        )
+    ).all()
+    if not stored:
+        return []
+    matrix = np.frombuffer(b"".join(row.embedding_blob for row in stored), dtype=np.float32)
+    scores = normalize(matrix.reshape(len(stored), -1)) @ query
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return [(float(scores[i]), stored[i].document_id, stored[i].chunk_index) for i in top]
+
+def embed_chunks(
+    db: Session, chunks: List[LCDocument], pipeline: EmbeddingPipeline, config: Optional[EmbeddingConfig] = None
+) -> int:
+    """Embed and store the chunks that have no embedding yet; returns how many were embedded
+
+    Every batch is committed as soon as it is embedded, so a failed or
+    interrupted run loses at most the batches in flight and the next call
+    picks up the remaining chunks.
+    """
+    config = config or current_embedding_config()
+    missing = missing_chunks(db, chunks, config)
+    if not missing:
+        return 0
+    try:
+        return pipeline.run(missing, on_batch=lambda batch, vectors: store_chunk_embeddings(db, batch, vectors, config))
+    finally:
+        if detect_backend(db.get_bind()) == NUMPY:
+            for document_id in {chunk.metadata["document_id"] for chunk in missing}:
+                try:
+                    rebuild_vector_index(db, document_id, config)
+                except Exception as e:
+                    # Rebuilt from the stored embeddings on first search
+                    logger.warning(f"Could not build vector index for document {document_id}: {str(e)}")
+
+class ChunkEmbeddingStore(VectorStore):
+    """Vector store over the chunk_embeddings table, scoped to a set of documents
+
+    Any worker can answer for any chat: workers hold nothing beyond
+    memory-mapped index files shared through the page cache, and embeddings
+    are computed only for chunks that have none stored yet.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        embeddings: Embeddings,
+        document_ids: List[int],
+        config: Optional[EmbeddingConfig] = None,
+        pipeline: Optional[EmbeddingPipeline] = None,
+    ):
+        self.db = db
+        self._embeddings = embeddings
+        self.document_ids = list(document_ids)
+        self.config = config or current_embedding_config()
+        self.pipeline = pipeline or EmbeddingPipeline(embeddings.embed_documents)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embeddings
+
+    def add_chunks(self, chunks: List[LCDocument]) -> int:
+        """Embed and store chunks that have no embeddings yet; returns how many were embedded"""
+        return embed_chunks(self.db, chunks, self.pipeline, self.config)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        """Embed and store chunks; each metadata needs the chunk's "document_id" and "chunk" index
+
+        Pass every chunk of a document at once: documents are judged complete
+        from their stored chunk counts, as in missing_chunks. Returns
+        "<document_id>:<chunk>" ids.
+        """
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        self.add_chunks([LCDocument(page_content=t, metadata=m) for t, m in zip(texts, metadatas)])
+        return [f"{m['document_id']}:{m['chunk']}" for m in metadatas]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[LCDocument, float]]:
+        return search_chunk_embeddings(
+            self.db, self.document_ids, self._embeddings.embed_query(query), k, self.config
+        )
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[LCDocument]:
+        return [chunk for chunk, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[LCDocument]:
+        return [
+            chunk for chunk, _ in search_chunk_embeddings(self.db, self.document_ids, embedding, k, self.config)
+        ]
+
+    @classmethod
+    def from_texts(
+        cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any
+    ) -> "ChunkEmbeddingStore":
+        """Store embeddings for chunks and return a store over their documents
+
+        Takes the session as `db` and optionally `document_ids` (by default
+        the documents named in the metadatas) and `config`. Each metadata
+        needs the chunk's "document_id" and "chunk" index.
+        """
+        document_ids = kwargs.get("document_ids") or sorted({m["document_id"] for m in metadatas or []})
+        store = cls(kwargs["db"], embedding, document_ids, config=kwargs.get("config"))
+        store.add_texts(texts, metadatas)
+        return store
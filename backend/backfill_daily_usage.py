@@ -0,0 +1,32 @@
+"""
+Script to backfill DailyUsage rollups from existing chats, documents and messages
+"""
+import argparse
+from datetime import date
+from app.db.session import SessionLocal
+from app.services.analytics import backfill_daily_usage
+from app.core.config import settings
+
+def main():
+    """Rebuild DailyUsage counters for all users"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        default=None,
+        help="Only rebuild days on or after this date (YYYY-MM-DD)",
+    )
+    args = parser.parse_args()
+
+    print(f"Connecting to database: {settings.DATABASE_URL}")
+
+    db = SessionLocal()
+    try:
+        written = backfill_daily_usage(db, since=args.since)
+        print(f"Backfilled {written} daily usage rollups")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,138 @@
+"""
+Synthetic ping storm comparing direct and buffered activity tracking
+
+Runs the same set of activity pings through the previous per-request
+implementation (two SELECTs, up to two INSERTs and two commits per ping)
+on the old schema without unique keys, and through the in-process
+ActivityBuffer with a batched flush, and reports the throughput of each
+along with the resulting row counts. By default a throwaway SQLite database is used;
+pass --database-url to run against PostgreSQL.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+from sqlalchemy import MetaData, UniqueConstraint, create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from app.db.session import Base
+from app.models.analytics import UserAnalytics, DailyUsage
+from app.services.analytics import ActivityBuffer
+
+def track_directly(SessionFactory, user_id: str, minutes: float):
+    """Previous track_user_activity implementation, one ping per transaction"""
+    db = SessionFactory()
+    try:
+        today = datetime.now(UTC).date()
+        analytics = db.query(UserAnalytics).filter(UserAnalytics.user_id == user_id).first()
+        if not analytics:
+            analytics = UserAnalytics(
+                user_id=user_id,
+                total_chats=0,
+                total_pdfs=0,
+                active_time_minutes=minutes,
+                messages_sent=0,
+                messages_received=0
+            )
+            db.add(analytics)
+            db.commit()
+            db.refresh(analytics)
+        else:
+            analytics.active_time_minutes += minutes
+            db.commit()
+        daily_usage = db.query(DailyUsage).filter(
+            DailyUsage.analytics_id == analytics.id,
+            DailyUsage.date == today
+        ).first()
+        if daily_usage:
+            daily_usage.minutes_active += minutes
+            db.commit()
+        else:
+            db.add(DailyUsage(
+                analytics_id=analytics.id,
+                date=today,
+                minutes_active=minutes,
+                chats_created=0,
+                pdfs_uploaded=0,
+                messages_sent=0
+            ))
+            db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+def reset(engine, legacy: bool = False):
+    """Recreate the analytics tables, optionally without the unique keys"""
+    tables = [UserAnalytics.__table__, DailyUsage.__table__]
+    engine.dispose()
+    Base.metadata.drop_all(engine, tables=tables)
+    if not legacy:
+        Base.metadata.create_all(engine, tables=tables)
+        return
+    metadata = MetaData()
+    for table in tables:
+        copy = table.to_metadata(metadata)
+        copy.constraints = {c for c in copy.constraints if not isinstance(c, UniqueConstraint)}
+        for index in copy.indexes:
+            index.unique = False
+    metadata.create_all(engine)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--pings", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--flush-every", type=int, default=1000, help="Pings between buffered flushes")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if not url:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ping_storm.db')}"
+    engine = create_engine(url, pool_size=args.concurrency, max_overflow=0) if not url.startswith("sqlite") else create_engine(url)
+    SessionFactory = sessionmaker(bind=engine)
+    pings = [(f"bench_user_{i % args.users}", 0.5) for i in range(args.pings)]
+    expected = sum(minutes for _, minutes in pings)
+
+    reset(engine, legacy=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda ping: track_directly(SessionFactory, *ping), pings))
+    direct_elapsed = time.perf_counter() - start
+    with SessionFactory() as db:
+        direct_rows = db.scalar(select(func.count(DailyUsage.id)))
+        direct_minutes = db.scalar(select(func.sum(DailyUsage.minutes_active))) or 0
+
+    reset(engine)
+    buffer = ActivityBuffer()
+
+    def ping(i_ping):
+        i, (user_id, minutes) = i_ping
+        buffer.add(user_id, minutes)
+        if (i + 1) % args.flush_every == 0:
+            with SessionFactory() as db:
+                buffer.flush(db)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(ping, enumerate(pings)))
+    with SessionFactory() as db:
+        buffer.flush(db)
+    buffered_elapsed = time.perf_counter() - start
+    with SessionFactory() as db:
+        buffered_rows = db.scalar(select(func.count(DailyUsage.id)))
+        buffered_minutes = db.scalar(select(func.sum(DailyUsage.minutes_active))) or 0
+
+    print(f"Database: {engine.dialect.name}, {args.pings} pings from {args.users} users, concurrency {args.concurrency}")
+    print(f"direct:   {args.pings / direct_elapsed:10.0f} pings/s  "
+          f"failed={results.count(False)} daily_rows={direct_rows} minutes={direct_minutes:.1f}/{expected:.1f}")
+    print(f"buffered: {args.pings / buffered_elapsed:10.0f} pings/s  "
+          f"failed=0 daily_rows={buffered_rows} minutes={buffered_minutes:.1f}/{expected:.1f}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,83 @@
+"""
+Chunks/s of the embedding pipeline against a local fake embeddings server
+
+Starts the OpenAI-compatible stand-in from fake_openai_server.py, which
+answers with deterministic vectors after a configurable latency and
+enforces a tokens-per-minute limit, answering 429 with Retry-After like
+the real API. Embeds a synthetic corpus once with the langchain client
+the app used before (sequential requests of up to 1000 inputs, SDK
+retries) and once through EmbeddingPipeline, and reports chunks/s, the
+number of requests and the number of 429s for each.
+"""
+import argparse
+import time
+import numpy as np
+import openai
+from langchain_core.documents import Document as LCDocument
+from langchain_openai import OpenAIEmbeddings
+from app.services.embeddings import AdaptiveConcurrencyLimiter, EmbeddingConfig, EmbeddingPipeline, openai_embedder
+from fake_openai_server import FakeOpenAIServer
+
+def synthetic_chunks(count: int, words: int):
+    vocabulary = [f"term{i}" for i in range(5000)]
+    rng = np.random.default_rng(0)
+    return [
+        LCDocument(page_content=" ".join(rng.choice(vocabulary, words)), metadata={"document_id": 1, "chunk": i})
+        for i in range(count)
+    ]
+
+def run(name: str, server: FakeOpenAIServer, embed):
+    server.reset_counters()
+    start = time.perf_counter()
+    try:
+        embedded = embed()
+        outcome = ""
+    except Exception as e:
+        embedded, outcome = 0, f"  failed: {type(e).__name__}"
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {embedded:>7} {elapsed:>8.2f} {embedded / elapsed:>9.0f} "
+          f"{server.requests:>9} {server.rate_limited:>6}{outcome}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=150, help="Words per chunk")
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=150, help="Fixed latency per request")
+    parser.add_argument("--per-input-ms", type=float, default=1, help="Added latency per input")
+    parser.add_argument("--tokens-per-minute", type=int, default=5_000_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        dimensions=args.dimensions,
+        latency=args.latency_ms / 1000,
+        per_input=args.per_input_ms / 1000,
+        tokens_per_minute=args.tokens_per_minute,
+    ).start()
+    chunks = synthetic_chunks(args.chunks, args.words)
+    texts = [chunk.page_content for chunk in chunks]
+    config = EmbeddingConfig(model="text-embedding-3-small", dimensions=args.dimensions)
+    print(f"{args.chunks} chunks of {args.words} words, {args.latency_ms:.0f} ms + {args.per_input_ms:g} ms/input "
+          f"per request, {args.tokens_per_minute} tokens/min")
+    print(f"{'client':<10} {'chunks':>7} {'seconds':>8} {'chunks/s':>9} {'requests':>9} {'429s':>6}")
+
+    langchain = OpenAIEmbeddings(
+        model=config.model, dimensions=config.dimensions, api_key="fake", base_url=server.base_url,
+        check_embedding_ctx_length=False,
+    )
+    run("langchain", server, lambda: len(langchain.embed_documents(texts)))
+
+    client = openai.OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+    pipeline = EmbeddingPipeline(
+        openai_embedder(config, client),
+        max_inputs=args.batch_size,
+        max_concurrency=args.concurrency,
+        limiter=AdaptiveConcurrencyLimiter(args.concurrency),
+    )
+    run("pipeline", server, lambda: pipeline.run(chunks))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Tail latency of chat completions with and without hedging
+
+Starts a fake_openai_server.py stand-in whose time to first token is
+usually --latency-ms but --slow-rate of the time --slow-ms, then streams
+the same number of completions through the app's router twice, once
+without and once with hedged requests, and prints p50/p95/p99 latency and
+how many hedges fired and won. The router learns the p95 time to first
+token during a warm-up, so hedges fire at the observed p95 as in
+production.
+"""
+import argparse
+import asyncio
+import time
+import numpy as np
+from langchain_core.messages import HumanMessage
+from app.core.config import settings
+from fake_openai_server import FakeOpenAIServer
+
+async def run(clients, calls: int, concurrency: int, hedging: bool):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call():
+        async with semaphore:
+            started = time.perf_counter()
+            await clients.complete(None, [HumanMessage(content="ping")], temperature=0.0, hedging=hedging)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(call() for _ in range(calls)))
+    return np.percentile(latencies, [50, 95, 99])
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--slow-rate", type=float, default=0.04)
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        name="openai", latency=args.latency_ms / 1000, slow_rate=args.slow_rate, slow_latency=args.slow_ms / 1000
+    ).start()
+    settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL, settings.GROQ_API_KEY = "stand-in", server.base_url, ""
+    settings.LLM_HEDGE_MIN_DELAY_SECONDS = 0.0
+
+    from app.services.clients import get_clients
+    clients = get_clients()
+    await run(clients, 100, args.concurrency, hedging=False)  # Warm-up: learn the first-token p95
+    print(f"{args.calls} completions, {args.latency_ms:.0f} ms to first token, "
+          f"{args.slow_rate:.0%} take {args.slow_ms:.0f} ms; hedge after "
+          f"{clients.router.hedge_delay(clients.router.providers['openai']):.2f}s")
+    print(f"{'hedging':<8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'hedges':>7} {'won':>5}")
+    for hedging in (False, True):
+        hedges, wins = clients.router.hedges, clients.router.hedge_wins
+        p50, p95, p99 = await run(clients, args.calls, args.concurrency, hedging)
+        print(f"{'on' if hedging else 'off':<8} {p50:>7.2f} {p95:>7.2f} {p99:>7.2f} "
+              f"{clients.router.hedges - hedges:>7} {clients.router.hedge_wins - wins:>5}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
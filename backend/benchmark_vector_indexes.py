@@ -0,0 +1,71 @@
+"""
+Recall, latency and memory of the vector index modes on a synthetic corpus
+
+Generates clustered unit vectors (a rough stand-in for embeddings of a
+large document), builds every index mode through the same code path used
+at ingestion, and reports per mode: the FAISS spec, build/training time,
+bytes stored per vector, recall@10 against exact search, and per-query
+latency. Also prints which mode VECTOR_INDEX_MODE=auto would pick.
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from app.core.config import settings
+from app.services.vector_index import (
+    INDEX_MODES, build_vector_index, choose_index_spec, faiss_index_path,
+    normalize, read_vector_index, vector_index_paths,
+)
+
+def synthetic_vectors(count: int, dimensions: int, clusters: int, rng):
+    """Unit vectors scattered around random topic centroids"""
+    centroids = rng.standard_normal((clusters, dimensions), dtype=np.float32)
+    assignment = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, dimensions), dtype=np.float32) * 0.6
+    return normalize(centroids[assignment] + noise)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", default=",".join(INDEX_MODES))
+    args = parser.parse_args()
+
+    settings.INDEX_DIR = tempfile.mkdtemp()
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(args.chunks + args.queries, args.dimensions, args.clusters, rng)
+    corpus, queries = vectors[:args.chunks], vectors[args.chunks:]
+    exact = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+    chunk_indexes = np.arange(args.chunks)
+    print(f"{args.chunks} chunks x {args.dimensions} dims, {args.queries} queries; "
+          f"auto picks {choose_index_spec(args.chunks, args.dimensions, 'auto')}")
+    print(f"{'mode':<9} {'spec':<18} {'build s':>8} {'bytes/vec':>10} {'recall@' + str(args.k):>10} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+
+    for document_id, mode in enumerate(args.modes.split(","), start=1):
+        start = time.perf_counter()
+        spec = build_vector_index(document_id, chunk_indexes, corpus, mode=mode)
+        build_seconds = time.perf_counter() - start
+        size = sum(
+            os.path.getsize(path)
+            for path in (*vector_index_paths(document_id), faiss_index_path(document_id))
+            if os.path.exists(path)
+        )
+        index = read_vector_index(document_id, mmap=False)
+        latencies, recalls = [], []
+        for query, truth in zip(queries, exact):
+            start = time.perf_counter()
+            found = [chunk for _, chunk in index.search(query, args.k)]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(set(found) & set(truth.tolist())) / args.k)
+        latencies.sort()
+        print(f"{mode:<9} {spec:<18} {build_seconds:8.1f} {size / args.chunks:10.0f} {np.mean(recalls):10.3f} "
+              f"{latencies[len(latencies) // 2]:8.2f} {latencies[int(len(latencies) * 0.95)]:8.2f}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
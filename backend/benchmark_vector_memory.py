@@ -0,0 +1,96 @@
+"""
+Per-worker memory of in-memory versus memory-mapped vector indexes
+
+Writes random unit vectors for a corpus of documents as on-disk indexes,
+then starts several worker processes, as gunicorn would, that open every
+index and answer queries against a hot subset of documents. Each worker
+reports its RSS together with PSS and private memory from
+/proc/self/smaps_rollup (Linux only). PSS divides shared pages between
+the processes mapping them, so it shows what each worker really costs.
+"in-memory" reads every index into private memory, like the previous
+per-worker FAISS objects; "mmap" maps the files through the page cache.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+from app.core.config import settings
+from app.services.vector_index import normalize, read_vector_index, save_vector_index
+
+def memory_kb():
+    """RSS, PSS and private memory of this process in kB"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return values["Rss"], values["Pss"], values["Private_Clean"] + values["Private_Dirty"]
+
+def worker(index_dir, mmap, documents, hot, queries, dimensions, barrier, results):
+    settings.INDEX_DIR = index_dir
+    baseline = memory_kb()
+    start = time.perf_counter()
+    indexes = [read_vector_index(document_id, mmap=mmap) for document_id in range(1, documents + 1)]
+    opened = time.perf_counter() - start
+    rng = np.random.default_rng(os.getpid())
+    start = time.perf_counter()
+    for _ in range(queries):
+        query = normalize(rng.standard_normal(dimensions))
+        for index in indexes[:hot]:
+            index.search(query, 10)
+    elapsed = (time.perf_counter() - start) / queries
+    barrier.wait()  # Measure while every worker has its indexes open
+    results.put((os.getpid(), baseline, memory_kb(), opened, elapsed))
+    barrier.wait()
+
+def run(mode, args, index_dir):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(
+            index_dir, mode == "mmap", args.documents, args.hot, args.queries, args.dimensions, barrier, results,
+        ))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    print(f"\n{mode}:")
+    for pid, (base_rss, _, _), (rss, pss, private), opened, elapsed in reports:
+        print(f"  worker {pid}: RSS {base_rss / 1024:7.1f} -> {rss / 1024:7.1f} MB  "
+              f"PSS {pss / 1024:7.1f} MB  private {private / 1024:7.1f} MB  "
+              f"open {opened:6.2f}s  query ({args.hot} docs) {elapsed * 1000:6.2f}ms")
+    total_pss = sum(report[2][1] for report in reports) / 1024
+    print(f"  total PSS across {args.workers} workers: {total_pss:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=60, help="Chunks per document")
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--hot", type=int, default=100, help="Documents searched by each query")
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    index_dir = tempfile.mkdtemp()
+    settings.INDEX_DIR = index_dir
+    rng = np.random.default_rng(0)
+    for document_id in range(1, args.documents + 1):
+        vectors = rng.standard_normal((args.chunks, args.dimensions), dtype=np.float32)
+        save_vector_index(document_id, np.arange(args.chunks), vectors)
+    size_mb = args.documents * args.chunks * args.dimensions * 4 / 1024 / 1024
+    print(f"{args.documents} documents x {args.chunks} chunks x {args.dimensions} dims = {size_mb:.0f} MB of vectors "
+          f"in {index_dir}")
+    run("in-memory", args, index_dir)
+    run("mmap", args, index_dir)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,175 @@
+"""
+Recall and latency of vector-only retrieval against hybrid BM25 + vector retrieval
+
+Builds a synthetic library of contract-like pages sprinkled with exact
+identifiers (part numbers, clause ids), then asks two kinds of questions:
+identifier lookups ("What does part PN-48213-C cover?") and topical
+questions built from a chunk's own words. Each is answered by the
+previous retrievers (FAISS similarity search, which the chain used, and
+MMR) and by BM25 alone and the hybrid retriever, reporting recall@k and
+per-query latency.
+
+With OPENAI_API_KEY set, real embeddings are used; otherwise a local
+hashing embedding stands in, which is only indicative of semantic recall.
+Pass --chat-id to evaluate on the documents of an existing chat instead.
+"""
+import argparse
+import hashlib
+import random
+import statistics
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Set
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+from app.services.retrieval import (
+    DocumentIndex, HybridRetriever, LexicalIndex, TOKEN_PATTERN, chunk_key, tokenize,
+)
+
+TOPICS = {
+    "termination": "termination notice period convenience breach cure days written effective",
+    "payment": "payment invoice fees due net late interest currency billing schedule",
+    "liability": "liability damages indirect consequential cap limitation gross negligence",
+    "warranty": "warranty defects materials workmanship remedy repair replace months",
+    "confidentiality": "confidential information disclose recipient protect obligations years",
+    "delivery": "delivery shipment carrier freight title risk loss acceptance inspection",
+    "maintenance": "maintenance service inspection lubrication filter replacement interval hours",
+    "safety": "safety hazard protective equipment lockout procedure operator training",
+}
+FILLER = "the party shall under this agreement any such other in accordance with provided that".split()
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words and character trigram hashing, for running without an API key"""
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            features = [token] + [token[i:i + 3] for i in range(max(1, len(token) - 2))]
+            for feature in features:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+def synthetic_corpus(documents: int, pages: int, seed: int = 7):
+    """Pages of topical sentences, some mentioning a unique part number or clause id"""
+    rng = random.Random(seed)
+    corpus = []
+    for document_id in range(1, documents + 1):
+        document = SimpleNamespace(id=document_id, name=f"contract_{document_id}.pdf")
+        contents = []
+        for page_number in range(1, pages + 1):
+            sentences = []
+            for _ in range(rng.randint(8, 14)):
+                topic = rng.choice(list(TOPICS))
+                words = rng.sample(TOPICS[topic].split(), 5) + rng.sample(FILLER, 4)
+                rng.shuffle(words)
+                sentence = " ".join(words).capitalize()
+                if rng.random() < 0.15:
+                    identifier = rng.choice([
+                        f"PN-{rng.randint(10000, 99999)}-{rng.choice('ABCDEFGH')}",
+                        f"{rng.randint(1, 30)}.{rng.randint(1, 12)}.{rng.randint(1, 9)}",
+                    ])
+                    sentence += f" as set out in {identifier}"
+                sentences.append(sentence + ".")
+            contents.append(SimpleNamespace(page_number=page_number, content=" ".join(sentences)))
+        corpus.append((document, contents))
+    return corpus
+
+def chat_corpus(chat_id: int):
+    from app.db.session import SessionLocal
+    from app.db.models import Chat, DocumentContent
+    db = SessionLocal()
+    try:
+        chat = db.query(Chat).filter(Chat.id == chat_id).first()
+        if not chat:
+            raise SystemExit(f"Chat {chat_id} not found")
+        return [
+            (document, db.query(DocumentContent).filter(DocumentContent.document_id == document.id).all())
+            for document in chat.documents
+        ]
+    finally:
+        db.close()
+
+def build_queries(chunks, count: int, seed: int = 11):
+    """(question, relevant chunk keys, kind) triples drawn from the chunks themselves"""
+    rng = random.Random(seed)
+    identifier_chunks: Dict[str, Set] = {}
+    for chunk in chunks:
+        for token in TOKEN_PATTERN.findall(chunk.page_content):
+            if any(c.isdigit() for c in token) and any(c in token for c in ".-"):
+                identifier_chunks.setdefault(token, set()).add(chunk_key(chunk))
+    queries = []
+    identifiers = sorted(identifier_chunks)
+    rng.shuffle(identifiers)
+    for identifier in identifiers[:count // 2]:
+        queries.append((f"What does {identifier} say?", identifier_chunks[identifier], "identifier"))
+    for chunk in rng.sample(chunks, min(len(chunks), count - len(queries))):
+        words = [w for w in tokenize(chunk.page_content) if w.isalpha() and w not in FILLER]
+        if len(words) < 6:
+            continue
+        queries.append((" ".join(rng.sample(words, 6)), {chunk_key(chunk)}, "topical"))
+    return queries
+
+def evaluate(name: str, search: Callable[[str], list], queries, k: int):
+    latencies, hits = [], {"identifier": [], "topical": []}
+    for question, relevant, kind in queries:
+        start = time.perf_counter()
+        results = search(question)[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {chunk_key(chunk) for chunk in results}
+        hits[kind].append(len(found & relevant) / len(relevant))
+    recall = lambda values: statistics.mean(values) if values else float("nan")
+    latencies.sort()
+    print(f"{name:<18} recall@{k}: identifier={recall(hits['identifier']):.3f} "
+          f"topical={recall(hits['topical']):.3f} all={recall(hits['identifier'] + hits['topical']):.3f}  "
+          f"latency p50={latencies[len(latencies) // 2]:.2f}ms p95={latencies[int(len(latencies) * 0.95)]:.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat-id", type=int, default=None, help="Evaluate on an existing chat's documents")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.RETRIEVAL_K)
+    args = parser.parse_args()
+
+    corpus = chat_corpus(args.chat_id) if args.chat_id else synthetic_corpus(args.documents, args.pages)
+    lexical_index = LexicalIndex([DocumentIndex.build(document, pages) for document, pages in corpus])
+    chunks = lexical_index.chunks
+    if settings.OPENAI_API_KEY:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
+    else:
+        embeddings = HashingEmbeddings()
+    start = time.perf_counter()
+    vectorstore = FAISS.from_documents(chunks, embeddings)
+    print(f"{len(corpus)} documents, {len(chunks)} chunks, embeddings={type(embeddings).__name__} "
+          f"(built in {time.perf_counter() - start:.1f}s)")
+
+    queries = build_queries(chunks, args.queries)
+    hybrid = HybridRetriever(
+        vectorstore=vectorstore, lexical_index=lexical_index,
+        k=args.k, fetch_k=settings.RETRIEVAL_FETCH_K, rrf_k=settings.RRF_K,
+    )
+    evaluate("vector similarity", lambda q: vectorstore.similarity_search(q, k=args.k), queries, args.k)
+    evaluate("vector mmr", lambda q: vectorstore.max_marginal_relevance_search(
+        q, k=args.k, fetch_k=20, lambda_mult=0.5), queries, args.k)
+    evaluate("bm25", lambda q: [chunk for chunk, _ in lexical_index.search(q, args.k)], queries, args.k)
+    evaluate("hybrid rrf", hybrid.invoke, queries, args.k)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,246 @@
+"""
+Local OpenAI-compatible stand-in for load tests and failure drills
+
+Serves POST /v1/embeddings and POST /v1/chat/completions on localhost
+with injected behaviour, all adjustable while running:
+
+- latency: fixed seconds per request plus per-input seconds (embeddings);
+  for streamed chat completions this is the time to the first token
+- slow_rate / slow_latency: share of requests that take slow_latency instead
+- token_interval: seconds between streamed tokens
+- error_rate: share of requests answered with a 500
+- tokens_per_minute: token bucket; requests over it get a 429 with Retry-After
+
+Embeddings are deterministic per input text. Chat answers name the
+stand-in, so callers can tell which provider served them.
+
+Run two of them to try provider routing with the app, e.g.
+
+    python fake_openai_server.py --port 9001 --name openai --latency-ms 400
+    python fake_openai_server.py --port 9002 --name groq --latency-ms 150
+    OPENAI_BASE_URL=http://127.0.0.1:9001/v1 GROQ_BASE_URL=http://127.0.0.1:9002/v1 \\
+        OPENAI_API_KEY=x GROQ_API_KEY=x uvicorn main:app
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        name: str = "stand-in",
+        dimensions: int = 1536,
+        latency: float = 0.0,
+        per_input: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        error_rate: float = 0.0,
+        tokens_per_minute: int = 10**12,
+        token_interval: float = 0.01,
+        answer_tokens: int = 20,
+    ):
+        super().__init__(("127.0.0.1", port), FakeOpenAIHandler)
+        self.name = name
+        self.dimensions = dimensions
+        self.latency = latency
+        self.per_input = per_input
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.token_interval = token_interval
+        self.answer_tokens = answer_tokens
+        self.capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.refilled = time.monotonic()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = self.rate_limited = self.failed = 0
+            self.tokens = float(self.capacity)
+
+    def take(self, tokens: int) -> float:
+        """Spend tokens from the per-minute bucket; returns seconds to wait if there are too few"""
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.refilled) * self.capacity / 60)
+            self.refilled = now
+            if tokens <= self.tokens:
+                self.tokens -= tokens
+                return 0.0
+            self.rate_limited += 1
+            return (tokens - self.tokens) * 60 / self.capacity
+
+    def delay(self, inputs: int = 1) -> float:
+        base = self.slow_latency if random.random() < self.slow_rate else self.latency
+        return base + self.per_input * inputs
+
+    def should_fail(self) -> bool:
+        if random.random() < self.error_rate:
+            with self.lock:
+                self.failed += 1
+            return True
+        return False
+
+    def vector(self, text: str) -> np.ndarray:
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        return rng.standard_normal(self.dimensions).astype(np.float32)
+
+def count_tokens(texts) -> int:
+    return sum(max(1, len(text) // 4) if isinstance(text, str) else len(text) for text in texts)
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _admit(self, tokens: int) -> bool:
+        """Apply the rate limit and injected errors; False when a response has already been sent"""
+        wait = self.server.take(tokens)
+        if wait:
+            self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                        {"Retry-After": f"{wait:.2f}"})
+            return False
+        if self.server.should_fail():
+            self._reply(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return False
+        return True
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.endswith("/embeddings"):
+            self.embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            self.chat_completion(request)
+        else:
+            self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def embeddings(self, request: dict):
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        tokens = count_tokens(texts)
+        if not self._admit(tokens):
+            return
+        time.sleep(self.server.delay(len(texts)))
+        data = []
+        for i, text in enumerate(texts):
+            vector = self.server.vector(text if isinstance(text, str) else " ".join(map(str, text)))
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        self._reply(200, {
+            "object": "list", "data": data, "model": request["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def chat_completion(self, request: dict):
+        prompt_tokens = count_tokens(str(message.get("content", "")) for message in request["messages"])
+        if not self._admit(prompt_tokens):
+            return
+        time.sleep(self.server.delay())
+        if request.get("stream"):
+            self.stream_chat_completion(request)
+            return
+        content = f"Answer from {self.server.name}."
+        self._reply(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 5, "total_tokens": prompt_tokens + 5},
+        })
+
+    def _write_chunk(self, data: str):
+        payload = data.encode()
+        self.wfile.write(f"{len(payload):X}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def stream_chat_completion(self, request: dict):
+        """Server-sent events, one token per event, the last one naming the stand-in"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id, created = f"chatcmpl-{uuid.uuid4().hex}", int(time.time())
+        tokens = ["Answer "] * max(0, self.server.answer_tokens - 2) + ["from ", f"{self.server.name}."]
+        try:
+            for i, token in enumerate(tokens + [None]):
+                if i:
+                    time.sleep(self.server.token_interval)
+                delta = {"role": "assistant", "content": token} if token is not None else {}
+                self._write_chunk("data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": request["model"],
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None if token else "stop"}],
+                }) + "\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self._write_chunk("")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client cancelled, e.g. the losing side of a hedged request
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--name", default="stand-in")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--per-input-ms", type=float, default=0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-minute", type=int, default=10**12)
+    parser.add_argument("--token-interval-ms", type=float, default=10)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(
+        port=args.port, name=args.name, dimensions=args.dimensions,
+        latency=args.latency_ms / 1000, per_input=args.per_input_ms / 1000,
+        slow_rate=args.slow_rate, slow_latency=args.slow_ms / 1000,
+        error_rate=args.error_rate, tokens_per_minute=args.tokens_per_minute,
+        token_interval=args.token_interval_ms / 1000,
+    )
+    print(f"{args.name} stand-in listening on {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
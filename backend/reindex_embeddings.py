@@ -0,0 +1,178 @@
+"""
+Re-embed stored documents with a new embedding model or dimension
+
+Embeds the chunks of every document (or of --document-ids) with the target
+--model / --dimensions, which default to the current settings, and stores
+them next to the existing embeddings. Queries keep using the old vectors
+until EMBEDDING_MODEL / EMBEDDING_DIMENSIONS are switched to the target.
+
+The command is resumable: chunks go through the embedding pipeline in
+token-aware batches that are committed as they finish, and chunks that
+already have embeddings for the target configuration are skipped, so an
+interrupted run continues where it stopped, down to the batch.
+Documents are processed by --workers threads; requests in flight across
+all of them are bounded by EMBEDDING_MAX_CONCURRENCY and shrink on 429s.
+
+--dry-run only counts the missing chunks and tokens and prints a cost estimate.
+--prune removes embeddings and on-disk indexes of every other
+configuration once all documents have been re-embedded. With --document-ids
+it is refused while any other document still lacks target embeddings.
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+from sqlalchemy import and_, not_, select
+from app.core.config import settings
+from app.db.models import ChunkEmbedding, Document
+from app.db.session import SessionLocal, delete_in_batches
+from app.services.clients import get_clients
+from app.services.embeddings import EmbeddingConfig, EmbeddingPipeline, count_tokens
+from app.services.retrieval import get_document_index
+from app.services.vector_index import vector_index_dir
+from app.services.vector_store import embed_chunks, missing_chunks
+
+# USD per million input tokens
+PRICE_PER_MILLION_TOKENS = {
+    "text-embedding-3-small": 0.02,
+    "text-embedding-3-large": 0.13,
+    "text-embedding-ada-002": 0.10,
+}
+
+def document_ids_to_index(document_ids: List[int]) -> List[int]:
+    db = SessionLocal()
+    try:
+        query = select(Document.id).order_by(Document.id)
+        if document_ids:
+            query = query.where(Document.id.in_(document_ids))
+        return list(db.scalars(query))
+    finally:
+        db.close()
+
+def document_chunks(db, document_id: int):
+    document = db.get(Document, document_id)
+    return get_document_index(db, document).chunks if document else []
+
+def estimate(config: EmbeddingConfig, document_ids: List[int]):
+    documents = chunks = tokens = 0
+    db = SessionLocal()
+    try:
+        for document_id in document_ids:
+            missing = missing_chunks(db, document_chunks(db, document_id), config)
+            documents += bool(missing)
+            chunks += len(missing)
+            tokens += sum(count_tokens(chunk.page_content) for chunk in missing)
+    finally:
+        db.close()
+    price = PRICE_PER_MILLION_TOKENS.get(config.model)
+    cost = f"${tokens / 1_000_000 * price:,.2f}" if price is not None else "unknown (no price for this model)"
+    print(f"Dry run: {documents} documents, {chunks} chunks, {tokens} tokens, "
+          f"estimated cost {cost} for {config.model} at {config.dimensions} dimensions")
+
+def reindex_document(document_id: int, config: EmbeddingConfig, pipeline: EmbeddingPipeline) -> int:
+    """Embed and store one document's missing chunks; returns the number of chunks written"""
+    db = SessionLocal()
+    try:
+        return embed_chunks(db, document_chunks(db, document_id), pipeline, config)
+    finally:
+        db.close()
+
+def incomplete_documents(config: EmbeddingConfig, document_ids: List[int]) -> List[int]:
+    """Documents that still have chunks without embeddings for the configuration"""
+    db = SessionLocal()
+    try:
+        return [
+            document_id for document_id in document_ids
+            if missing_chunks(db, document_chunks(db, document_id), config)
+        ]
+    finally:
+        db.close()
+
+def prune(config: EmbeddingConfig):
+    """Delete embeddings and on-disk indexes of every other configuration"""
+    db = SessionLocal()
+    try:
+        deleted = delete_in_batches(
+            db, ChunkEmbedding,
+            not_(and_(
+                ChunkEmbedding.embedding_model == config.model,
+                ChunkEmbedding.embedding_dimensions == config.dimensions,
+            )),
+            batch_size=settings.DELETE_BATCH_SIZE,
+        )
+    finally:
+        db.close()
+    keep = vector_index_dir(config)
+    parent = os.path.dirname(keep)
+    if os.path.isdir(parent):
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            if path != keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+    print(f"Pruned {deleted} embeddings of other configurations")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--document-ids", type=int, nargs="*", default=[])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_MAX_INPUTS,
+                        help="Most chunks per embeddings request")
+    parser.add_argument("--batch-tokens", type=int, default=settings.EMBEDDING_BATCH_MAX_TOKENS,
+                        help="Most tokens per embeddings request")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--prune", action="store_true")
+    args = parser.parse_args()
+
+    config = EmbeddingConfig(model=args.model, dimensions=args.dimensions)
+    try:
+        config.validate()
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    document_ids = document_ids_to_index(args.document_ids)
+    if args.dry_run:
+        estimate(config, document_ids)
+        return 0
+    print(f"Re-embedding {len(document_ids)} documents with {config.model} at {config.dimensions} dimensions")
+
+    pipeline = EmbeddingPipeline(get_clients().embedder(config), max_inputs=args.batch_size, max_tokens=args.batch_tokens)
+    failed, chunks_written, start = [], 0, time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(reindex_document, document_id, config, pipeline): document_id
+            for document_id in document_ids
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            document_id = futures[future]
+            try:
+                chunks_written += future.result()
+            except Exception as e:
+                failed.append(document_id)
+                print(f"Document {document_id} failed: {str(e)}")
+            elapsed = time.perf_counter() - start
+            remaining = elapsed / done * (len(document_ids) - done)
+            print(f"[{done}/{len(document_ids)}] document {document_id}  "
+                  f"{chunks_written} chunks  {chunks_written / elapsed:.0f} chunks/s  ETA {remaining:.0f}s")
+
+    if failed:
+        print(f"{len(failed)} documents failed; run the command again to retry them")
+        return 1
+    if args.prune:
+        if args.document_ids:
+            # Queries still use the other configurations for documents this run did not cover
+            others = sorted(set(document_ids_to_index([])) - set(document_ids))
+            incomplete = incomplete_documents(config, others)
+            if incomplete:
+                print(f"Not pruning: {len(incomplete)} other documents have no {config.model} "
+                      f"embeddings at {config.dimensions} dimensions yet; re-embed them first")
+                return 1
+        prune(config)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
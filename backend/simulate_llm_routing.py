@@ -0,0 +1,76 @@
+"""
+Drive the LLM router against two local stand-in providers
+
+Starts two fake_openai_server.py stand-ins named openai and groq. It then
+sends chat calls through the app's client registry and router in phases,
+changing the stand-ins' injected latency and errors between phases. For
+each phase it prints where calls went, the failovers, and each provider's
+rolling p50/p95 and error rate as the router saw them.
+
+Phases:
+  baseline      openai 400 ms, groq 150 ms
+  groq slow     groq p95 jumps to 2 s on 30% of calls
+  groq failing  groq answers 60% of calls with a 500
+  recovered     both back to baseline once the bad window has aged out
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from fake_openai_server import FakeOpenAIServer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=120, help="Calls per phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tier", default="Free", help="Subscription type the calls are made for")
+    parser.add_argument("--window-seconds", type=float, default=20.0, help="Routing statistics window")
+    args = parser.parse_args()
+
+    openai_server = FakeOpenAIServer(name="openai", latency=0.4).start()
+    groq_server = FakeOpenAIServer(name="groq", latency=0.15).start()
+    settings.OPENAI_API_KEY = settings.GROQ_API_KEY = "stand-in"
+    settings.OPENAI_BASE_URL, settings.GROQ_BASE_URL = openai_server.base_url, groq_server.base_url
+    settings.LLM_ROUTING_WINDOW_SECONDS = args.window_seconds
+    settings.LLM_ROUTING_MIN_SAMPLES = 10
+    settings.LLM_MAX_RETRIES = 0
+
+    from app.services.clients import get_clients
+    clients = get_clients()
+    router = clients.router
+    print(f"Tier {args.tier!r} prefers {[p.name for p in router.allowed(args.tier)]}")
+
+    def call(_):
+        started = time.perf_counter()
+        try:
+            answer = router.run(args.tier, lambda provider: clients.chat_model(provider, 0.0).invoke("ping").content)
+            return answer.split()[-1].rstrip("."), time.perf_counter() - started
+        except Exception as e:
+            return f"error:{type(e).__name__}", time.perf_counter() - started
+
+    phases = [
+        ("baseline", {}),
+        ("groq slow", {"slow_rate": 0.3, "slow_latency": 2.0}),
+        ("groq failing", {"slow_rate": 0.0, "error_rate": 0.6}),
+        ("recovered", {"error_rate": 0.0}),
+    ]
+    for name, groq_changes in phases:
+        for attribute, value in groq_changes.items():
+            setattr(groq_server, attribute, value)
+        if name == "recovered":
+            time.sleep(args.window_seconds)
+        failovers = router.failovers
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(call, range(args.calls)))
+        served = Counter(provider for provider, _ in results)
+        latencies = sorted(seconds for _, seconds in results)
+        p50, p95 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95) - 1]
+        print(f"\n{name}: served {dict(served)}, failovers {router.failovers - failovers}, "
+              f"end-to-end p50 {p50:.2f}s p95 {p95:.2f}s")
+        for provider, stats in router.metrics()["providers"].items():
+            print(f"  {provider:<7} calls {stats['calls']:>4}  error rate {stats['error_rate']:.2f}  "
+                  f"p50 {stats['p50_seconds']}s  p95 {stats['p95_seconds']}s")
+
+if __name__ == "__main__":
+    main()
@@ -132,21 +132,46 @@ async function handleApiResponse<T>(response: Response, errorPrefix: string): Pr
   return response.json();
 }
 
+// List endpoints return one page at a time, with the cursor for the next page in X-Next-Cursor
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+const PAGE_SIZE = 50;
+
+async function fetchPage<T>(url: string, errorMsg: string, cursor?: string | null): Promise<Page<T>> {
+  let pageUrl = `${url}&limit=${PAGE_SIZE}`;
+  if (cursor) pageUrl += `&cursor=${encodeURIComponent(cursor)}`;
+  const response = await fetch(pageUrl, DEFAULT_FETCH_OPTIONS);
+  const items: T[] = await handleApiResponse(response, errorMsg);
+  return { items, nextCursor: response.headers.get("X-Next-Cursor") };
+}
+
 // Chats
-export async function getChats(userId: string, includeArchived?: boolean): Promise<Chat[]> {
+export async function getChats(userId: string, includeArchived?: boolean, cursor?: string | null): Promise<Page<Chat>> {
   try {
     let url = `${API_BASE_URL}/api/chats?user_id=${encodeURIComponent(userId)}`;
     if (includeArchived) url += "&include_archived=true";
     
     console.log('Fetching chats from URL:', url);
-    const response = await fetch(url, DEFAULT_FETCH_OPTIONS);
-    return handleApiResponse(response, "Failed to fetch chats");
+    return await fetchPage<Chat>(url, "Failed to fetch chats", cursor);
   } catch (error) {
     console.error("Error fetching chats:", error);
     throw error;
   }
 }
 
+export async function getArchivedChats(userId: string, cursor?: string | null): Promise<Page<Chat>> {
+  try {
+    const url = `${API_BASE_URL}/api/chats?user_id=${encodeURIComponent(userId)}&archived_only=true`;
+    return await fetchPage<Chat>(url, "Failed to fetch archived chats", cursor);
+  } catch (error) {
+    console.error("Error fetching archived chats:", error);
+    throw error;
+  }
+}
+
 export async function createChat(title: string, userId: string): Promise<Chat> {
   try {
     console.log(`Creating chat "${title}" for user ${userId}`);
@@ -263,12 +288,9 @@ export async function deleteDocument(documentId: number): Promise<void> {
 }
 
 // Messages
-export async function getMessages(chatId: number): Promise<Message[]> {
-  const response = await fetch(`${API_BASE_URL}/api/messages?chat_id=${chatId}`, DEFAULT_FETCH_OPTIONS);
-  if (!response.ok) {
-    throw new Error(`Failed to fetch messages: ${response.statusText}`);
-  }
-  return response.json();
+export async function getMessages(chatId: number, cursor?: string | null): Promise<Page<Message>> {
+  // Without a cursor this is the newest page; nextCursor fetches the page of older messages before it
+  return fetchPage<Message>(`${API_BASE_URL}/api/messages?chat_id=${chatId}`, "Failed to fetch messages", cursor);
 }
 
 export async function sendMessage(chatId: number, content: string): Promise<Message> {
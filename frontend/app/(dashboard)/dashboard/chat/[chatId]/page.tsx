@@ -59,6 +59,8 @@ export default function ChatPage({ params }: ChatPageProps) {
   const [selectedDocId, setSelectedDocId] = useState<string | null>(null);
   const [chat, setChat] = useState<Chat | null>(null);
   const [messages, setMessages] = useState<Message[]>([]);
+  // Cursor for the page of messages before the oldest one loaded, null once the start is reached
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState<string | null>(null);
   const [documents, setDocuments] = useState<Document[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   
@@ -118,7 +120,8 @@ export default function ChatPage({ params }: ChatPageProps) {
         ]);
         
         setChat(chatData);
-        setMessages(messagesData);
+        setMessages(messagesData.items);
+        setOlderMessagesCursor(messagesData.nextCursor);
         setDocuments(documentsData);
       } catch (error) {
         console.error("Error fetching chat data:", error);
@@ -139,13 +142,31 @@ export default function ChatPage({ params }: ChatPageProps) {
     if (!isValidChatId) return;
     
     try {
+      // Only the newest page is refetched; older pages already loaded are kept in front of it
       const messagesData = await getMessages(chatId);
-      setMessages(messagesData);
+      const newest = messagesData.items;
+      const newestStart = newest.length > 0 ? new Date(newest[0].timestamp).getTime() : Infinity;
+      const older = messages.filter(m => new Date(m.timestamp).getTime() < newestStart);
+      setMessages([...older, ...newest]);
+      if (older.length === 0) setOlderMessagesCursor(messagesData.nextCursor);
     } catch (error) {
       console.error("Error refreshing messages:", error);
     }
   };
   
+  // Function to load the page of messages before the oldest one shown
+  const loadOlderMessages = async () => {
+    if (!isValidChatId || !olderMessagesCursor) return;
+    
+    try {
+      const messagesData = await getMessages(chatId, olderMessagesCursor);
+      setMessages(prev => [...messagesData.items, ...prev]);
+      setOlderMessagesCursor(messagesData.nextCursor);
+    } catch (error) {
+      console.error("Error loading older messages:", error);
+    }
+  };
+  
   // Function to refresh documents
   const refreshDocuments = async () => {
     if (!isValidChatId) return;
@@ -513,6 +534,8 @@ export default function ChatPage({ params }: ChatPageProps) {
                   messages={messages}
                   chatId={chatId}
                   onNewMessage={refreshMessages}
+                  hasOlderMessages={!!olderMessagesCursor}
+                  onLoadOlderMessages={loadOlderMessages}
                   onSourceClick={handleSourceClick}
                   onDocumentsUploaded={refreshDocuments}
                   activeSourceId={activeSourceBadge}
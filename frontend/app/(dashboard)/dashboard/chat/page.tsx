@@ -16,6 +16,9 @@ export default function ChatsPage() {
   const [searchQuery, setSearchQuery] = useState("");
   const [chats, setChats] = useState<Chat[]>([]);
   const [isLoading, setIsLoading] = useState(true);
+  // Cursor for the next page of older chats, null once every chat is loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const { navigateWithLoading } = useLoadingNavigation();
   const { user, isLoaded: isUserLoaded } = useUser();
   const { toast } = useToast();
@@ -44,7 +47,8 @@ export default function ChatsPage() {
       try {
         setIsLoading(true);
         const response = await getChats(user.id);
-        setChats(response.filter(chat => !chat.is_archived));
+        setChats(response.items.filter(chat => !chat.is_archived));
+        setNextCursor(response.nextCursor);
       } catch (error) {
         console.error("Error fetching chats:", error);
       } finally {
@@ -57,6 +61,21 @@ export default function ChatsPage() {
     }
   }, [user, isUserLoaded, refreshChats]);
   
+  const loadMoreChats = async () => {
+    if (!user?.id || !nextCursor) return;
+    
+    try {
+      setIsLoadingMore(true);
+      const response = await getChats(user.id, false, nextCursor);
+      setChats(prevChats => [...prevChats, ...response.items.filter(chat => !chat.is_archived)]);
+      setNextCursor(response.nextCursor);
+    } catch (error) {
+      console.error("Error loading more chats:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+  
   const handleClickOutside = () => {
     // This function is no longer used
   };
@@ -266,6 +285,18 @@ export default function ChatsPage() {
               </div>
             </section>
           )}
+
+          {nextCursor && (
+            <div className="flex justify-center">
+              <button
+                className="px-4 py-2 rounded-full border border-border bg-sidebar text-sm font-medium hover:border-primary/30 transition-all cursor-pointer"
+                disabled={isLoadingMore}
+                onClick={loadMoreChats}
+              >
+                {isLoadingMore ? "Loading..." : "Load more chats"}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -1,6 +1,6 @@
 "use client";
 
-import React, { useState, useRef, useEffect } from "react";
+import React, { useState, useRef, useEffect, useLayoutEffect } from "react";
 import { motion } from "framer-motion";
 import { Mascot } from "@/components/mascot/mascot";
 import { FileText, Send, Upload } from "lucide-react";
@@ -22,6 +22,8 @@ interface ChatMessagesProps {
   onSourceClick?: (source: { file: string; page: number; highlight?: string; line_start?: number; line_end?: number; content?: string }) => void;
   onDocumentsUploaded?: () => void;
   activeSourceId?: string | null;
+  hasOlderMessages?: boolean;
+  onLoadOlderMessages?: () => Promise<void>;
 }
 
 // Add Source type for local type safety
@@ -40,7 +42,7 @@ interface Source {
   key_phrases?: string[];  // Added key_phrases for bidirectional highlighting
 }
 
-export const ChatMessages = ({ messages, chatId, onNewMessage, onSourceClick, onDocumentsUploaded, activeSourceId }: ChatMessagesProps) => {
+export const ChatMessages = ({ messages, chatId, onNewMessage, onSourceClick, onDocumentsUploaded, activeSourceId, hasOlderMessages, onLoadOlderMessages }: ChatMessagesProps) => {
   const [message, setMessage] = useState("");
   const [mascotMood, setMascotMood] = useState<"happy" | "thinking" | "excited">("happy");
   const [isLoading, setIsLoading] = useState(false);
@@ -50,6 +52,10 @@ export const ChatMessages = ({ messages, chatId, onNewMessage, onSourceClick, on
   const fileInputRef = useRef<HTMLInputElement>(null);
   const [pendingMessages, setPendingMessages] = useState<Message[]>([]);
   const endOfMessagesRef = useRef<HTMLDivElement>(null);
+  const scrollContainerRef = useRef<HTMLDivElement>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
+  // Distance from the bottom to restore once older messages are rendered above
+  const restoreScrollRef = useRef<number | null>(null);
   const textareaRef = useRef<HTMLTextAreaElement>(null);
   const { toast } = useToast();
 
@@ -105,11 +111,37 @@ export const ChatMessages = ({ messages, chatId, onNewMessage, onSourceClick, on
   const allMessages = [...messages, ...pendingMessages];
   const sortedMessages = [...allMessages].sort((a, b) => new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime());
 
+  // Scroll to the bottom only when a newer message arrives, not when older pages are prepended
+  const newestMessageId = sortedMessages.length > 0 ? sortedMessages[sortedMessages.length - 1].id : null;
   useEffect(() => {
     if (endOfMessagesRef.current) {
       endOfMessagesRef.current.scrollIntoView({ behavior: "smooth" });
     }
-  }, [sortedMessages.length, thinking]);
+  }, [newestMessageId, thinking]);
+
+  useLayoutEffect(() => {
+    const container = scrollContainerRef.current;
+    if (container && restoreScrollRef.current !== null) {
+      container.scrollTop = container.scrollHeight - restoreScrollRef.current;
+      restoreScrollRef.current = null;
+    }
+  }, [messages]);
+
+  const loadOlderMessages = async () => {
+    if (!hasOlderMessages || !onLoadOlderMessages || loadingOlder) return;
+    const container = scrollContainerRef.current;
+    setLoadingOlder(true);
+    try {
+      if (container) restoreScrollRef.current = container.scrollHeight - container.scrollTop;
+      await onLoadOlderMessages();
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  const handleScroll = (e: React.UIEvent<HTMLDivElement>) => {
+    if (e.currentTarget.scrollTop < 80) loadOlderMessages();
+  };
 
   useEffect(() => {
     if (textareaRef.current) {
@@ -222,7 +254,7 @@ export const ChatMessages = ({ messages, chatId, onNewMessage, onSourceClick, on
 
   return (
     <>
-      <div className="flex-1 overflow-auto p-4 space-y-4">
+      <div ref={scrollContainerRef} onScroll={handleScroll} className="flex-1 overflow-auto p-4 space-y-4">
         {sortedMessages.length === 0 ? (
           <div className="flex flex-col items-center justify-center h-full text-center gap-4">
             <Mascot size="md" mood="happy" />
@@ -230,6 +262,18 @@ export const ChatMessages = ({ messages, chatId, onNewMessage, onSourceClick, on
           </div>
         ) : (
           <>
+            {hasOlderMessages && (
+              <div className="flex justify-center">
+                <button
+                  type="button"
+                  className="px-3 py-1 rounded-full border border-border bg-accent text-accent-foreground text-xs font-medium hover:bg-primary/90 hover:text-primary-foreground transition cursor-pointer"
+                  disabled={loadingOlder}
+                  onClick={loadOlderMessages}
+                >
+                  {loadingOlder ? "Loading..." : "Load earlier messages"}
+                </button>
+              </div>
+            )}
             {sortedMessages.map((msg, idx) => {
               const key = msg.id + '-' + idx;
               if (msg.role === 'user') {
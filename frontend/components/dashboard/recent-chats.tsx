@@ -24,7 +24,7 @@ export function RecentChats() {
       try {
         setIsLoading(true);
         const fetchedChats = await getChats(userId);
-        setChats(fetchedChats);
+        setChats(fetchedChats.items);
       } catch (error) {
         console.error("Failed to fetch chats:", error);
       } finally {
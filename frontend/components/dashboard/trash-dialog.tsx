@@ -5,7 +5,7 @@ import { Button } from "@/components/ui/button";
 import { SearchBar } from "@/components/ui/search-bar";
 import { Trash2, RotateCcw } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
-import { getChats, updateChat, deleteChat, Chat } from "@/api/client";
+import { getArchivedChats, updateChat, deleteChat, Chat } from "@/api/client";
 import { useUser } from "@clerk/nextjs";
 import { useLoadingNavigation } from "@/hooks/use-loading-navigation";
 
@@ -18,15 +18,38 @@ export const TrashDialog: React.FC<{
   const [chats, setChats] = useState<Chat[]>([]);
   const [search, setSearch] = useState("");
   const [deleteId, setDeleteId] = useState<number | null>(null);
+  // Cursor for the next page of archived chats, null once all are loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const { user } = useUser();
   const { navigateWithLoading } = useLoadingNavigation();
   const { toast } = useToast();
 
   useEffect(() => {
     if (!open || !user?.id) return;
-    getChats(user.id, true).then(res => setChats(res.filter(c => c.is_archived)));
+    getArchivedChats(user.id)
+      .then(res => {
+        setChats(res.items);
+        setNextCursor(res.nextCursor);
+      })
+      .catch(error => console.error("Error fetching archived chats:", error));
   }, [open, user]);
 
+  const loadMore = async () => {
+    if (!user?.id || !nextCursor) return;
+    
+    try {
+      setIsLoadingMore(true);
+      const res = await getArchivedChats(user.id, nextCursor);
+      setChats(chats => [...chats, ...res.items]);
+      setNextCursor(res.nextCursor);
+    } catch (error) {
+      console.error("Error loading more archived chats:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const filtered = chats.filter(chat => chat.title.toLowerCase().includes(search.toLowerCase()));
 
   const handleRestore = async (id: number) => {
@@ -78,6 +101,11 @@ export const TrashDialog: React.FC<{
               </div>
             ))
           )}
+          {nextCursor && (
+            <Button variant="ghost" onClick={loadMore} disabled={isLoadingMore} className="w-full cursor-pointer">
+              {isLoadingMore ? "Loading..." : "Load more"}
+            </Button>
+          )}
         </div>
         <AlertDialog open={!!deleteId} onOpenChange={v => !v && setDeleteId(null)}>
           <AlertDialogContent>